@@ -1,7 +1,11 @@
 import os
-from src.llm_tools.resume_formatting import upload_file_to_openai, resume_formatting
-from src.db_tools.resume_db import insert_resume_data, create_resume_table
-from src.llm_tools.formatting import retry
+import argparse
+import queue
+import threading
+import time
+from src.llm_tools.resume_files import prepare_resume, parse_resume, ingest_resume, collect_remote_files, get_ingest_stats
+from src.db_tools.resume_db import insert_resume_data_batch
+from src.db_tools.migrations import ensure_schema
 
 def create_members_from_resumes():
     resume_dir = "data/resume"
@@ -11,14 +15,15 @@ def create_members_from_resumes():
         print(f"No PDF files found in {resume_dir}")
         return
 
-    # Ensure the resume table exists
+    # Bring the database schema up to date, as app.py does
     try:
-        create_resume_table()
-        print("Resume table checked/created successfully.")
+        ensure_schema()
     except Exception as e:
-        print(f"Error checking/creating resume table: {e}")
+        print(f"Error checking/migrating the database schema: {e}")
         return
 
+    # Parsed resumes are embedded and inserted together once every file is processed
+    parsed_resumes = []
     for i, pdf_file in enumerate(pdf_files):
         file_path = os.path.join(resume_dir, pdf_file)
         member_deepflow_id = f"{os.path.splitext(pdf_file)[0]}{i}" # Generate a unique ID
@@ -26,25 +31,180 @@ def create_members_from_resumes():
         print(f"\nProcessing {pdf_file} for member ID: {member_deepflow_id}")
         try:
             with open(file_path, "rb") as file:
-                file_id = upload_file_to_openai(file)
-            
-            if file_id:
-                print(f"File {pdf_file} uploaded to OpenAI with ID: {file_id}")
-                
-                # Call resume_formatting (note: it doesn't use file_id to retrieve content based on current implementation)
-                output = retry(resume_formatting, 5, file_id)
-                
-                if output:
-                    print(f"Resume formatting successful for {pdf_file}.")
-                    # Assuming output is a Pydantic model or dict that can be directly inserted
-                    insert_resume_data(member_deepflow_id, output)
-                    print(f"Resume data for {member_deepflow_id} stored in database.")
-                else:
-                    print(f"Failed to format resume for {pdf_file}.")
+                output = ingest_resume(file.read(), pdf_file)
+
+            if output:
+                print(f"Resume formatting successful for {pdf_file}.")
+                parsed_resumes.append((member_deepflow_id, output))
             else:
-                print(f"Failed to upload {pdf_file} to OpenAI.")
+                print(f"Failed to format resume for {pdf_file}.")
         except Exception as e:
             print(f"An error occurred while processing {pdf_file}: {e}")
 
+    if parsed_resumes:
+        try:
+            stored = insert_resume_data_batch(parsed_resumes)
+            print(f"Resume data for {len(stored)} of {len(parsed_resumes)} parsed members stored in database.")
+        except Exception as e:
+            print(f"Error storing resume data: {e}")
+    collect_remote_files()
+    print(f"Ingestion stats: {get_ingest_stats()}")
+
+# Marks the end of a stage's input; each worker puts it back for its siblings
+_DONE = object()
+
+def _start_stage(name, func, inbox, outbox, workers, failures):
+    """
+    Starts 'workers' threads that apply func to items from inbox and put
+    non-None results on outbox. A failing item is recorded in failures and
+    doesn't affect the others.
+    """
+    def work():
+        while True:
+            item = inbox.get()
+            if item is _DONE:
+                inbox.put(_DONE)
+                return
+            try:
+                result = func(item)
+                if result is not None:
+                    outbox.put(result)
+            except Exception as e:
+                print(f"[{name}] An error occurred while processing {item[1]}: {e}")
+                failures.append((item[1], name, str(e)))
+
+    threads = [threading.Thread(target=work, name=f"{name}-{i}", daemon=True) for i in range(workers)]
+    for thread in threads:
+        thread.start()
+    return threads
+
+def _prepare_stage(item):
+    member_deepflow_id, pdf_file, file_path = item
+    with open(file_path, "rb") as file:
+        source = prepare_resume(file.read(), pdf_file)
+    return member_deepflow_id, pdf_file, source
+
+def _parse_stage(item):
+    member_deepflow_id, pdf_file, source = item
+    output = parse_resume(source)
+    if not output:
+        raise RuntimeError("resume formatting failed")
+    print(f"Resume formatting successful for {pdf_file}.")
+    return member_deepflow_id, pdf_file, output
+
+def _store_batch(batch, stored, failures):
+    """
+    Embeds and inserts a batch of parsed resumes in one embeddings round trip
+    and one INSERT, recording the outcome of every file. If the batch fails,
+    its files are retried one by one so only the failing ones are lost
+    (embeddings already computed come from the embedding cache).
+    """
+    try:
+        inserted = set(insert_resume_data_batch([(member_deepflow_id, output) for member_deepflow_id, _, output in batch]))
+    except Exception as e:
+        if len(batch) == 1:
+            print(f"[store] An error occurred while storing {batch[0][1]}: {e}")
+            failures.append((batch[0][1], "store", str(e)))
+            return
+        print(f"[store] Batch of {len(batch)} resumes failed ({e}); storing them one by one")
+        for item in batch:
+            _store_batch([item], stored, failures)
+        return
+    for member_deepflow_id, pdf_file, _ in batch:
+        if member_deepflow_id in inserted:
+            stored.append(pdf_file)
+        else:
+            failures.append((pdf_file, "store", f"member '{member_deepflow_id}' already exists"))
+
+def _start_store_stage(inbox, batch_size, stored, failures):
+    """
+    Starts the thread that embeds and inserts parsed resumes in batches of
+    up to 'batch_size' while parsing is still running; a partial batch is
+    flushed whenever the parsers fall behind and at the end.
+    """
+    def work():
+        batch = []
+        while True:
+            try:
+                item = inbox.get(timeout=0.5 if batch else None)
+            except queue.Empty:
+                _store_batch(batch, stored, failures)
+                batch = []
+                continue
+            if item is _DONE:
+                break
+            batch.append(item)
+            if len(batch) >= batch_size:
+                _store_batch(batch, stored, failures)
+                batch = []
+        if batch:
+            _store_batch(batch, stored, failures)
+
+    thread = threading.Thread(target=work, name="store", daemon=True)
+    thread.start()
+    return thread
+
+def create_members_from_resumes_pipelined(workers: int = 4, queue_size: int = 8, batch_size: int = 32):
+    """
+    Ingests every resume in data/resume through a concurrent pipeline.
+
+    Preparation (hashing, cache lookup, local text extraction) and parsing
+    each run on their own pool of 'workers' threads, followed by a store
+    stage that embeds and inserts parsed resumes in batches of 'batch_size'.
+    Stages are connected by bounded queues of 'queue_size' items, so at most
+    a few files are in flight per stage. Failures, including inserts, are
+    isolated and reported per file.
+    """
+    resume_dir = "data/resume"
+    pdf_files = [f for f in os.listdir(resume_dir) if f.endswith(".pdf")]
+
+    if not pdf_files:
+        print(f"No PDF files found in {resume_dir}")
+        return
+
+    try:
+        ensure_schema()
+    except Exception as e:
+        print(f"Error checking/migrating the database schema: {e}")
+        return
+
+    started = time.monotonic()
+    prepare_queue = queue.Queue(maxsize=queue_size)
+    parse_queue = queue.Queue(maxsize=queue_size)
+    store_queue = queue.Queue(maxsize=queue_size)
+    failures = []
+    stored = []
+
+    prepare_threads = _start_stage("prepare", _prepare_stage, prepare_queue, parse_queue, workers, failures)
+    parse_threads = _start_stage("parse", _parse_stage, parse_queue, store_queue, workers, failures)
+    store_thread = _start_store_stage(store_queue, batch_size, stored, failures)
+
+    for i, pdf_file in enumerate(pdf_files):
+        member_deepflow_id = f"{os.path.splitext(pdf_file)[0]}{i}" # Generate a unique ID
+        prepare_queue.put((member_deepflow_id, pdf_file, os.path.join(resume_dir, pdf_file)))
+    prepare_queue.put(_DONE)
+    for thread in prepare_threads:
+        thread.join()
+    parse_queue.put(_DONE)
+    for thread in parse_threads:
+        thread.join()
+    store_queue.put(_DONE)
+    store_thread.join()
+
+    collect_remote_files()
+    print(f"Ingested {len(stored)}/{len(pdf_files)} resumes in {time.monotonic() - started:.1f}s.")
+    print(f"Ingestion stats: {get_ingest_stats()}")
+    for pdf_file, stage, error in failures:
+        print(f"Failed {pdf_file} at {stage}: {error}")
+
 if __name__ == "__main__":
-    create_members_from_resumes()
+    parser = argparse.ArgumentParser(description="Create members from the resumes in data/resume.")
+    parser.add_argument("--workers", type=int, default=4, help="Concurrent workers per pipeline stage.")
+    parser.add_argument("--queue-size", type=int, default=8, help="Maximum items waiting between stages.")
+    parser.add_argument("--batch-size", type=int, default=32, help="Resumes embedded and inserted together.")
+    parser.add_argument("--sequential", action="store_true", help="Process one resume at a time.")
+    args = parser.parse_args()
+    if args.sequential:
+        create_members_from_resumes()
+    else:
+        create_members_from_resumes_pipelined(args.workers, args.queue_size, args.batch_size)
@@ -1,8 +1,23 @@
-from deepflow_test import test_delegate_task
+from deepflow_test import test_delegate_candidates
+import asyncio
+from src.llm_tools.task_formatting import task_formatting_async
+from src.db_tools.task_db import insert_task_data_batch
+from src.db_tools.batch_matching import match_tasks
+from src.llm_tools.formatting import retry_async
+from src.delegation import get_reuse_stats, USE_DELEGATION_REUSE
+from src.db_tools.migrations import ensure_schema
 import os
 task_dir = "data/task"
 txt_files = [f for f in os.listdir(task_dir) if f.endswith(".txt")]
 
+async def format_tasks(tasks):
+    # Every task of a sector is formatted concurrently, LLM_MAX_CONCURRENCY calls at a time
+    return await asyncio.gather(*(retry_async(task_formatting_async,5,task) for task in tasks))
+
+# Bring the database schema up to date, as app.py does
+ensure_schema()
+
+deepflow_task_ids={}
 for txt_file in txt_files:
     sector=txt_file[:-4]
     print(sector)
@@ -10,7 +25,21 @@ for txt_file in txt_files:
     with open(f'data/task/{sector}.txt') as f:
         tasks=f.read()
     tasks=tasks.split("\nRelated occupations\n")
-    i=0
-    for task in tasks:
-        test_delegate_task(task,f'{sector}_'+str(i))
-        i+=1
\ No newline at end of file
+
+    # Format every task of the sector first, then embed and insert them in one batch
+    formatted=[]
+    for i, task_data in enumerate(asyncio.run(format_tasks(tasks))):
+        if task_data:
+            formatted.append((f'{sector}_'+str(i),task_data))
+        else:
+            print(f"Could not format task {sector}_{i}, skipping.")
+    task_ids=insert_task_data_batch(formatted)
+    deepflow_task_ids.update(zip(task_ids,(deepflow_task_id for deepflow_task_id,_ in formatted)))
+
+# Match every new task against all members and agents in one vectorized pass;
+# results stream in so delegation starts with the first chunk
+for task_details,member_details,agent_details in match_tasks(task_ids=list(deepflow_task_ids)):
+    test_delegate_candidates(task_details,member_details,agent_details,deepflow_task_ids[task_details['id']])
+
+if USE_DELEGATION_REUSE:
+    print(f"Delegation reuse: {get_reuse_stats()}")
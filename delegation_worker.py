@@ -0,0 +1,91 @@
+import argparse
+import os
+import socket
+import threading
+import time
+from src.db_tools.candidate_db import find_candidates_for_task
+from src.db_tools.candidate_index import USE_CANDIDATE_INDEX, find_candidates_for_task_in_memory
+from src.db_tools.delegation_job_db import (
+    claim_delegation_job, complete_delegation_job,
+    fail_delegation_job, requeue_stale_delegation_jobs,
+)
+from src.db_tools.migrations import ensure_schema
+from src.delegation import delegate_candidates
+
+def run_job(job: dict):
+    """
+    Delegates the job's task among its top candidates and stores the delegation record.
+    """
+    find_candidates = find_candidates_for_task_in_memory if USE_CANDIDATE_INDEX else find_candidates_for_task
+    task_details, member_details, agent_details = find_candidates(job['task_id'])
+    if task_details is None:
+        raise ValueError(f"Task {job['task_id']} does not exist.")
+    if not member_details and not agent_details:
+        raise ValueError(f"Task {job['task_id']} has no embedding, or there are no members or agents to match.")
+    delegation_result = delegate_candidates(task_details, member_details, agent_details, use_cache=job['use_cache'])
+    if delegation_result is None:
+        raise RuntimeError("Could not determine the best combination.")
+    return delegation_result
+
+def work(worker: str, poll_interval: float, stop: threading.Event):
+    """
+    Claims and runs jobs until 'stop' is set, sleeping 'poll_interval'
+    seconds whenever the queue is empty.
+    """
+    while not stop.is_set():
+        try:
+            job = claim_delegation_job(worker)
+        except Exception as e:
+            print(f"[{worker}] Could not claim a job: {e}")
+            stop.wait(poll_interval)
+            continue
+        if job is None:
+            stop.wait(poll_interval)
+            continue
+
+        print(f"[{worker}] Job {job['id']}: delegating task {job['task_id']} (attempt {job['attempts']})")
+        started = time.monotonic()
+        try:
+            delegation_result = run_job(job)
+            if complete_delegation_job(job['id'], worker, delegation_result.model_dump_json()):
+                print(f"[{worker}] Job {job['id']} done in {time.monotonic() - started:.1f}s")
+            else:
+                print(f"[{worker}] Job {job['id']} was requeued as stale before it finished; result discarded")
+        except Exception as e:
+            print(f"[{worker}] Job {job['id']} failed: {e}")
+            try:
+                if not fail_delegation_job(job['id'], worker, str(e)):
+                    print(f"[{worker}] Job {job['id']} was requeued as stale before it failed; failure not recorded")
+            except Exception as db_error:
+                print(f"[{worker}] Could not record the failure of job {job['id']}: {db_error}")
+
+def main(concurrency: int = 2, poll_interval: float = 2.0, stale_check_interval: float = 60.0):
+    """
+    Runs 'concurrency' worker threads in this process. Start as many
+    processes, on as many machines, as needed; they share the queue.
+    """
+    ensure_schema()
+    name = f"{socket.gethostname()}:{os.getpid()}"
+    stop = threading.Event()
+    threads = [threading.Thread(target=work, args=(f"{name}:{i}", poll_interval, stop), daemon=True) for i in range(concurrency)]
+    for thread in threads:
+        thread.start()
+    print(f"Delegation worker {name} started with {concurrency} thread(s).")
+    try:
+        while True:
+            requeued = requeue_stale_delegation_jobs()
+            if requeued:
+                print(f"Requeued {requeued} stale job(s).")
+            time.sleep(stale_check_interval)
+    except KeyboardInterrupt:
+        print("Stopping after the current jobs...")
+        stop.set()
+        for thread in threads:
+            thread.join()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run delegation jobs queued from the Task Delegate page.")
+    parser.add_argument("--concurrency", type=int, default=2, help="Jobs processed at once by this process.")
+    parser.add_argument("--poll-interval", type=float, default=2.0, help="Seconds to wait when the queue is empty.")
+    args = parser.parse_args()
+    main(args.concurrency, args.poll_interval)
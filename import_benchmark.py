@@ -0,0 +1,75 @@
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+from typing import List, Optional, Tuple
+
+# Modules imported at the start of the app and of the batch scripts. The
+# views need streamlit; creating_tasks.py runs on import and is left out.
+DEFAULT_MODULES = [
+    "src.db_tools.migrations",
+    "views.dashboard",
+    "views.add_member",
+    "views.add_task",
+    "views.add_agent",
+    "views.task_delegate",
+    "src.delegation",
+    "src.db_tools.batch_matching",
+    "creating_members",
+    "delegation_worker",
+]
+
+def measure_import(module: str) -> Tuple[Optional[float], List[Tuple[float, str]], str]:
+    """
+    Imports 'module' in a fresh interpreter with -X importtime. Returns the
+    total import time in seconds (None if the import failed), the time spent
+    per root package (e.g. 'openai', 'numpy', 'src'), most expensive first,
+    and the error output of a failed import.
+    """
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        capture_output=True, text=True, cwd=os.path.dirname(os.path.abspath(__file__)),
+    )
+    packages = {}
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, _, name = line[len("import time:"):].split("|")
+        package = name.strip().split(".")[0]
+        packages[package] = packages.get(package, 0.0) + int(self_us) / 1e6
+    if result.returncode != 0:
+        return None, [], result.stderr.strip().splitlines()[-1] if result.stderr.strip() else "import failed"
+    return sum(packages.values()), sorted(((seconds, package) for package, seconds in packages.items()), reverse=True), ""
+
+def main(modules: List[str], repeat: int = 3, top: int = 5, budget: Optional[float] = None) -> int:
+    """
+    Prints the median cold import time of each module over 'repeat' runs and
+    the packages it spends the most time in. Returns 1 if any module failed to
+    import or exceeded 'budget' seconds, else 0.
+    """
+    status = 0
+    for module in modules:
+        runs = [measure_import(module) for _ in range(repeat)]
+        failed = next((error for seconds, _, error in runs if seconds is None), None)
+        if failed is not None:
+            print(f"{module}: could not be imported ({failed})")
+            status = 1
+            continue
+        median = statistics.median(seconds for seconds, _, _ in runs)
+        over = budget is not None and median > budget
+        print(f"{module}: {median:.3f}s{'  OVER BUDGET' if over else ''}")
+        for seconds, package in runs[0][1][:top]:
+            print(f"    {seconds:.3f}s  {package}")
+        if over:
+            status = 1
+    return status
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Measure the cold import time of the app and script entry points.")
+    parser.add_argument("modules", nargs="*", default=DEFAULT_MODULES, help="Modules to import (default: the entry points).")
+    parser.add_argument("--repeat", type=int, default=3, help="Fresh interpreters per module; the median is reported.")
+    parser.add_argument("--top", type=int, default=5, help="Most expensive packages to list per module.")
+    parser.add_argument("--budget", type=float, default=None, help="Fail if any module takes longer than this many seconds.")
+    args = parser.parse_args()
+    sys.exit(main(args.modules, args.repeat, args.top, args.budget))
@@ -0,0 +1,158 @@
+import os
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+from dataclasses import dataclass
+from typing import Hashable, List, Optional
+from src.db_tools.candidate_db import find_candidates_for_task
+from src.db_tools.candidate_index import USE_CANDIDATE_INDEX, find_candidates_for_task_in_memory
+from src.llm_tools.delegation_formatting import delegation_messages
+
+# --- Candidate Prefetch Configuration ---
+# Selecting a task in the UI starts its candidate retrieval (and, with
+# CANDIDATE_PREFETCH_PROMPT, prompt assembly) on CANDIDATE_PREFETCH_WORKERS
+# background threads. Results are reused for CANDIDATE_PREFETCH_TTL_SECONDS;
+# at most CANDIDATE_PREFETCH_MAX_ENTRIES tasks are kept.
+CANDIDATE_PREFETCH_WORKERS = int(os.getenv("CANDIDATE_PREFETCH_WORKERS", "2"))
+CANDIDATE_PREFETCH_TTL_SECONDS = float(os.getenv("CANDIDATE_PREFETCH_TTL_SECONDS", "60"))
+CANDIDATE_PREFETCH_MAX_ENTRIES = int(os.getenv("CANDIDATE_PREFETCH_MAX_ENTRIES", "32"))
+CANDIDATE_PREFETCH_PROMPT = os.getenv("CANDIDATE_PREFETCH_PROMPT", "true").lower() in ("1", "true", "yes")
+
+@dataclass
+class PrefetchedCandidates:
+    """
+    Everything the delegation of one task needs before the LLM call.
+    'task_details' is None if the task doesn't exist; 'messages' is None
+    when there is nothing to delegate or prompt prefetching is off.
+    """
+    task_details: Optional[dict]
+    member_details: List[dict]
+    agent_details: List[dict]
+    messages: Optional[list] = None
+
+def load_candidates(task_id: int, build_prompt: bool = CANDIDATE_PREFETCH_PROMPT) -> PrefetchedCandidates:
+    """
+    Finds the task and its top candidates (pgvector or the in-process index,
+    per USE_CANDIDATE_INDEX) and optionally builds the delegation prompt.
+    """
+    find_candidates = find_candidates_for_task_in_memory if USE_CANDIDATE_INDEX else find_candidates_for_task
+    task_details, member_details, agent_details = find_candidates(task_id)
+    candidates = PrefetchedCandidates(task_details, member_details, agent_details)
+    if build_prompt and task_details and (member_details or agent_details):
+        candidates.messages = delegation_messages(task_details, member_details, agent_details)
+    return candidates
+
+class CandidatePrefetcher:
+    """
+    Cancellable background executor of load_candidates, keyed by session and
+    task id. Each UI session only ever cancels its own loads; 'session' None
+    is the scope of callers outside the UI.
+    """
+    def __init__(self, workers: int = CANDIDATE_PREFETCH_WORKERS, ttl_seconds: float = CANDIDATE_PREFETCH_TTL_SECONDS,
+                 max_entries: int = CANDIDATE_PREFETCH_MAX_ENTRIES):
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="candidate-prefetch")
+        # (session, task id) -> (submitted at, future), least recently used first
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._stats = {"submitted": 0, "ready": 0, "waited": 0, "missed": 0, "cancelled": 0, "failed": 0}
+
+    def _fresh(self, entry) -> bool:
+        submitted_at, future = entry
+        if time.monotonic() - submitted_at > self.ttl_seconds or future.cancelled():
+            return False
+        return not (future.done() and future.exception() is not None)
+
+    def prefetch(self, task_id: int, session: Hashable = None) -> Future:
+        """
+        Starts loading the candidates of 'task_id' for 'session' unless a
+        fresh load is already running or done. Returns its future.
+        """
+        key = (session, task_id)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and self._fresh(entry):
+                self._entries.move_to_end(key)
+                return entry[1]
+            future = self._executor.submit(load_candidates, task_id)
+            self._entries[key] = (time.monotonic(), future)
+            self._entries.move_to_end(key)
+            self._stats["submitted"] += 1
+            while len(self._entries) > self.max_entries:
+                _, (_, evicted) = self._entries.popitem(last=False)
+                if evicted.cancel():
+                    self._stats["cancelled"] += 1
+        return future
+
+    def cancel_except(self, task_id: Optional[int], session: Hashable = None) -> int:
+        """
+        Cancels the loads of every other task of 'session' that haven't
+        started yet (e.g. after the user picked a different task). Loads
+        already running finish and stay cached; other sessions' loads are
+        left alone. Returns how many were cancelled.
+        """
+        cancelled = 0
+        with self._lock:
+            for key, (_, future) in list(self._entries.items()):
+                if key[0] == session and key[1] != task_id and future.cancel():
+                    del self._entries[key]
+                    cancelled += 1
+            self._stats["cancelled"] += cancelled
+        return cancelled
+
+    def get(self, task_id: int, session: Hashable = None, timeout: Optional[float] = None) -> Optional[PrefetchedCandidates]:
+        """
+        Returns the candidates of 'task_id' prefetched for 'session', waiting
+        up to 'timeout' seconds for a load in progress. Returns None if there
+        was no fresh prefetch or it failed; the caller then loads synchronously.
+        """
+        with self._lock:
+            entry = self._entries.get((session, task_id))
+            if entry is None or not self._fresh(entry):
+                self._stats["missed"] += 1
+                return None
+            future = entry[1]
+            self._stats["ready" if future.done() else "waited"] += 1
+        try:
+            return future.result(timeout=timeout)
+        except FutureTimeoutError:
+            return None
+        except Exception as e:
+            print(f"Candidate prefetch for task {task_id} failed: {e}")
+            with self._lock:
+                self._stats["failed"] += 1
+            return None
+
+    def invalidate(self, task_id: int, session: Hashable = None):
+        """
+        Forgets the prefetch of 'task_id' for 'session', cancelling it if it
+        hasn't started.
+        """
+        with self._lock:
+            entry = self._entries.pop((session, task_id), None)
+        if entry is not None:
+            entry[1].cancel()
+
+    def stats(self) -> dict:
+        """
+        Returns prefetch counters: loads submitted, results that were ready
+        or had to be waited for, misses, cancellations and failures.
+        """
+        with self._lock:
+            return dict(self._stats, entries=len(self._entries))
+
+_prefetcher: Optional[CandidatePrefetcher] = None
+_prefetcher_lock = threading.Lock()
+
+def get_candidate_prefetcher() -> CandidatePrefetcher:
+    """
+    Returns the process-wide prefetcher, creating it on first use.
+    """
+    global _prefetcher
+    if _prefetcher is None:
+        with _prefetcher_lock:
+            if _prefetcher is None:
+                _prefetcher = CandidatePrefetcher()
+    return _prefetcher
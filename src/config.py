@@ -0,0 +1,5 @@
+from dotenv import load_dotenv
+
+# The one place the .env file is read; modules that read settings at import
+# time import this module first
+load_dotenv()
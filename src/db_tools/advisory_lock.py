@@ -0,0 +1,83 @@
+import hashlib
+import os
+import threading
+from contextlib import contextmanager, nullcontext
+import psycopg2
+from psycopg2.pool import ThreadedConnectionPool
+import src.config  # Loads the .env file before the settings below are read
+
+# --- Advisory Lock Configuration ---
+# Session-level advisory locks are held on their own small pool of plain
+# connections (no pgvector adapters), so a long critical section doesn't tie
+# up a slot of the main pool. ADVISORY_LOCK_POOL_MAX bounds how many locks
+# this process can hold at once.
+ADVISORY_LOCK_POOL_MAX = int(os.getenv("ADVISORY_LOCK_POOL_MAX", "4"))
+
+_lock_pool = None
+_lock_pool_lock = threading.Lock()
+_lock_pool_slots = threading.BoundedSemaphore(ADVISORY_LOCK_POOL_MAX)
+
+def _get_lock_pool() -> ThreadedConnectionPool:
+    global _lock_pool
+    if _lock_pool is None:
+        with _lock_pool_lock:
+            if _lock_pool is None:
+                _lock_pool = ThreadedConnectionPool(0, ADVISORY_LOCK_POOL_MAX, os.getenv("DATABASE_URI"))
+    return _lock_pool
+
+def advisory_key(name: str) -> int:
+    """
+    Maps a lock name to the signed 64-bit key Postgres advisory locks take.
+    """
+    return int.from_bytes(hashlib.sha256(name.encode("utf-8")).digest()[:8], "big", signed=True)
+
+@contextmanager
+def advisory_lock(name: str, timeout_seconds: float, waiting=nullcontext):
+    """
+    Holds the session-level advisory lock 'name' for the duration of the
+    block, on a connection from the advisory lock pool.
+    'waiting' is a context manager factory entered only while blocked on a
+    lock held by someone else (e.g. a spinner).
+
+    Yields (acquired_immediately, requested_at): whether nobody else held the
+    lock, and the database time at which it was requested. A caller that had
+    to wait can tell work done meanwhile by its timestamps. If the lock can't
+    be taken within 'timeout_seconds' or the database is unreachable, the
+    block runs without it and (True, None) is yielded.
+    """
+    key = advisory_key(name)
+    conn, acquired, requested_at = None, True, None
+    if not _lock_pool_slots.acquire(timeout=timeout_seconds):
+        print(f"Warning: no advisory lock connection free for '{name}', continuing without the lock")
+        yield acquired, requested_at
+        return
+    try:
+        conn = _get_lock_pool().getconn()
+        cur = conn.cursor()
+        cur.execute("SELECT clock_timestamp(), pg_try_advisory_lock(%s);", (key,))
+        requested_at, acquired = cur.fetchone()
+        if not acquired:
+            # Transaction-local, so the pooled session keeps its default lock_timeout
+            cur.execute("SELECT set_config('lock_timeout', %s, true);", (f"{int(timeout_seconds * 1000)}ms",))
+            with waiting():
+                cur.execute("SELECT pg_advisory_lock(%s);", (key,))
+        conn.commit()
+    except psycopg2.Error as e:
+        print(f"Warning: could not take advisory lock '{name}', continuing without it: {e}")
+        if conn is not None:
+            _get_lock_pool().putconn(conn, close=True)
+        _lock_pool_slots.release()
+        conn, acquired, requested_at = None, True, None
+    try:
+        yield acquired, requested_at
+    finally:
+        if conn is not None:
+            close = False
+            try:
+                cur.execute("SELECT pg_advisory_unlock(%s);", (key,))
+                conn.commit()
+            except psycopg2.Error:
+                close = True  # Closing the session releases the lock as well
+            finally:
+                _get_lock_pool().putconn(conn, close=close or bool(conn.closed))
+                _lock_pool_slots.release()
@@ -1,40 +1,26 @@
 import json
 import os
-from typing import List
+from typing import List, Optional, Tuple
 from pydantic import BaseModel, Field
-import openai
-from src.db_tools.connection_op import get_db_connection
+import numpy as np
+from psycopg2.extras import execute_values
+from src.db_tools.connection_op import db_connection, db_cursor, execute_prepared
+from src.db_tools.vector_adapter import to_vector
+from src.db_tools.vector_index import create_vector_index, set_search_params
+from src.llm_tools.embedding import get_openai_embedding, get_openai_embeddings
 from src.models import AgentData
 
-# --- OpenAI Configuration ---
-OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
-if not OPENAI_API_KEY:
-    print("Warning: OPENAI_API_KEY environment variable not set. Embedding generation will fail.")
-client = openai.OpenAI(api_key=OPENAI_API_KEY)
+# Columns of the 'agents' table in table order, without the embedding
+AGENT_COLUMNS = ['id', 'deepflow_agent_id', 'tags', 'skills', 'capabilities', 'core_functionalities', 'created_at']
 
-def get_openai_embedding(text: str, model: str = "text-embedding-ada-002") -> List[float]:
-    """
-    Generates a vector embedding for the given text using OpenAI's embedding model.
-    """
-    if not OPENAI_API_KEY:
-        print("Error: OpenAI API key is not set. Cannot generate embeddings.")
-        return []
-    try:
-        response = client.embeddings.create(input=[text], model=model)
-        return response.data[0].embedding
-    except openai.APIError as e:
-        print(f"OpenAI API error during embedding generation: {e}")
-        return []
-    except Exception as e:
-        print(f"An unexpected error occurred during embedding generation: {e}")
-        return []
-
-def create_agents_table():
+def create_agents_table(cur=None):
     """
     Creates the 'agents' table in the database if it doesn't already exist.
+    Given a cursor, runs in the caller's transaction; errors are raised.
     """
-    conn = get_db_connection()
-    cur = conn.cursor()
+    if cur is None:
+        with db_cursor() as cur:
+            return create_agents_table(cur)
     cur.execute("CREATE EXTENSION IF NOT EXISTS vector;")
     cur.execute("""
         CREATE TABLE IF NOT EXISTS agents (
@@ -48,90 +34,150 @@ def create_agents_table():
             created_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP
         );
     """)
-    conn.commit()
-    cur.close()
-    conn.close()
+    create_vector_index(cur, "agents")
     print(" 'agents' table created or already exists.")
 
-def insert_agent_data(deepflow_agent_id: str, agent_data: AgentData):
+def agent_embedding_text(agent_data: AgentData) -> str:
     """
-    Inserts an AgentData object into the 'agents' table.
+    Builds the text that is embedded for an agent.
     """
-    text_to_embed = (
+    return (
         " ".join(agent_data.tags) + " " +
         " ".join(agent_data.skills) + " " +
         " ".join(agent_data.capabilities) + " " +
         " ".join(agent_data.core_functionalities)
     ).strip()
 
-    embedding = get_openai_embedding(text_to_embed)
-    embedding_str = f"[{','.join(map(str, embedding))}]" if embedding else None
+def insert_agent_data(deepflow_agent_id: str, agent_data: AgentData):
+    """
+    Inserts an AgentData object into the 'agents' table.
+    """
+    # float32 array (or None), adapted to a pgvector value by the registered adapter
+    embedding = get_openai_embedding(agent_embedding_text(agent_data))
 
-    conn = get_db_connection()
-    cur = conn.cursor()
-    cur.execute("""
-        INSERT INTO agents (
+    with db_connection() as conn:
+        cur = conn.cursor()
+        cur.execute("""
+            INSERT INTO agents (
+                deepflow_agent_id,
+                tags,
+                skills,
+                capabilities,
+                core_functionalities,
+                embedding
+            ) VALUES (%s, %s, %s, %s, %s, %s)
+        """, (
             deepflow_agent_id,
-            tags,
-            skills,
-            capabilities,
-            core_functionalities,
+            json.dumps(agent_data.tags),
+            json.dumps(agent_data.skills),
+            json.dumps(agent_data.capabilities),
+            json.dumps(agent_data.core_functionalities),
             embedding
-        ) VALUES (%s, %s, %s, %s, %s, %s)
-    """, (
-        deepflow_agent_id,
-        json.dumps(agent_data.tags),
-        json.dumps(agent_data.skills),
-        json.dumps(agent_data.capabilities),
-        json.dumps(agent_data.core_functionalities),
-        embedding_str
-    ))
-    conn.commit()
-    cur.close()
-    conn.close()
+        ))
+        cur.close()
     print(f"Agent with ID {deepflow_agent_id} inserted successfully.")
 
+def insert_agent_data_batch(agents: List[Tuple[str, AgentData]]):
+    """
+    Inserts many (deepflow_agent_id, AgentData) pairs into the 'agents' table,
+    embedding them in batched requests and writing them in one statement.
+    """
+    if not agents:
+        return
+    embeddings = get_openai_embeddings([agent_embedding_text(agent_data) for _, agent_data in agents])
+    rows = [
+        (
+            deepflow_agent_id,
+            json.dumps(agent_data.tags),
+            json.dumps(agent_data.skills),
+            json.dumps(agent_data.capabilities),
+            json.dumps(agent_data.core_functionalities),
+            embedding
+        )
+        for (deepflow_agent_id, agent_data), embedding in zip(agents, embeddings)
+    ]
+    with db_connection() as conn:
+        cur = conn.cursor()
+        execute_values(cur, """
+            INSERT INTO agents (
+                deepflow_agent_id,
+                tags,
+                skills,
+                capabilities,
+                core_functionalities,
+                embedding
+            ) VALUES %s
+        """, rows)
+        cur.close()
+    print(f"{len(rows)} agents inserted successfully.")
+
 def get_all_agents():
     """
     Retrieves all records from the 'agents' table.
     """
-    conn = get_db_connection()
-    cur = conn.cursor()
-    cur.execute("SELECT * FROM agents;")
-    agents = cur.fetchall()
-    cur.close()
-    conn.close()
+    with db_connection() as conn:
+        cur = conn.cursor()
+        cur.execute("SELECT * FROM agents;")
+        agents = cur.fetchall()
+        cur.close()
     return agents
 
-def find_similar_agents(task_embedding: List[float], top_n: int = 3):
+def list_agents(after_id: Optional[int] = None, limit: int = 50) -> List[dict]:
+    """
+    Returns a page of up to 'limit' agents as dicts of AGENT_COLUMNS (no
+    embedding), in id order, starting after id 'after_id'. Pass the last id
+    of a page to get the next one.
+    """
+    with db_connection() as conn:
+        cur = conn.cursor()
+        cur.execute(f"SELECT {', '.join(AGENT_COLUMNS)} FROM agents WHERE id > %s ORDER BY id LIMIT %s;",
+                    (after_id if after_id is not None else 0, limit))
+        rows = cur.fetchall()
+        cur.close()
+    return [dict(zip(AGENT_COLUMNS, row)) for row in rows]
+
+def get_agents_version() -> Tuple[int, Optional[int]]:
+    """
+    Returns (row count, highest id) of the 'agents' table. Agents are only
+    ever inserted, so this changes exactly when one is added.
+    """
+    with db_connection() as conn:
+        cur = conn.cursor()
+        cur.execute("SELECT COUNT(*), MAX(id) FROM agents;")
+        version = cur.fetchone()
+        cur.close()
+    return version
+
+def find_similar_agents(task_embedding: np.ndarray, top_n: int = 3, ef_search: Optional[int] = None, probes: Optional[int] = None):
     """
     Finds the top_n most similar agents to a given task embedding.
+    ef_search / probes override the index search parameters for this query.
     """
-    conn = get_db_connection()
-    cur = conn.cursor()
-    embedding_str = f"[{','.join(map(str, task_embedding))}]"
-    # Use the <=> operator for cosine distance
-    cur.execute("""
-        SELECT deepflow_agent_id, 1 - (embedding <=> %s) AS similarity
-        FROM agents
-        ORDER BY similarity DESC
-        LIMIT %s;
-    """, (embedding_str, top_n))
-    similar_agents = cur.fetchall()
-    cur.close()
-    conn.close()
+    embedding = to_vector(task_embedding)
+    with db_connection() as conn:
+        cur = conn.cursor()
+        set_search_params(cur, ef_search, probes)
+        # Order by the raw <=> cosine distance so the vector index can serve the query;
+        # prepared once per pooled connection
+        execute_prepared(cur, "find_similar_agents", """
+            SELECT deepflow_agent_id, 1 - (embedding <=> $1::vector) AS similarity
+            FROM agents
+            ORDER BY embedding <=> $1::vector
+            LIMIT $2
+        """, (embedding, top_n))
+        similar_agents = cur.fetchall()
+        cur.close()
     return similar_agents
 
 def get_agent_by_id(deepflow_agent_id: str):
     """
     Retrieves a single agent from the 'agents' table by its deepflow_agent_id.
     """
-    conn = get_db_connection()
-    cur = conn.cursor()
-    cur.execute("SELECT * FROM agents WHERE deepflow_agent_id = %s;", (deepflow_agent_id,))
-    agent = cur.fetchone()
-    cur.close()
-    conn.close()
+    with db_connection() as conn:
+        cur = conn.cursor()
+        cur.execute("SELECT * FROM agents WHERE deepflow_agent_id = %s;", (deepflow_agent_id,))
+        agent = cur.fetchone()
+        cur.close()
     return agent
 
 if __name__ == '__main__':
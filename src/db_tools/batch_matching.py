@@ -0,0 +1,86 @@
+import os
+from typing import Iterator, List, Optional, Tuple
+import numpy as np
+from src.db_tools.connection_op import db_connection
+from src.db_tools.vector_adapter import vector_from_binary
+from src.db_tools.task_db import TASK_COLUMNS
+from src.db_tools.candidate_db import get_candidates_by_ids
+from src.db_tools.candidate_index import get_member_index, get_agent_index, attach_details
+
+# --- Batch Matching Configuration ---
+# Tasks are scored in chunks so that one chunk's score matrix
+# (tasks x candidates, float32) stays under BATCH_MATCH_MAX_SCORE_MB.
+BATCH_MATCH_MAX_SCORE_MB = float(os.getenv("BATCH_MATCH_MAX_SCORE_MB", "64"))
+BATCH_MATCH_MAX_CHUNK = int(os.getenv("BATCH_MATCH_MAX_CHUNK", "1024"))
+
+def iter_task_chunks(task_ids: Optional[List[int]] = None, undelegated_only: bool = False,
+                     chunk_size: int = BATCH_MATCH_MAX_CHUNK) -> Iterator[Tuple[List[dict], np.ndarray]]:
+    """
+    Streams tasks with embeddings in id order, 'chunk_size' at a time, as
+    (task_details, embedding_matrix) pairs. Uses keyset pagination, so no
+    transaction stays open between chunks.
+
+    Args:
+        task_ids: Restrict to these task ids; None means all tasks.
+        undelegated_only: Skip tasks that already have a delegated_tasks row.
+    """
+    last_id = 0
+    while True:
+        with db_connection() as conn:
+            cur = conn.cursor()
+            cur.execute(f"""
+                SELECT {", ".join(f"t.{col}" for col in TASK_COLUMNS)}, vector_send(t.embedding)
+                FROM tasks t
+                WHERE t.id > %s
+                  AND t.embedding IS NOT NULL
+                  AND (%s::int[] IS NULL OR t.id = ANY(%s::int[]))
+                  AND (NOT %s OR NOT EXISTS (SELECT 1 FROM delegated_tasks d WHERE d.task_id = t.id))
+                ORDER BY t.id
+                LIMIT %s;
+            """, (last_id, task_ids, task_ids, undelegated_only, chunk_size))
+            rows = cur.fetchall()
+            cur.close()
+        if not rows:
+            return
+        tasks = [dict(zip(TASK_COLUMNS, row[:-1])) for row in rows]
+        yield tasks, np.stack([vector_from_binary(row[-1]) for row in rows])
+        last_id = rows[-1][0]
+
+def match_tasks(task_ids: Optional[List[int]] = None, undelegated_only: bool = False,
+                top_n_members: int = 3, top_n_agents: int = 3) -> Iterator[Tuple[dict, List[dict], List[dict]]]:
+    """
+    Computes the top-k members and agents for many tasks in one vectorized pass.
+
+    Task embeddings are read in bulk and scored against the in-memory member
+    and agent indexes with chunked matrix products. Candidate profiles for a
+    whole chunk are fetched in one query. Results are yielded as they are
+    ready, in the same (task_details, member_details, agent_details) shape as
+    find_candidates_for_task, so the next stage can start immediately.
+    """
+    member_index, agent_index = get_member_index(), get_agent_index()
+    member_index.refresh(force=True)
+    agent_index.refresh(force=True)
+
+    candidates = max(len(member_index), len(agent_index), 1)
+    budget_rows = int(BATCH_MATCH_MAX_SCORE_MB * 1024 * 1024 / (4 * candidates))
+    chunk_size = max(1, min(BATCH_MATCH_MAX_CHUNK, budget_rows))
+
+    for tasks, task_matrix in iter_task_chunks(task_ids, undelegated_only, chunk_size):
+        member_hits = member_index.search_batch(task_matrix, top_n_members)
+        agent_hits = agent_index.search_batch(task_matrix, top_n_agents)
+        member_details, agent_details = get_candidates_by_ids(
+            {hit[0] for hits in member_hits for hit in hits},
+            {hit[0] for hits in agent_hits for hit in hits},
+        )
+        for task_details, task_member_hits, task_agent_hits in zip(tasks, member_hits, agent_hits):
+            members, agents = attach_details(task_member_hits, task_agent_hits, member_details, agent_details)
+            yield task_details, members, agents
+
+if __name__ == '__main__':
+    # Delegate every task that has no delegation record yet; with
+    # USE_DELEGATION_REUSE near-duplicates take over an earlier delegation
+    from src.delegation import delegate_candidates, get_reuse_stats, USE_DELEGATION_REUSE
+    for task_details, member_details, agent_details in match_tasks(undelegated_only=True):
+        delegate_candidates(task_details, member_details, agent_details)
+    if USE_DELEGATION_REUSE:
+        print(f"Delegation reuse: {get_reuse_stats()}")
@@ -0,0 +1,103 @@
+from typing import List, Optional, Tuple
+import numpy as np
+from src.db_tools.connection_op import db_connection, execute_prepared
+from src.db_tools.vector_adapter import to_vector
+from src.db_tools.vector_index import set_search_params
+from src.db_tools.resume_db import RESUME_COLUMNS
+from src.db_tools.agent_db import AGENT_COLUMNS
+from src.db_tools.task_db import TASK_COLUMNS
+
+def _candidates_sql(task_sql: str, query_sql: str) -> str:
+    """
+    Builds a single statement returning the task row plus the nearest members
+    ($2 of them) and agents ($3 of them) as JSON, with similarity scores joined
+    and without any embedding column.
+    """
+    member_cols = ", ".join(f"r.{col}" for col in RESUME_COLUMNS)
+    agent_cols = ", ".join(f"a.{col}" for col in AGENT_COLUMNS)
+    return f"""
+        SELECT
+            {task_sql},
+            (SELECT COALESCE(json_agg(m ORDER BY m.similarity DESC), '[]'::json) FROM (
+                SELECT {member_cols}, 1 - (r.embedding <=> {query_sql}) AS similarity
+                FROM resumes r
+                WHERE r.embedding IS NOT NULL
+                ORDER BY r.embedding <=> {query_sql}
+                LIMIT $2
+            ) m),
+            (SELECT COALESCE(json_agg(g ORDER BY g.similarity DESC), '[]'::json) FROM (
+                SELECT {agent_cols}, 1 - (a.embedding <=> {query_sql}) AS similarity
+                FROM agents a
+                WHERE a.embedding IS NOT NULL
+                ORDER BY a.embedding <=> {query_sql}
+                LIMIT $3
+            ) g)
+    """
+
+_TASK_CANDIDATES_SQL = _candidates_sql(
+    "(SELECT row_to_json(t) FROM (SELECT {cols}, embedding IS NOT NULL AS has_embedding FROM tasks WHERE id = $1) t)".format(
+        cols=", ".join(TASK_COLUMNS)
+    ),
+    # A scalar subquery is evaluated once and used as the index search key
+    "(SELECT embedding FROM tasks WHERE id = $1)",
+)
+
+_EMBEDDING_CANDIDATES_SQL = _candidates_sql("NULL::json", "$1::vector")
+
+def find_candidates_for_task(task_id: int, top_n_members: int = 3, top_n_agents: int = 3,
+                             ef_search: Optional[int] = None, probes: Optional[int] = None) -> Tuple[Optional[dict], List[dict], List[dict]]:
+    """
+    Fetches a task and its top-k most similar members and agents in one round trip.
+
+    Returns (task_details, member_details, agent_details), where the candidate
+    dicts carry every profile column except the embedding plus a 'similarity'
+    score, ordered best first. task_details is None if the task doesn't exist;
+    the candidate lists are empty if it has no embedding.
+    """
+    with db_connection() as conn:
+        cur = conn.cursor()
+        set_search_params(cur, ef_search, probes)
+        execute_prepared(cur, "find_candidates_for_task", _TASK_CANDIDATES_SQL, (task_id, top_n_members, top_n_agents))
+        task_details, member_details, agent_details = cur.fetchone()
+        cur.close()
+    if task_details is None:
+        return None, [], []
+    if not task_details.pop("has_embedding"):
+        return task_details, [], []
+    return task_details, member_details, agent_details
+
+def find_candidates(task_embedding: np.ndarray, top_n_members: int = 3, top_n_agents: int = 3,
+                    ef_search: Optional[int] = None, probes: Optional[int] = None) -> Tuple[List[dict], List[dict]]:
+    """
+    Fetches the top-k most similar members and agents for an embedding in one round trip.
+
+    Returns (member_details, agent_details) in the same shape as find_candidates_for_task.
+    """
+    embedding = to_vector(task_embedding)
+    with db_connection() as conn:
+        cur = conn.cursor()
+        set_search_params(cur, ef_search, probes)
+        execute_prepared(cur, "find_candidates", _EMBEDDING_CANDIDATES_SQL, (embedding, top_n_members, top_n_agents))
+        _, member_details, agent_details = cur.fetchone()
+        cur.close()
+    return member_details, agent_details
+
+def get_candidates_by_ids(member_ids: List[int], agent_ids: List[int]) -> Tuple[List[dict], List[dict]]:
+    """
+    Fetches full member and agent profiles (without embeddings) by primary key in one round trip.
+    Returns (member_details, agent_details) in no particular order.
+    """
+    with db_connection() as conn:
+        cur = conn.cursor()
+        cur.execute(f"""
+            SELECT
+                (SELECT COALESCE(json_agg(m), '[]'::json) FROM (
+                    SELECT {", ".join(RESUME_COLUMNS)} FROM resumes WHERE id = ANY(%s)
+                ) m),
+                (SELECT COALESCE(json_agg(g), '[]'::json) FROM (
+                    SELECT {", ".join(AGENT_COLUMNS)} FROM agents WHERE id = ANY(%s)
+                ) g);
+        """, (list(member_ids), list(agent_ids)))
+        member_details, agent_details = cur.fetchone()
+        cur.close()
+    return member_details, agent_details
@@ -0,0 +1,201 @@
+import os
+import threading
+import time
+from typing import List, Optional, Tuple
+import numpy as np
+from src.db_tools.connection_op import db_connection
+from src.db_tools.vector_adapter import to_vector, vector_from_binary
+from src.db_tools.candidate_db import get_candidates_by_ids
+from src.db_tools.task_db import get_task_details
+
+# --- In-memory Index Configuration ---
+# USE_CANDIDATE_INDEX switches delegation from pgvector search to the
+# in-process index. Indexes check for new rows at most every
+# CANDIDATE_INDEX_REFRESH_SECONDS, re-reading rows created up to
+# CANDIDATE_INDEX_LOOKBACK_SECONDS before the newest one already loaded.
+USE_CANDIDATE_INDEX = os.getenv("USE_CANDIDATE_INDEX", "false").lower() in ("1", "true", "yes")
+CANDIDATE_INDEX_REFRESH_SECONDS = float(os.getenv("CANDIDATE_INDEX_REFRESH_SECONDS", "30"))
+CANDIDATE_INDEX_LOOKBACK_SECONDS = float(os.getenv("CANDIDATE_INDEX_LOOKBACK_SECONDS", "300"))
+
+def _normalize_rows(matrix: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(matrix, axis=-1, keepdims=True)
+    norms[norms == 0] = 1
+    return (matrix / norms).astype(np.float32, copy=False)
+
+def top_k(scores: np.ndarray, k: int) -> np.ndarray:
+    """
+    Returns the column indices of the k highest scores in each row of
+    'scores' (1-D or 2-D), best first.
+    """
+    k = min(k, scores.shape[-1])
+    if k <= 0:
+        return np.empty(scores.shape[:-1] + (0,), dtype=np.int64)
+    if k < scores.shape[-1]:
+        candidates = np.argpartition(-scores, k - 1, axis=-1)[..., :k]
+    else:
+        candidates = np.broadcast_to(np.arange(scores.shape[-1]), scores.shape).copy()
+    order = np.argsort(-np.take_along_axis(scores, candidates, axis=-1), axis=-1, kind="stable")
+    return np.take_along_axis(candidates, order, axis=-1)
+
+class CandidateIndex:
+    """
+    In-memory cosine-similarity index over one entity table.
+
+    Embeddings are held pre-normalized in one contiguous float32 matrix with
+    parallel arrays of primary keys and deepflow ids, so a search is a single
+    matrix product. New rows are appended incrementally using a created_at
+    watermark with a lookback window; updates and deletions require reload().
+    """
+    def __init__(self, table: str, deepflow_id_column: str):
+        self.table = table
+        self.deepflow_id_column = deepflow_id_column
+        self.row_ids = np.empty(0, dtype=np.int64)
+        self.deepflow_ids = np.empty(0, dtype=object)
+        self.matrix = np.empty((0, 0), dtype=np.float32)
+        self.watermark = None
+        self.last_refresh = 0.0
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self.row_ids)
+
+    def reload(self):
+        """
+        Discards the loaded rows and reads the whole table again.
+        """
+        with self._lock:
+            self.row_ids = np.empty(0, dtype=np.int64)
+            self.deepflow_ids = np.empty(0, dtype=object)
+            self.matrix = np.empty((0, 0), dtype=np.float32)
+            self.watermark = None
+            self.last_refresh = 0.0
+        self.refresh(force=True)
+
+    def refresh(self, force: bool = False):
+        """
+        Appends rows created since the watermark (less the lookback window)
+        that aren't loaded yet. Without 'force' this is a no-op if the index
+        was refreshed within CANDIDATE_INDEX_REFRESH_SECONDS.
+        """
+        with self._lock:
+            if not force and time.monotonic() - self.last_refresh < CANDIDATE_INDEX_REFRESH_SECONDS:
+                return
+            # created_at is the inserting transaction's start time, so a row can
+            # commit after rows with a later created_at were loaded. Re-reading
+            # a lookback window before the watermark (and skipping known ids)
+            # catches transactions that committed within that window; a row
+            # whose transaction ran longer than that is only loaded by reload()
+            with db_connection() as conn:
+                cur = conn.cursor()
+                cur.execute(f"""
+                    SELECT id, {self.deepflow_id_column}, vector_send(embedding), created_at
+                    FROM {self.table}
+                    WHERE embedding IS NOT NULL
+                      AND (%s::timestamptz IS NULL OR created_at >= %s::timestamptz - make_interval(secs => %s))
+                    ORDER BY created_at;
+                """, (self.watermark, self.watermark, CANDIDATE_INDEX_LOOKBACK_SECONDS))
+                rows = cur.fetchall()
+                cur.close()
+            self.last_refresh = time.monotonic()
+
+            known = set(self.row_ids.tolist())
+            rows = [row for row in rows if row[0] not in known]
+            if not rows:
+                return
+            new_matrix = _normalize_rows(np.stack([vector_from_binary(row[2]) for row in rows]))
+            self.matrix = new_matrix if len(self.matrix) == 0 else np.concatenate([self.matrix, new_matrix])
+            self.row_ids = np.concatenate([self.row_ids, np.array([row[0] for row in rows], dtype=np.int64)])
+            self.deepflow_ids = np.concatenate([self.deepflow_ids, np.array([row[1] for row in rows], dtype=object)])
+            self.watermark = rows[-1][3] if self.watermark is None else max(self.watermark, rows[-1][3])
+
+    def _snapshot(self):
+        self.refresh()
+        with self._lock:
+            return self.matrix, self.row_ids, self.deepflow_ids
+
+    def search_batch(self, query_matrix: np.ndarray, top_n: int = 3) -> List[List[Tuple[int, str, float]]]:
+        """
+        Finds the top_n most similar rows for every query embedding in one
+        matrix product. Returns, per query, (row id, deepflow id, similarity)
+        tuples ordered best first.
+        """
+        matrix, row_ids, deepflow_ids = self._snapshot()
+        queries = _normalize_rows(np.atleast_2d(np.asarray(query_matrix, dtype=np.float32)))
+        if len(matrix) == 0:
+            return [[] for _ in range(len(queries))]
+        scores = queries @ matrix.T
+        indices = top_k(scores, top_n)
+        return [
+            [(int(row_ids[j]), deepflow_ids[j], float(scores[i, j])) for j in indices[i]]
+            for i in range(len(queries))
+        ]
+
+    def search(self, query: np.ndarray, top_n: int = 3) -> List[Tuple[int, str, float]]:
+        """
+        Finds the top_n most similar rows for one query embedding.
+        """
+        return self.search_batch(to_vector(query)[None, :], top_n)[0]
+
+_indexes = {}
+_indexes_lock = threading.Lock()
+
+def _get_index(table: str, deepflow_id_column: str) -> CandidateIndex:
+    with _indexes_lock:
+        if table not in _indexes:
+            _indexes[table] = CandidateIndex(table, deepflow_id_column)
+        return _indexes[table]
+
+def get_member_index() -> CandidateIndex:
+    """
+    Returns the process-wide in-memory index over 'resumes'.
+    """
+    return _get_index("resumes", "deepflow_member_id")
+
+def get_agent_index() -> CandidateIndex:
+    """
+    Returns the process-wide in-memory index over 'agents'.
+    """
+    return _get_index("agents", "deepflow_agent_id")
+
+def find_similar_resumes_in_memory(task_embedding: np.ndarray, top_n: int = 3):
+    """
+    Drop-in for find_similar_resumes: (deepflow_member_id, similarity) rows, best first.
+    """
+    return [(deepflow_id, similarity) for _, deepflow_id, similarity in get_member_index().search(task_embedding, top_n)]
+
+def find_similar_agents_in_memory(task_embedding: np.ndarray, top_n: int = 3):
+    """
+    Drop-in for find_similar_agents: (deepflow_agent_id, similarity) rows, best first.
+    """
+    return [(deepflow_id, similarity) for _, deepflow_id, similarity in get_agent_index().search(task_embedding, top_n)]
+
+def attach_details(member_hits: List[Tuple[int, str, float]], agent_hits: List[Tuple[int, str, float]],
+                   member_details: List[dict], agent_details: List[dict]) -> Tuple[List[dict], List[dict]]:
+    """
+    Orders fetched profiles like the index hits and adds their 'similarity' score.
+    """
+    members_by_id = {member['id']: member for member in member_details}
+    agents_by_id = {agent['id']: agent for agent in agent_details}
+    members = [dict(members_by_id[row_id], similarity=similarity) for row_id, _, similarity in member_hits if row_id in members_by_id]
+    agents = [dict(agents_by_id[row_id], similarity=similarity) for row_id, _, similarity in agent_hits if row_id in agents_by_id]
+    return members, agents
+
+def find_candidates_in_memory(task_embedding: np.ndarray, top_n_members: int = 3, top_n_agents: int = 3) -> Tuple[List[dict], List[dict]]:
+    """
+    Same result as candidate_db.find_candidates, ranked by the in-memory
+    indexes; only the winning profiles are read from the database.
+    """
+    member_hits = get_member_index().search(task_embedding, top_n_members)
+    agent_hits = get_agent_index().search(task_embedding, top_n_agents)
+    member_details, agent_details = get_candidates_by_ids([hit[0] for hit in member_hits], [hit[0] for hit in agent_hits])
+    return attach_details(member_hits, agent_hits, member_details, agent_details)
+
+def find_candidates_for_task_in_memory(task_id: int, top_n_members: int = 3, top_n_agents: int = 3) -> Tuple[Optional[dict], List[dict], List[dict]]:
+    """
+    Same result as candidate_db.find_candidates_for_task, ranked by the in-memory indexes.
+    """
+    task_details, task_embedding = get_task_details(task_id)
+    if task_details is None or task_embedding is None:
+        return task_details, [], []
+    members, agents = find_candidates_in_memory(task_embedding, top_n_members, top_n_agents)
+    return task_details, members, agents
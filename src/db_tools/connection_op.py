@@ -1,9 +1,162 @@
 import os
+import threading
+import time
+from contextlib import contextmanager
 import psycopg2
-from dotenv import load_dotenv
+import psycopg2.extensions
+from psycopg2.pool import ThreadedConnectionPool
+import src.config  # Loads the .env file before the settings below are read
+from src.db_tools.vector_adapter import register_vector_types
 
-load_dotenv(dotenv_path=".env")  # Load environment variables from .env file
+# --- Pool Configuration ---
+# DB_POOL_MIN / DB_POOL_MAX bound the number of open connections per process.
+# Connections idle for longer than DB_POOL_PING_INTERVAL seconds are pinged
+# with 'SELECT 1' before being handed out again.
+DB_POOL_MIN = int(os.getenv("DB_POOL_MIN", "1"))
+DB_POOL_MAX = int(os.getenv("DB_POOL_MAX", "10"))
+DB_POOL_PING_INTERVAL = float(os.getenv("DB_POOL_PING_INTERVAL", "30"))
+DB_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", "30"))
+
+class PooledConnection(psycopg2.extensions.connection):
+    """
+    psycopg2 connection that remembers which statements have been prepared
+    server-side on it, whether the pgvector adapters are registered, the
+    vector search parameters set on its session and when it was last
+    returned to the pool.
+    """
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.prepared_statements = set()
+        self.vector_types_registered = False
+        self.search_params = None
+        self.last_used = time.monotonic()
+
+_pool = None
+_pool_lock = threading.Lock()
+# ThreadedConnectionPool raises instead of blocking when exhausted, so
+# checkouts are gated by a semaphore sized to the pool.
+_pool_slots = threading.BoundedSemaphore(DB_POOL_MAX)
+
+def get_pool() -> ThreadedConnectionPool:
+    """
+    Returns the process-wide connection pool, creating it on first use.
+    """
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                _pool = ThreadedConnectionPool(
+                    DB_POOL_MIN,
+                    DB_POOL_MAX,
+                    os.getenv("DATABASE_URI"),
+                    connection_factory=PooledConnection,
+                )
+    return _pool
+
+def close_pool():
+    """
+    Closes every connection held by the pool. The next checkout creates a new pool.
+    """
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.closeall()
+            _pool = None
+
+def _is_healthy(conn) -> bool:
+    if conn.closed:
+        return False
+    if conn.info.transaction_status == psycopg2.extensions.TRANSACTION_STATUS_UNKNOWN:
+        return False
+    if time.monotonic() - conn.last_used < DB_POOL_PING_INTERVAL:
+        return True
+    try:
+        with conn.cursor() as cur:
+            cur.execute("SELECT 1;")
+        conn.rollback()
+        return True
+    except psycopg2.Error:
+        return False
+
+def _checkout():
+    if not _pool_slots.acquire(timeout=DB_POOL_TIMEOUT):
+        raise psycopg2.pool.PoolError(f"No database connection available after {DB_POOL_TIMEOUT}s")
+    try:
+        pool = get_pool()
+        conn = pool.getconn()
+        while not _is_healthy(conn):
+            pool.putconn(conn, close=True)
+            conn = pool.getconn()
+        # Embeddings are sent and received as float32 NumPy arrays; until the
+        # vector extension exists this is retried on every checkout
+        if not conn.vector_types_registered:
+            try:
+                conn.vector_types_registered = register_vector_types(conn)
+            except psycopg2.Error:
+                pool.putconn(conn, close=True)
+                raise
+        return conn
+    except Exception:
+        _pool_slots.release()
+        raise
+
+def _checkin(conn, close: bool = False):
+    try:
+        conn.last_used = time.monotonic()
+        get_pool().putconn(conn, close=close or conn.closed)
+    finally:
+        _pool_slots.release()
+
+@contextmanager
+def db_connection():
+    """
+    Context manager that borrows a connection from the pool.
+
+    The transaction is committed when the block exits normally and rolled back
+    if it raises; the connection is then returned to the pool.
+    """
+    conn = _checkout()
+    broken = False
+    try:
+        yield conn
+        conn.commit()
+    except Exception:
+        # A rollback also undoes session settings made in the transaction
+        conn.search_params = None
+        try:
+            conn.rollback()
+        except psycopg2.Error:
+            broken = True
+        raise
+    finally:
+        _checkin(conn, close=broken)
+
+@contextmanager
+def db_cursor():
+    """
+    Context manager that yields a cursor on a pooled connection.
+    """
+    with db_connection() as conn:
+        with conn.cursor() as cur:
+            yield cur
+
+def execute_prepared(cur, name: str, sql: str, params: tuple):
+    """
+    Executes 'sql' (written with $1, $2, ... placeholders) as a server-side
+    prepared statement, preparing it once per pooled connection.
+    """
+    conn = cur.connection
+    if name not in conn.prepared_statements:
+        cur.execute(f"PREPARE {name} AS {sql}")
+        conn.prepared_statements.add(name)
+    placeholders = ", ".join(["%s"] * len(params))
+    cur.execute(f"EXECUTE {name} ({placeholders})", params)
 
 def get_db_connection():
+    """
+    Opens a dedicated, unpooled connection. Prefer db_connection() for
+    anything on the request path.
+    """
     conn = psycopg2.connect(os.getenv("DATABASE_URI"))
+    register_vector_types(conn)
     return conn
@@ -1,13 +1,18 @@
 import json
-from src.db_tools.connection_op import get_db_connection
-from typing import List
+from src.db_tools.connection_op import db_connection, db_cursor
+from src.db_tools.vector_index import set_search_params
+from typing import List, Optional, Tuple
 
-def create_delegated_tasks_table():
+DELEGATED_TASK_COLUMNS = ['task_id', 'member_ids', 'agent_ids', 'created_at', 'updated_at']
+
+def create_delegated_tasks_table(cur=None):
     """
     Creates the 'delegated_tasks' table in the database if it doesn't already exist.
+    Given a cursor, runs in the caller's transaction; errors are raised.
     """
-    conn = get_db_connection()
-    cur = conn.cursor()
+    if cur is None:
+        with db_cursor() as cur:
+            return create_delegated_tasks_table(cur)
     cur.execute("""
         CREATE TABLE IF NOT EXISTS delegated_tasks (
             task_id INTEGER PRIMARY KEY,
@@ -35,40 +40,108 @@ def create_delegated_tasks_table():
         FOR EACH ROW
         EXECUTE FUNCTION update_updated_at_column();
     """)
-    conn.commit()
-    cur.close()
-    conn.close()
     print(" 'delegated_tasks' table created or already exists.")
 
 def insert_delegated_task(task_id: int, member_ids: List[str], agent_ids: List[str]):
     """
     Inserts or updates a delegated task record in the 'delegated_tasks' table.
     """
-    conn = get_db_connection()
-    cur = conn.cursor()
-    cur.execute("""
-        INSERT INTO delegated_tasks (task_id, member_ids, agent_ids)
-        VALUES (%s, %s, %s)
-        ON CONFLICT (task_id) DO UPDATE SET
-            member_ids = EXCLUDED.member_ids,
-            agent_ids = EXCLUDED.agent_ids;
-    """, (task_id, member_ids, agent_ids))
-    conn.commit()
-    cur.close()
-    conn.close()
+    with db_connection() as conn:
+        cur = conn.cursor()
+        cur.execute("""
+            INSERT INTO delegated_tasks (task_id, member_ids, agent_ids)
+            VALUES (%s, %s, %s)
+            ON CONFLICT (task_id) DO UPDATE SET
+                member_ids = EXCLUDED.member_ids,
+                agent_ids = EXCLUDED.agent_ids;
+        """, (task_id, member_ids, agent_ids))
+        cur.close()
     print(f"Delegated task for task ID {task_id} inserted or updated successfully.")
 
 def get_all_delegated_tasks():
     """
     Retrieves all records from the 'delegated_tasks' table.
     """
-    conn = get_db_connection()
-    cur = conn.cursor()
-    cur.execute("SELECT * FROM delegated_tasks;")
-    delegated_tasks = cur.fetchall()
-    cur.close()
-    conn.close()
+    with db_connection() as conn:
+        cur = conn.cursor()
+        cur.execute("SELECT * FROM delegated_tasks;")
+        delegated_tasks = cur.fetchall()
+        cur.close()
     return delegated_tasks
 
+def get_delegated_task(task_id: int) -> Optional[dict]:
+    """
+    Retrieves the delegation record of a task as a dict of DELEGATED_TASK_COLUMNS, or None.
+    """
+    with db_connection() as conn:
+        cur = conn.cursor()
+        cur.execute(f"SELECT {', '.join(DELEGATED_TASK_COLUMNS)} FROM delegated_tasks WHERE task_id = %s;", (task_id,))
+        row = cur.fetchone()
+        cur.close()
+    return dict(zip(DELEGATED_TASK_COLUMNS, row)) if row else None
+
+def list_delegated_tasks(after_task_id: Optional[int] = None, limit: int = 50) -> List[dict]:
+    """
+    Returns a page of up to 'limit' delegation records as dicts of
+    DELEGATED_TASK_COLUMNS, in task_id order, starting after 'after_task_id'.
+    """
+    with db_connection() as conn:
+        cur = conn.cursor()
+        cur.execute(f"SELECT {', '.join(DELEGATED_TASK_COLUMNS)} FROM delegated_tasks WHERE task_id > %s ORDER BY task_id LIMIT %s;",
+                    (after_task_id if after_task_id is not None else 0, limit))
+        rows = cur.fetchall()
+        cur.close()
+    return [dict(zip(DELEGATED_TASK_COLUMNS, row)) for row in rows]
+
+def get_delegated_tasks_version() -> Tuple[int, Optional[object]]:
+    """
+    Returns (row count, latest updated_at) of the 'delegated_tasks' table,
+    which changes whenever a delegation is inserted or updated.
+    """
+    with db_connection() as conn:
+        cur = conn.cursor()
+        cur.execute("SELECT COUNT(*), MAX(updated_at) FROM delegated_tasks;")
+        version = cur.fetchone()
+        cur.close()
+    return version
+
+def find_nearest_delegated_task(task_id: int, ef_search: Optional[int] = None) -> Optional[dict]:
+    """
+    Finds the already-delegated task whose embedding is closest to that of
+    task 'task_id'. Returns its task_id, member_ids, agent_ids, cosine
+    'distance', the delegation's 'delegated_at' and 'pool_changed_at' (the
+    created_at of the newest resume or agent), or None if there is none.
+
+    The search walks the HNSW index on tasks.embedding and keeps the first
+    delegated task it meets, so it is approximate: if none of the ef_search
+    nearest tasks is delegated, None is returned (no reuse, never a wrong one).
+    """
+    with db_connection() as conn:
+        cur = conn.cursor()
+        set_search_params(cur, ef_search)
+        cur.execute("""
+            WITH nearest AS (
+                SELECT t.id, t.embedding <=> (SELECT embedding FROM tasks WHERE id = %(task_id)s) AS distance
+                FROM tasks t
+                WHERE t.id <> %(task_id)s
+                  AND t.embedding IS NOT NULL
+                  AND EXISTS (SELECT 1 FROM delegated_tasks d WHERE d.task_id = t.id)
+                ORDER BY t.embedding <=> (SELECT embedding FROM tasks WHERE id = %(task_id)s)
+                LIMIT 1
+            )
+            SELECT d.task_id, d.member_ids, d.agent_ids, nearest.distance,
+                   GREATEST(d.created_at, d.updated_at) AS delegated_at,
+                   GREATEST((SELECT created_at FROM resumes ORDER BY id DESC LIMIT 1),
+                            (SELECT created_at FROM agents ORDER BY id DESC LIMIT 1)) AS pool_changed_at
+            FROM nearest
+            JOIN delegated_tasks d ON d.task_id = nearest.id
+            WHERE nearest.distance IS NOT NULL;
+        """, {"task_id": task_id})
+        row = cur.fetchone()
+        cur.close()
+    if row is None:
+        return None
+    return dict(zip(['task_id', 'member_ids', 'agent_ids', 'distance', 'delegated_at', 'pool_changed_at'], row))
+
 if __name__ == '__main__':
     create_delegated_tasks_table()
@@ -0,0 +1,175 @@
+import os
+from typing import Optional
+from src.db_tools.connection_op import db_connection, db_cursor
+
+# --- Job Queue Configuration ---
+# A failed job is retried up to DELEGATION_JOB_MAX_ATTEMPTS times, waiting
+# DELEGATION_JOB_RETRY_SECONDS * attempts between tries. A job still running
+# after DELEGATION_JOB_STALE_SECONDS is assumed lost (worker crashed) and requeued.
+DELEGATION_JOB_MAX_ATTEMPTS = int(os.getenv("DELEGATION_JOB_MAX_ATTEMPTS", "3"))
+DELEGATION_JOB_RETRY_SECONDS = float(os.getenv("DELEGATION_JOB_RETRY_SECONDS", "30"))
+DELEGATION_JOB_STALE_SECONDS = float(os.getenv("DELEGATION_JOB_STALE_SECONDS", "600"))
+
+JOB_COLUMNS = ['id', 'task_id', 'state', 'attempts', 'max_attempts', 'use_cache', 'result', 'error', 'worker',
+               'enqueued_at', 'run_after', 'started_at', 'finished_at']
+
+def create_delegation_jobs_table(cur=None):
+    """
+    Creates the 'delegation_jobs' table in the database if it doesn't already exist.
+    Given a cursor, runs in the caller's transaction; errors are raised.
+    """
+    if cur is None:
+        with db_cursor() as cur:
+            return create_delegation_jobs_table(cur)
+    cur.execute("""
+        CREATE TABLE IF NOT EXISTS delegation_jobs (
+            id BIGSERIAL PRIMARY KEY,
+            task_id INTEGER NOT NULL REFERENCES tasks (id) ON DELETE CASCADE,
+            state TEXT NOT NULL DEFAULT 'queued' CHECK (state IN ('queued', 'running', 'done', 'failed')),
+            attempts INTEGER NOT NULL DEFAULT 0,
+            max_attempts INTEGER NOT NULL DEFAULT 3,
+            use_cache BOOLEAN NOT NULL DEFAULT TRUE,
+            result JSONB,
+            error TEXT,
+            worker TEXT,
+            enqueued_at TIMESTAMP WITH TIME ZONE NOT NULL DEFAULT CURRENT_TIMESTAMP,
+            run_after TIMESTAMP WITH TIME ZONE NOT NULL DEFAULT CURRENT_TIMESTAMP,
+            started_at TIMESTAMP WITH TIME ZONE,
+            finished_at TIMESTAMP WITH TIME ZONE
+        );
+    """)
+    # Claims scan only the queued rows; at most one active job per task
+    cur.execute("CREATE INDEX IF NOT EXISTS delegation_jobs_queued_idx ON delegation_jobs (run_after, id) WHERE state = 'queued';")
+    cur.execute("CREATE UNIQUE INDEX IF NOT EXISTS delegation_jobs_active_task_idx ON delegation_jobs (task_id) WHERE state IN ('queued', 'running');")
+    print(" 'delegation_jobs' table created or already exists.")
+
+def enqueue_delegation_job(task_id: int, use_cache: bool = True) -> int:
+    """
+    Queues a delegation of task 'task_id' and returns the job id. If the task
+    already has a queued or running job, that job's id is returned instead.
+    """
+    with db_connection() as conn:
+        cur = conn.cursor()
+        row = None
+        # The conflicting job can finish between the insert and the select;
+        # the insert then goes through on the next try
+        for _ in range(3):
+            cur.execute("""
+                INSERT INTO delegation_jobs (task_id, use_cache, max_attempts)
+                VALUES (%s, %s, %s)
+                ON CONFLICT (task_id) WHERE state IN ('queued', 'running') DO NOTHING
+                RETURNING id;
+            """, (task_id, use_cache, DELEGATION_JOB_MAX_ATTEMPTS))
+            row = cur.fetchone()
+            if row is None:
+                cur.execute("SELECT id FROM delegation_jobs WHERE task_id = %s AND state IN ('queued', 'running');", (task_id,))
+                row = cur.fetchone()
+            if row is not None:
+                break
+        cur.close()
+    if row is None:
+        raise RuntimeError(f"Could not queue a delegation of task {task_id}.")
+    return row[0]
+
+def claim_delegation_job(worker: str) -> Optional[dict]:
+    """
+    Atomically takes the oldest runnable queued job for 'worker' and marks it
+    running. Concurrent workers skip rows locked by each other, so every job
+    is handed to exactly one of them. Returns the job, or None if there is none.
+    """
+    with db_connection() as conn:
+        cur = conn.cursor()
+        cur.execute(f"""
+            UPDATE delegation_jobs
+            SET state = 'running', attempts = attempts + 1, worker = %s, started_at = NOW(), error = NULL
+            WHERE id = (
+                SELECT id FROM delegation_jobs
+                WHERE state = 'queued' AND run_after <= NOW()
+                ORDER BY run_after, id
+                FOR UPDATE SKIP LOCKED
+                LIMIT 1
+            )
+            RETURNING {", ".join(JOB_COLUMNS)};
+        """, (worker,))
+        row = cur.fetchone()
+        cur.close()
+    return dict(zip(JOB_COLUMNS, row)) if row else None
+
+def complete_delegation_job(job_id: int, worker: str, result_json: Optional[str]) -> bool:
+    """
+    Marks a job done and stores its DelegationResult JSON. Only the worker
+    still running the job can complete it; returns False if it was requeued
+    (and possibly claimed by another worker) in the meantime.
+    """
+    with db_connection() as conn:
+        cur = conn.cursor()
+        cur.execute("""
+            UPDATE delegation_jobs SET state = 'done', result = %s::jsonb, finished_at = NOW()
+            WHERE id = %s AND state = 'running' AND worker = %s;
+        """, (result_json, job_id, worker))
+        updated = cur.rowcount == 1
+        cur.close()
+    return updated
+
+def fail_delegation_job(job_id: int, worker: str, error: str) -> bool:
+    """
+    Records a failed attempt. The job is queued again after a linear backoff
+    while attempts remain, and marked failed otherwise. Like
+    complete_delegation_job, returns False if 'worker' no longer runs the job.
+    """
+    with db_connection() as conn:
+        cur = conn.cursor()
+        cur.execute("""
+            UPDATE delegation_jobs
+            SET error = %s,
+                state = CASE WHEN attempts < max_attempts THEN 'queued' ELSE 'failed' END,
+                run_after = NOW() + make_interval(secs => %s * attempts),
+                finished_at = CASE WHEN attempts < max_attempts THEN NULL ELSE NOW() END
+            WHERE id = %s AND state = 'running' AND worker = %s;
+        """, (error, DELEGATION_JOB_RETRY_SECONDS, job_id, worker))
+        updated = cur.rowcount == 1
+        cur.close()
+    return updated
+
+def requeue_stale_delegation_jobs() -> int:
+    """
+    Puts jobs running for longer than DELEGATION_JOB_STALE_SECONDS (their
+    worker most likely died) back in the queue. Returns how many were requeued.
+    """
+    with db_connection() as conn:
+        cur = conn.cursor()
+        cur.execute("""
+            UPDATE delegation_jobs
+            SET state = CASE WHEN attempts < max_attempts THEN 'queued' ELSE 'failed' END,
+                error = 'worker did not finish the job in time',
+                finished_at = CASE WHEN attempts < max_attempts THEN NULL ELSE NOW() END
+            WHERE state = 'running' AND started_at < NOW() - make_interval(secs => %s);
+        """, (DELEGATION_JOB_STALE_SECONDS,))
+        count = cur.rowcount
+        cur.close()
+    return count
+
+def get_delegation_job(job_id: int) -> Optional[dict]:
+    """
+    Retrieves a job by id.
+    """
+    with db_connection() as conn:
+        cur = conn.cursor()
+        cur.execute(f"SELECT {', '.join(JOB_COLUMNS)} FROM delegation_jobs WHERE id = %s;", (job_id,))
+        row = cur.fetchone()
+        cur.close()
+    return dict(zip(JOB_COLUMNS, row)) if row else None
+
+def get_latest_delegation_job(task_id: int) -> Optional[dict]:
+    """
+    Retrieves the most recently enqueued job of a task.
+    """
+    with db_connection() as conn:
+        cur = conn.cursor()
+        cur.execute(f"SELECT {', '.join(JOB_COLUMNS)} FROM delegation_jobs WHERE task_id = %s ORDER BY id DESC LIMIT 1;", (task_id,))
+        row = cur.fetchone()
+        cur.close()
+    return dict(zip(JOB_COLUMNS, row)) if row else None
+
+if __name__ == '__main__':
+    create_delegation_jobs_table()
@@ -0,0 +1,117 @@
+import argparse
+from typing import Callable, List, Optional, Tuple
+from src.db_tools.connection_op import db_connection, get_db_connection
+from src.db_tools.resume_db import create_resume_table
+from src.db_tools.task_db import create_tasks_table, create_task_search_indexes
+from src.db_tools.agent_db import create_agents_table
+from src.db_tools.delegated_task_db import create_delegated_tasks_table
+from src.db_tools.delegation_job_db import create_delegation_jobs_table
+
+# Key of the session-level advisory lock held while migrating, so concurrent
+# processes (app instances, workers) apply each step exactly once
+MIGRATION_LOCK_ID = 7_205_318_001
+
+def _initial_schema(cur):
+    create_tasks_table(cur)
+    create_resume_table(cur)
+    create_agents_table(cur)
+    create_delegated_tasks_table(cur)
+
+# Ordered schema steps, each called with the migration cursor. Append new
+# steps with the next version; never edit or reorder applied ones. Steps must
+# be idempotent (databases created before versioning already contain the
+# objects of the early steps) and must raise on failure.
+MIGRATIONS: List[Tuple[int, str, Callable[[object], None]]] = [
+    (1, "resumes, tasks, agents and delegated_tasks tables", _initial_schema),
+    (2, "delegation_jobs queue", create_delegation_jobs_table),
+    (3, "pg_trgm search indexes on tasks", create_task_search_indexes),
+]
+
+LATEST_VERSION = MIGRATIONS[-1][0]
+
+def _create_schema_version_table(cur):
+    cur.execute("""
+        CREATE TABLE IF NOT EXISTS schema_version (
+            version INTEGER PRIMARY KEY,
+            description TEXT NOT NULL,
+            applied_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP
+        );
+    """)
+
+def get_schema_version() -> int:
+    """
+    Returns the highest applied migration version, or 0 if none has been
+    applied (or the schema_version table doesn't exist yet).
+    """
+    with db_connection() as conn:
+        cur = conn.cursor()
+        cur.execute("SELECT to_regclass('schema_version') IS NOT NULL;")
+        if not cur.fetchone()[0]:
+            cur.close()
+            return 0
+        cur.execute("SELECT COALESCE(MAX(version), 0) FROM schema_version;")
+        version = cur.fetchone()[0]
+        cur.close()
+    return version
+
+def migrate(target: Optional[int] = None) -> int:
+    """
+    Applies every migration above the current version, up to 'target'
+    (default: the latest), in order, and returns the resulting version.
+    Runs under an advisory lock on a dedicated connection. Each step runs in
+    its own transaction together with its schema_version row, so a step that
+    fails leaves neither its objects nor its version behind and the error is
+    raised.
+    """
+    target = LATEST_VERSION if target is None else target
+    conn = get_db_connection()
+    try:
+        cur = conn.cursor()
+        cur.execute("SELECT pg_advisory_lock(%s);", (MIGRATION_LOCK_ID,))
+        try:
+            _create_schema_version_table(cur)
+            conn.commit()
+            cur.execute("SELECT COALESCE(MAX(version), 0) FROM schema_version;")
+            version = cur.fetchone()[0]
+            conn.commit()
+            for step_version, description, step in MIGRATIONS:
+                if step_version <= version or step_version > target:
+                    continue
+                print(f"Applying migration {step_version}: {description}")
+                step(cur)
+                cur.execute("INSERT INTO schema_version (version, description) VALUES (%s, %s);",
+                            (step_version, description))
+                conn.commit()
+                version = step_version
+        finally:
+            conn.rollback()
+            cur.execute("SELECT pg_advisory_unlock(%s);", (MIGRATION_LOCK_ID,))
+            conn.commit()
+            cur.close()
+    finally:
+        conn.close()
+    print(f"Database schema is at version {version}.")
+    return version
+
+def ensure_schema() -> int:
+    """
+    Migrates only if the database is behind LATEST_VERSION. An up-to-date
+    database costs a single query and no DDL.
+    """
+    version = get_schema_version()
+    if version >= LATEST_VERSION:
+        return version
+    return migrate()
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Apply or inspect database schema migrations.")
+    parser.add_argument("--status", action="store_true", help="Print the current and latest versions without migrating.")
+    parser.add_argument("--target", type=int, default=None, help="Migrate up to this version instead of the latest.")
+    args = parser.parse_args()
+    if args.status:
+        current = get_schema_version()
+        print(f"Current schema version: {current}, latest: {LATEST_VERSION}.")
+        for step_version, description, _ in MIGRATIONS:
+            print(f"  {'applied' if step_version <= current else 'pending'}  {step_version}: {description}")
+    else:
+        migrate(args.target)
@@ -1,111 +1,70 @@
 import json
 import os
-from typing import List, Optional
+from typing import List, Optional, Tuple
 from datetime import datetime
 from pydantic import BaseModel, Field
+import numpy as np
+from psycopg2.extras import execute_values
 from src.models import ResumeData
-# Ensure you have the 'openai' library installed: pip install openai
-import openai
 
-# Assuming src.db_tools.connection_op.get_db_connection is correctly set up
-# This function should return a psycopg2 connection object.
-from src.db_tools.connection_op import get_db_connection
+# Connections are borrowed from the process-wide pool in src.db_tools.connection_op
+from src.db_tools.connection_op import db_connection, db_cursor, execute_prepared
+from src.db_tools.vector_adapter import to_vector
+from src.db_tools.vector_index import create_vector_index, set_search_params
 
-# --- OpenAI Configuration ---
-# It's highly recommended to load your API key from environment variables
-# For example: export OPENAI_API_KEY='your_api_key_here'
-OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
+# --- Embedding Generation ---
+# Embeddings come from the shared, batching embedding service
+from src.llm_tools.embedding import get_openai_embedding, get_openai_embeddings
 
-if not OPENAI_API_KEY:
-    print("Warning: OPENAI_API_KEY environment variable not set. Embedding generation will fail.")
-    # You might want to raise an error or handle this more robustly in a production environment
-    # raise ValueError("OPENAI_API_KEY environment variable not set.")
-
-# Initialize OpenAI client (ensure you have the 'openai' package installed)
-# For older versions of openai library, you might use: openai.api_key = OPENAI_API_KEY
-client = openai.OpenAI(api_key=OPENAI_API_KEY)
-
-# --- Embedding Generation Function ---
-def get_openai_embedding(text: str, model: str = "text-embedding-ada-002") -> List[float]:
-    """
-    Generates a vector embedding for the given text using OpenAI's embedding model.
-
-    Args:
-        text (str): The input text to embed.
-        model (str): The OpenAI embedding model to use. Default is "text-embedding-ada-002".
-
-    Returns:
-        List[float]: A list of floats representing the vector embedding.
-                     Returns an empty list if embedding generation fails.
-    """
-    if not OPENAI_API_KEY:
-        print("Error: OpenAI API key is not set. Cannot generate embeddings.")
-        return []
-    try:
-        # OpenAI's embedding API expects a list of strings, even for a single text
-        response = client.embeddings.create(input=[text], model=model)
-        # The embedding is in response.data[0].embedding
-        return response.data[0].embedding
-    except openai.APIError as e:
-        print(f"OpenAI API error during embedding generation: {e}")
-        return []
-    except Exception as e:
-        print(f"An unexpected error occurred during embedding generation: {e}")
-        return []
+# Columns of the 'resumes' table in table order, without the embedding
+RESUME_COLUMNS = [
+    'id', 'deepflow_member_id', 'personal_summary', 'technical_skills', 'certifications',
+    'soft_skills', 'vocal_attributes', 'task_delegation_recommendations',
+    'specialization_task_categories', 'additional_observations', 'created_at'
+]
 
 # --- Database Table Creation Function ---
-def create_resume_table():
+def create_resume_table(cur=None):
     """
     Creates the 'resumes' table in the database if it doesn't already exist,
     including a 'vector' column for storing embeddings and 'deepflow_member_id'.
     Requires the pgvector extension to be enabled in your PostgreSQL database.
+    Given a cursor, runs in the caller's transaction; errors are raised.
     """
-    conn = get_db_connection()
-    cur = conn.cursor()
-    try:
-        # Check if pgvector extension is enabled (optional, but good practice)
-        cur.execute("CREATE EXTENSION IF NOT EXISTS vector;")
-        conn.commit()
-        print("pgvector extension ensured.")
+    if cur is None:
+        with db_cursor() as cur:
+            return create_resume_table(cur)
+    # Check if pgvector extension is enabled (optional, but good practice)
+    cur.execute("CREATE EXTENSION IF NOT EXISTS vector;")
+    print("pgvector extension ensured.")
 
-        # Create the resumes table with a VECTOR column and deepflow_member_id
-        # text-embedding-ada-002 produces 1536-dimensional vectors
-        cur.execute("""
-            CREATE TABLE IF NOT EXISTS resumes (
-                id SERIAL PRIMARY KEY,
-                deepflow_member_id TEXT UNIQUE NOT NULL, -- New column for Deepflow Member ID
-                personal_summary TEXT NOT NULL,
-                technical_skills JSONB NOT NULL,
-                certifications JSONB NOT NULL,
-                soft_skills JSONB NOT NULL,
-                vocal_attributes TEXT,
-                task_delegation_recommendations JSONB NOT NULL,
-                specialization_task_categories JSONB NOT NULL,
-                additional_observations JSONB NOT NULL,
-                embedding VECTOR(1536), -- New column for storing the vector embedding
-                created_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP
-            );
-        """)
-        conn.commit()
-        print(" 'resumes' table created or already exists with 'embedding' and 'deepflow_member_id' columns.")
-    except Exception as e:
-        print(f"Error creating resumes table: {e}")
-        conn.rollback() # Rollback in case of error
-    finally:
-        cur.close()
-        conn.close()
+    # Create the resumes table with a VECTOR column and deepflow_member_id
+    # text-embedding-ada-002 produces 1536-dimensional vectors
+    cur.execute("""
+        CREATE TABLE IF NOT EXISTS resumes (
+            id SERIAL PRIMARY KEY,
+            deepflow_member_id TEXT UNIQUE NOT NULL, -- New column for Deepflow Member ID
+            personal_summary TEXT NOT NULL,
+            technical_skills JSONB NOT NULL,
+            certifications JSONB NOT NULL,
+            soft_skills JSONB NOT NULL,
+            vocal_attributes TEXT,
+            task_delegation_recommendations JSONB NOT NULL,
+            specialization_task_categories JSONB NOT NULL,
+            additional_observations JSONB NOT NULL,
+            embedding VECTOR(1536), -- New column for storing the vector embedding
+            created_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP
+        );
+    """)
+    # Cosine index on the embedding column for similarity search
+    create_vector_index(cur, "resumes")
+    print(" 'resumes' table created or already exists with 'embedding' and 'deepflow_member_id' columns.")
 
-# --- Data Insertion Function (Modified) ---
-def insert_resume_data(deepflow_member_id, resume_data: ResumeData):
+def resume_embedding_text(resume_data: ResumeData) -> str:
     """
-    Inserts a ResumeData object into the 'resumes' table,
-    generating and storing its vector embedding, including deepflow_member_id.
-
-    Args:
-        resume_data: An instance of the ResumeData Pydantic model.
+    Concatenates the relevant text fields of a resume for embedding generation.
     """
-    # Concatenate relevant text fields for embedding generation
-    text_to_embed = (
+    return (
         resume_data.personal_summary + " " +
         " ".join(resume_data.technical_skills) + " " +
         " ".join(resume_data.soft_skills) + " " +
@@ -115,24 +74,112 @@ def insert_resume_data(deepflow_member_id, resume_data: ResumeData):
         " ".join(resume_data.additional_observations)
     ).strip()
 
-    # Generate the embedding
-    embedding = get_openai_embedding(text_to_embed)
+# --- Data Insertion Function (Modified) ---
+def insert_resume_data(deepflow_member_id, resume_data: ResumeData):
+    """
+    Inserts a ResumeData object into the 'resumes' table,
+    generating and storing its vector embedding, including deepflow_member_id.
+
+    Args:
+        resume_data: An instance of the ResumeData Pydantic model.
+    """
+    # Generate the embedding as a float32 array; the registered pgvector adapter
+    # sends it as a vector value, and a failed embedding (None) is stored as NULL
+    embedding = get_openai_embedding(resume_embedding_text(resume_data))
 
-    if not embedding:
+    if embedding is None:
         print("Warning: Could not generate embedding for resume. Storing without embedding.")
-        # If embedding fails, store None or an empty vector, depending on your schema's NULLability
-        embedding_str = None
-    else:
-        # Convert the list of floats to a string representation for PostgreSQL's VECTOR type
-        # pgvector expects '[val1, val2, ...]' format
-        embedding_str = "[" + ",".join(map(str, embedding)) + "]"
 
-    conn = get_db_connection()
-    cur = conn.cursor()
-    try:
-        cur.execute("""
+    with db_connection() as conn:
+        cur = conn.cursor()
+        try:
+            cur.execute("""
+                INSERT INTO resumes (
+                    deepflow_member_id, -- New column
+                    personal_summary,
+                    technical_skills,
+                    certifications,
+                    soft_skills,
+                    vocal_attributes,
+                    task_delegation_recommendations,
+                    specialization_task_categories,
+                    additional_observations,
+                    embedding
+                ) VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
+            """, (
+                deepflow_member_id, # Pass the deepflow_member_id
+                resume_data.personal_summary,
+                json.dumps(resume_data.technical_skills),
+                json.dumps(resume_data.certifications),
+                json.dumps(resume_data.soft_skills),
+                resume_data.vocal_attributes,
+                json.dumps(resume_data.task_delegation_recommendations),
+                json.dumps(resume_data.specialization_task_categories),
+                json.dumps(resume_data.additional_observations),
+                embedding
+            ))
+            conn.commit()
+            print(f"Resume data for member ID '{deepflow_member_id}' inserted successfully. Embedding {'generated and stored' if embedding is not None else 'failed to generate'}.")
+        except Exception as e:
+            print(f"Error inserting resume data for member ID '{deepflow_member_id}': {e}")
+            conn.rollback()
+        finally:
+            cur.close()
+
+def insert_resume_data_batch(resumes: List[Tuple[str, ResumeData]]) -> List[str]:
+    """
+    Inserts many (deepflow_member_id, ResumeData) pairs into the 'resumes' table.
+
+    All embeddings are generated through batched embedding requests and the rows
+    are written with a single multi-row INSERT. Members that already exist
+    are skipped (and not embedded); database errors are raised.
+
+    Args:
+        resumes: A list of (deepflow_member_id, ResumeData) tuples.
+
+    Returns:
+        The deepflow_member_ids that were inserted, in input order.
+    """
+    if not resumes:
+        return []
+    with db_connection() as conn:
+        cur = conn.cursor()
+        cur.execute("SELECT deepflow_member_id FROM resumes WHERE deepflow_member_id = ANY(%s);",
+                    ([deepflow_member_id for deepflow_member_id, _ in resumes],))
+        existing = {row[0] for row in cur.fetchall()}
+        cur.close()
+    new_resumes = [(deepflow_member_id, resume_data) for deepflow_member_id, resume_data in resumes
+                   if deepflow_member_id not in existing]
+    if not new_resumes:
+        print(f"All {len(resumes)} members already exist; nothing inserted.")
+        return []
+
+    embeddings = get_openai_embeddings([resume_embedding_text(resume_data) for _, resume_data in new_resumes])
+    rows = [
+        (
+            deepflow_member_id,
+            resume_data.personal_summary,
+            json.dumps(resume_data.technical_skills),
+            json.dumps(resume_data.certifications),
+            json.dumps(resume_data.soft_skills),
+            resume_data.vocal_attributes,
+            json.dumps(resume_data.task_delegation_recommendations),
+            json.dumps(resume_data.specialization_task_categories),
+            json.dumps(resume_data.additional_observations),
+            embedding
+        )
+        for (deepflow_member_id, resume_data), embedding in zip(new_resumes, embeddings)
+    ]
+    missing = sum(1 for embedding in embeddings if embedding is None)
+    if missing:
+        print(f"Warning: Could not generate embeddings for {missing} resumes. Storing them without embedding.")
+
+    with db_connection() as conn:
+        cur = conn.cursor()
+        # Rows added concurrently (or repeated in this batch) are skipped rather than failing the whole batch
+        inserted = execute_values(cur, """
             INSERT INTO resumes (
-                deepflow_member_id, -- New column
+                deepflow_member_id,
                 personal_summary,
                 technical_skills,
                 certifications,
@@ -142,75 +189,91 @@ def insert_resume_data(deepflow_member_id, resume_data: ResumeData):
                 specialization_task_categories,
                 additional_observations,
                 embedding
-            ) VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
-        """, (
-            deepflow_member_id, # Pass the deepflow_member_id
-            resume_data.personal_summary,
-            json.dumps(resume_data.technical_skills),
-            json.dumps(resume_data.certifications),
-            json.dumps(resume_data.soft_skills),
-            resume_data.vocal_attributes,
-            json.dumps(resume_data.task_delegation_recommendations),
-            json.dumps(resume_data.specialization_task_categories),
-            json.dumps(resume_data.additional_observations),
-            embedding_str
-        ))
-        conn.commit()
-        print(f"Resume data for member ID '{deepflow_member_id}' inserted successfully. Embedding {'generated and stored' if embedding else 'failed to generate'}.")
-    except Exception as e:
-        print(f"Error inserting resume data for member ID '{deepflow_member_id}': {e}")
-        conn.rollback()
-    finally:
+            ) VALUES %s
+            ON CONFLICT (deepflow_member_id) DO NOTHING
+            RETURNING deepflow_member_id
+        """, rows, fetch=True)
         cur.close()
-        conn.close()
+    inserted_ids = {row[0] for row in inserted}
+    skipped = [deepflow_member_id for deepflow_member_id, _ in resumes if deepflow_member_id not in inserted_ids]
+    print(f"Resume data for {len(inserted_ids)} members inserted successfully.")
+    if skipped:
+        print(f"Skipped {len(skipped)} members that already exist: {', '.join(skipped)}")
+    return [deepflow_member_id for deepflow_member_id, _ in resumes if deepflow_member_id in inserted_ids]
 
 def get_all_resumes():
     """
     Retrieves all records from the 'resumes' table.
     """
-    conn = get_db_connection()
-    cur = conn.cursor()
-    cur.execute("SELECT * FROM resumes;")
-    resumes = cur.fetchall()
-    cur.close()
-    conn.close()
+    with db_connection() as conn:
+        cur = conn.cursor()
+        cur.execute("SELECT * FROM resumes;")
+        resumes = cur.fetchall()
+        cur.close()
     return resumes
 
-def find_similar_resumes(task_embedding: List[float], top_n: int = 3):
+def list_resumes(after_id: Optional[int] = None, limit: int = 50) -> List[dict]:
+    """
+    Returns a page of up to 'limit' resumes as dicts of RESUME_COLUMNS (no
+    embedding), in id order, starting after id 'after_id'. Pass the last id
+    of a page to get the next one.
+    """
+    with db_connection() as conn:
+        cur = conn.cursor()
+        cur.execute(f"SELECT {', '.join(RESUME_COLUMNS)} FROM resumes WHERE id > %s ORDER BY id LIMIT %s;",
+                    (after_id if after_id is not None else 0, limit))
+        rows = cur.fetchall()
+        cur.close()
+    return [dict(zip(RESUME_COLUMNS, row)) for row in rows]
+
+def get_resumes_version() -> Tuple[int, Optional[int]]:
+    """
+    Returns (row count, highest id) of the 'resumes' table. Resumes are only
+    ever inserted, so this changes exactly when one is added.
+    """
+    with db_connection() as conn:
+        cur = conn.cursor()
+        cur.execute("SELECT COUNT(*), MAX(id) FROM resumes;")
+        version = cur.fetchone()
+        cur.close()
+    return version
+
+def find_similar_resumes(task_embedding: np.ndarray, top_n: int = 3, ef_search: Optional[int] = None, probes: Optional[int] = None):
     """
     Finds the top_n most similar resumes to a given task embedding.
+    ef_search / probes override the index search parameters for this query.
     """
-    conn = get_db_connection()
-    cur = conn.cursor()
-    embedding_str = f"[{','.join(map(str, task_embedding))}]"
-    # Use the <=> operator for cosine distance
-    cur.execute("""
-        SELECT deepflow_member_id, 1 - (embedding <=> %s) AS similarity
-        FROM resumes
-        ORDER BY similarity DESC
-        LIMIT %s;
-    """, (embedding_str, top_n))
-    similar_resumes = cur.fetchall()
-    cur.close()
-    conn.close()
+    embedding = to_vector(task_embedding)
+    with db_connection() as conn:
+        cur = conn.cursor()
+        set_search_params(cur, ef_search, probes)
+        # Order by the raw <=> cosine distance so the vector index can serve the query;
+        # prepared once per pooled connection
+        execute_prepared(cur, "find_similar_resumes", """
+            SELECT deepflow_member_id, 1 - (embedding <=> $1::vector) AS similarity
+            FROM resumes
+            ORDER BY embedding <=> $1::vector
+            LIMIT $2
+        """, (embedding, top_n))
+        similar_resumes = cur.fetchall()
+        cur.close()
     return similar_resumes
 
 def get_resume_by_id(deepflow_member_id: str):
     """
     Retrieves a single resume from the 'resumes' table by its deepflow_member_id.
     """
-    conn = get_db_connection()
-    cur = conn.cursor()
-    cur.execute("SELECT * FROM resumes WHERE deepflow_member_id = %s;", (deepflow_member_id,))
-    resume = cur.fetchone()
-    cur.close()
-    conn.close()
+    with db_connection() as conn:
+        cur = conn.cursor()
+        cur.execute("SELECT * FROM resumes WHERE deepflow_member_id = %s;", (deepflow_member_id,))
+        resume = cur.fetchone()
+        cur.close()
     return resume
 
 # --- Example Usage ---
 if __name__ == '__main__':
-    # Make sure your get_db_connection() function is correctly set up
-    # to connect to your PostgreSQL database.
+    # Make sure DATABASE_URI is set so the connection pool can
+    # connect to your PostgreSQL database.
 
     # 1. Create the table (or ensure it exists with the embedding column)
     create_resume_table()
@@ -1,40 +1,26 @@
 import json
 import os
-from typing import List, Optional
+from typing import List, Optional, Tuple
 from pydantic import BaseModel, Field
-import openai
-from src.db_tools.connection_op import get_db_connection
+import numpy as np
+from psycopg2.extras import execute_values
+from src.db_tools.connection_op import db_connection, db_cursor
+from src.db_tools.vector_adapter import vector_from_binary
+from src.db_tools.vector_index import create_vector_index
+from src.llm_tools.embedding import get_openai_embedding, get_openai_embeddings
 from src.models import TaskData
 
-# --- OpenAI Configuration ---
-OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
-if not OPENAI_API_KEY:
-    print("Warning: OPENAI_API_KEY environment variable not set. Embedding generation will fail.")
-client = openai.OpenAI(api_key=OPENAI_API_KEY)
+# Columns of the 'tasks' table in table order, without the embedding
+TASK_COLUMNS = ['id', 'deepflow_task_id', 'required_skills', 'sector', 'tags', 'manpower_needed', 'roles_required', 'estimated_time', 'created_at']
 
-def get_openai_embedding(text: str, model: str = "text-embedding-ada-002") -> List[float]:
-    """
-    Generates a vector embedding for the given text using OpenAI's embedding model.
-    """
-    if not OPENAI_API_KEY:
-        print("Error: OpenAI API key is not set. Cannot generate embeddings.")
-        return []
-    try:
-        response = client.embeddings.create(input=[text], model=model)
-        return response.data[0].embedding
-    except openai.APIError as e:
-        print(f"OpenAI API error during embedding generation: {e}")
-        return []
-    except Exception as e:
-        print(f"An unexpected error occurred during embedding generation: {e}")
-        return []
-
-def create_tasks_table():
+def create_tasks_table(cur=None):
     """
     Creates the 'tasks' table in the database if it doesn't already exist.
+    Given a cursor, runs in the caller's transaction; errors are raised.
     """
-    conn = get_db_connection()
-    cur = conn.cursor()
+    if cur is None:
+        with db_cursor() as cur:
+            return create_tasks_table(cur)
     cur.execute("CREATE EXTENSION IF NOT EXISTS vector;")
     cur.execute("""
         CREATE TABLE IF NOT EXISTS tasks (
@@ -50,76 +36,229 @@ def create_tasks_table():
             created_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP
         );
     """)
-    conn.commit()
-    cur.close()
-    conn.close()
+    create_vector_index(cur, "tasks")
     print(" 'tasks' table created or already exists.")
 
-def insert_task_data(deepflow_task_id: str,task_data: TaskData):
+def create_task_search_indexes(cur=None):
+    """
+    Creates the pg_trgm indexes behind search_tasks: trigram indexes for
+    substring search on deepflow_task_id and sector, and a btree on
+    (sector, id) for the sector filter. Given a cursor, runs in the caller's
+    transaction.
+    """
+    if cur is None:
+        with db_cursor() as cur:
+            return create_task_search_indexes(cur)
+    cur.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm;")
+    cur.execute("CREATE INDEX IF NOT EXISTS tasks_deepflow_task_id_trgm_idx ON tasks USING gin (deepflow_task_id gin_trgm_ops);")
+    cur.execute("CREATE INDEX IF NOT EXISTS tasks_sector_trgm_idx ON tasks USING gin (sector gin_trgm_ops);")
+    cur.execute("CREATE INDEX IF NOT EXISTS tasks_sector_id_idx ON tasks (sector, id);")
+    print(" 'tasks' search indexes created or already exist.")
+
+def task_embedding_text(task_data: TaskData) -> str:
     """
-    Inserts a TaskData object into the 'tasks' table.
+    Builds the text that is embedded for a task.
     """
-    text_to_embed = (
+    return (
         " ".join(task_data.required_skills) + " " +
         (task_data.sector if task_data.sector else "") + " " +
         " ".join(task_data.tags) + " " +
         " ".join(task_data.roles_required)
     ).strip()
 
-    embedding = get_openai_embedding(text_to_embed)
-    embedding_str = f"[{','.join(map(str, embedding))}]" if embedding else None
+def insert_task_data(deepflow_task_id: str,task_data: TaskData) -> int:
+    """
+    Inserts a TaskData object into the 'tasks' table and returns its id.
+    """
+    # float32 array (or None), adapted to a pgvector value by the registered adapter
+    embedding = get_openai_embedding(task_embedding_text(task_data))
 
-    conn = get_db_connection()
-    cur = conn.cursor()
-    cur.execute("""
-        INSERT INTO tasks (
+    with db_connection() as conn:
+        cur = conn.cursor()
+        cur.execute("""
+            INSERT INTO tasks (
+                deepflow_task_id,
+                required_skills,
+                sector,
+                tags,
+                manpower_needed,
+                roles_required,
+                estimated_time,
+                embedding
+            ) VALUES (%s, %s, %s, %s, %s, %s, %s, %s)
+            RETURNING id
+        """, (
             deepflow_task_id,
-            required_skills,
-            sector,
-            tags,
-            manpower_needed,
-            roles_required,
-            estimated_time,
+            json.dumps(task_data.required_skills),
+            task_data.sector,
+            json.dumps(task_data.tags),
+            task_data.manpower_needed,
+            json.dumps(task_data.roles_required),
+            task_data.estimated_time,
             embedding
-        ) VALUES (%s, %s, %s, %s, %s, %s, %s, %s)
-    """, (
-        deepflow_task_id,
-        json.dumps(task_data.required_skills),
-        task_data.sector,
-        json.dumps(task_data.tags),
-        task_data.manpower_needed,
-        json.dumps(task_data.roles_required),
-        task_data.estimated_time,
-        embedding_str
-    ))
-    conn.commit()
-    cur.close()
-    conn.close()
+        ))
+        task_id = cur.fetchone()[0]
+        cur.close()
     print(f"Task with estimated time {task_data.estimated_time} hours inserted successfully.")
+    return task_id
+
+def insert_task_data_batch(tasks: List[Tuple[str, TaskData]]) -> List[int]:
+    """
+    Inserts many (deepflow_task_id, TaskData) pairs into the 'tasks' table,
+    embedding them in batched requests and writing them in one statement.
+    Returns the new task ids in input order.
+    """
+    if not tasks:
+        return []
+    embeddings = get_openai_embeddings([task_embedding_text(task_data) for _, task_data in tasks])
+    rows = [
+        (
+            deepflow_task_id,
+            json.dumps(task_data.required_skills),
+            task_data.sector,
+            json.dumps(task_data.tags),
+            task_data.manpower_needed,
+            json.dumps(task_data.roles_required),
+            task_data.estimated_time,
+            embedding
+        )
+        for (deepflow_task_id, task_data), embedding in zip(tasks, embeddings)
+    ]
+    with db_connection() as conn:
+        cur = conn.cursor()
+        inserted = execute_values(cur, """
+            INSERT INTO tasks (
+                deepflow_task_id,
+                required_skills,
+                sector,
+                tags,
+                manpower_needed,
+                roles_required,
+                estimated_time,
+                embedding
+            ) VALUES %s
+            RETURNING id
+        """, rows, fetch=True)
+        cur.close()
+    print(f"{len(inserted)} tasks inserted successfully.")
+    return [row[0] for row in inserted]
 
 def get_all_tasks():
     """
     Retrieves all records from the 'tasks' table.
     """
-    conn = get_db_connection()
-    cur = conn.cursor()
-    cur.execute("SELECT * FROM tasks;")
-    tasks = cur.fetchall()
-    cur.close()
-    conn.close()
+    with db_connection() as conn:
+        cur = conn.cursor()
+        cur.execute("SELECT * FROM tasks;")
+        tasks = cur.fetchall()
+        cur.close()
     return tasks
 
+def list_tasks(after_id: Optional[int] = None, limit: int = 50) -> List[dict]:
+    """
+    Returns a page of up to 'limit' tasks as dicts of TASK_COLUMNS (no
+    embedding), in id order, starting after id 'after_id'. Pass the last id
+    of a page to get the next one.
+    """
+    with db_connection() as conn:
+        cur = conn.cursor()
+        cur.execute(f"SELECT {', '.join(TASK_COLUMNS)} FROM tasks WHERE id > %s ORDER BY id LIMIT %s;",
+                    (after_id if after_id is not None else 0, limit))
+        rows = cur.fetchall()
+        cur.close()
+    return [dict(zip(TASK_COLUMNS, row)) for row in rows]
+
+def get_tasks_version() -> Tuple[int, Optional[int]]:
+    """
+    Returns (row count, highest id) of the 'tasks' table. Tasks are only
+    ever inserted, so this changes exactly when one is added.
+    """
+    with db_connection() as conn:
+        cur = conn.cursor()
+        cur.execute("SELECT COUNT(*), MAX(id) FROM tasks;")
+        version = cur.fetchone()
+        cur.close()
+    return version
+
+# Columns returned by search_tasks, plus a 'delegated' flag
+TASK_SEARCH_COLUMNS = ['id', 'deepflow_task_id', 'sector', 'created_at']
+
+def _like_pattern(text: str) -> str:
+    # Matches 'text' anywhere, with LIKE wildcards in it taken literally
+    escaped = text.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+    return f"%{escaped}%"
+
+def search_tasks(query: str = "", sector: Optional[str] = None, undelegated_only: bool = False,
+                 before_id: Optional[int] = None, limit: int = 25) -> List[dict]:
+    """
+    Returns a page of up to 'limit' tasks, newest first, as dicts of
+    TASK_SEARCH_COLUMNS and 'delegated'. 'query' matches anywhere in the
+    deepflow id or sector (case-insensitive, trigram-indexed); 'sector' and
+    'undelegated_only' filter further. Pass the last id of a page as
+    'before_id' to get the next one.
+    """
+    conditions, params = [], []
+    if query.strip():
+        conditions.append("(t.deepflow_task_id ILIKE %s OR t.sector ILIKE %s)")
+        params += [_like_pattern(query.strip())] * 2
+    if sector is not None:
+        conditions.append("t.sector = %s")
+        params.append(sector)
+    if undelegated_only:
+        conditions.append("d.task_id IS NULL")
+    if before_id is not None:
+        conditions.append("t.id < %s")
+        params.append(before_id)
+    where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+    with db_connection() as conn:
+        cur = conn.cursor()
+        cur.execute(f"""
+            SELECT {', '.join('t.' + column for column in TASK_SEARCH_COLUMNS)}, d.task_id IS NOT NULL
+            FROM tasks t
+            LEFT JOIN delegated_tasks d ON d.task_id = t.id
+            {where}
+            ORDER BY t.id DESC
+            LIMIT %s;
+        """, params + [limit])
+        rows = cur.fetchall()
+        cur.close()
+    return [dict(zip(TASK_SEARCH_COLUMNS + ['delegated'], row)) for row in rows]
+
+def get_task_sectors() -> List[str]:
+    """
+    Returns the distinct non-empty task sectors, alphabetically.
+    """
+    with db_connection() as conn:
+        cur = conn.cursor()
+        cur.execute("SELECT DISTINCT sector FROM tasks WHERE sector IS NOT NULL AND sector <> '' ORDER BY sector;")
+        sectors = [row[0] for row in cur.fetchall()]
+        cur.close()
+    return sectors
+
 def get_task_by_id(task_id: int):
     """
     Retrieves a single task from the 'tasks' table by its id.
     """
-    conn = get_db_connection()
-    cur = conn.cursor()
-    cur.execute("SELECT * FROM tasks WHERE id = %s;", (task_id,))
-    task = cur.fetchone()
-    cur.close()
-    conn.close()
+    with db_connection() as conn:
+        cur = conn.cursor()
+        cur.execute("SELECT * FROM tasks WHERE id = %s;", (task_id,))
+        task = cur.fetchone()
+        cur.close()
     return task
 
+def get_task_details(task_id: int) -> Tuple[Optional[dict], Optional[np.ndarray]]:
+    """
+    Retrieves a task as a dict of TASK_COLUMNS together with its float32 embedding.
+    Returns (None, None) if the task doesn't exist.
+    """
+    with db_connection() as conn:
+        cur = conn.cursor()
+        cur.execute(f"SELECT {', '.join(TASK_COLUMNS)}, vector_send(embedding) FROM tasks WHERE id = %s;", (task_id,))
+        row = cur.fetchone()
+        cur.close()
+    if row is None:
+        return None, None
+    return dict(zip(TASK_COLUMNS, row[:-1])), vector_from_binary(row[-1])
+
 if __name__ == '__main__':
     create_tasks_table()
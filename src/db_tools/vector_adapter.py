@@ -0,0 +1,74 @@
+from functools import lru_cache
+from typing import Optional
+import numpy as np
+import psycopg2
+from psycopg2.extensions import new_type, register_adapter, register_type
+from pgvector.psycopg2 import register_vector
+
+# psycopg2 only speaks the text protocol, so embeddings cross the wire as
+# '[x,y,...]' literals. These adapters keep the conversion inside NumPy / C
+# formatting instead of a per-element Python loop; bulk readers can skip the
+# text form entirely by selecting vector_send(embedding) and decoding the
+# bytes with vector_from_binary().
+
+@lru_cache(maxsize=8)
+def _literal_format(dimensions: int) -> str:
+    # 9 significant digits round-trip any float32 exactly
+    return "'[" + ",".join(["%.9g"] * dimensions) + "]'::vector"
+
+def to_vector(embedding) -> Optional[np.ndarray]:
+    """
+    Converts an embedding (list, array or None) to a 1-D float32 array.
+    """
+    if embedding is None:
+        return None
+    return np.asarray(embedding, dtype=np.float32).reshape(-1)
+
+class Float32VectorAdapter:
+    """
+    Adapts NumPy arrays to pgvector literals.
+    """
+    def __init__(self, value):
+        self._value = value
+
+    def getquoted(self):
+        values = np.asarray(self._value, dtype=np.float32).reshape(-1)
+        return (_literal_format(len(values)) % tuple(values.tolist())).encode("ascii")
+
+def cast_vector(value, cur):
+    """
+    Parses a pgvector text value into a float32 array.
+    """
+    if value is None:
+        return None
+    return np.fromstring(value[1:-1], dtype=np.float32, sep=",")
+
+def vector_from_binary(value) -> Optional[np.ndarray]:
+    """
+    Decodes the bytes returned by pgvector's vector_send(): a big-endian
+    uint16 dimension count, two unused bytes, then big-endian float32 values.
+    """
+    if value is None:
+        return None
+    buffer = memoryview(value)
+    dimensions = int.from_bytes(buffer[:2], "big")
+    return np.frombuffer(buffer, dtype=">f4", count=dimensions, offset=4).astype(np.float32)
+
+def register_vector_types(conn) -> bool:
+    """
+    Registers the pgvector types on 'conn' and installs the float32 NumPy
+    adapters. Returns False if the vector extension isn't installed yet.
+    """
+    try:
+        register_vector(conn)
+    except psycopg2.ProgrammingError:
+        conn.rollback()
+        return False
+    cur = conn.cursor()
+    cur.execute("SELECT to_regtype('vector')::oid;")
+    (oid,) = cur.fetchone()
+    cur.close()
+    conn.rollback()
+    register_type(new_type((oid,), "VECTOR", cast_vector), conn)
+    register_adapter(np.ndarray, Float32VectorAdapter)
+    return True
@@ -0,0 +1,54 @@
+import os
+from typing import Optional
+
+# --- Vector Index Configuration ---
+# VECTOR_INDEX_METHOD selects 'hnsw' (default) or 'ivfflat' for the cosine
+# indexes on the embedding columns. Build parameters apply when the index is
+# created; search parameters apply per query.
+VECTOR_INDEX_METHOD = os.getenv("VECTOR_INDEX_METHOD", "hnsw").lower()
+HNSW_M = int(os.getenv("HNSW_M", "16"))
+HNSW_EF_CONSTRUCTION = int(os.getenv("HNSW_EF_CONSTRUCTION", "64"))
+HNSW_EF_SEARCH = int(os.getenv("HNSW_EF_SEARCH", "40"))
+IVFFLAT_LISTS = int(os.getenv("IVFFLAT_LISTS", "100"))
+IVFFLAT_PROBES = int(os.getenv("IVFFLAT_PROBES", "10"))
+
+def create_vector_index(cur, table: str, column: str = "embedding", method: str = VECTOR_INDEX_METHOD):
+    """
+    Creates a pgvector cosine-distance index on table.column if it doesn't already exist.
+
+    IVFFlat picks its list centroids from the rows present at build time, so
+    it should be (re)built after the table has been populated; HNSW can be
+    created on an empty table.
+    """
+    index_name = f"{table}_{column}_{method}_idx"
+    if method == "hnsw":
+        cur.execute(f"""
+            CREATE INDEX IF NOT EXISTS {index_name} ON {table}
+            USING hnsw ({column} vector_cosine_ops)
+            WITH (m = %s, ef_construction = %s);
+        """, (HNSW_M, HNSW_EF_CONSTRUCTION))
+    elif method == "ivfflat":
+        cur.execute(f"""
+            CREATE INDEX IF NOT EXISTS {index_name} ON {table}
+            USING ivfflat ({column} vector_cosine_ops)
+            WITH (lists = %s);
+        """, (IVFFLAT_LISTS,))
+    else:
+        raise ValueError(f"Unknown vector index method: {method}")
+
+def set_search_params(cur, ef_search: Optional[int] = None, probes: Optional[int] = None):
+    """
+    Sets the HNSW ef_search and IVFFlat probes on the session.
+
+    The values last applied are remembered on the pooled connection, so
+    repeated searches with the same parameters cost no extra round trip.
+    """
+    params = (ef_search or HNSW_EF_SEARCH, probes or IVFFLAT_PROBES)
+    conn = cur.connection
+    if getattr(conn, "search_params", None) == params:
+        return
+    cur.execute(
+        "SELECT set_config('hnsw.ef_search', %s, false), set_config('ivfflat.probes', %s, false);",
+        (str(params[0]), str(params[1])),
+    )
+    conn.search_params = params
@@ -0,0 +1,228 @@
+import hashlib
+import os
+import threading
+from contextlib import nullcontext
+from concurrent.futures import Future, TimeoutError as FutureTimeoutError
+from typing import Callable, Dict, List, Optional, Tuple
+from src.models import DelegationChoice, DelegationResult
+from src.llm_tools.delegation_formatting import delegate_task
+from src.llm_tools.formatting import retry
+from src.db_tools.advisory_lock import advisory_lock
+from src.db_tools.delegated_task_db import insert_delegated_task, find_nearest_delegated_task, get_delegated_task
+
+# --- Delegation Reuse Configuration ---
+# A task whose embedding is within DELEGATION_REUSE_MAX_DISTANCE (cosine
+# distance) of an already-delegated task can take over that delegation
+# without an LLM call, provided no member or agent was added since.
+# USE_DELEGATION_REUSE makes delegate_candidates apply such matches automatically.
+USE_DELEGATION_REUSE = os.getenv("USE_DELEGATION_REUSE", "false").lower() in ("1", "true", "yes")
+DELEGATION_REUSE_MAX_DISTANCE = float(os.getenv("DELEGATION_REUSE_MAX_DISTANCE", "0.05"))
+
+# --- Single-flight Configuration ---
+# Concurrent delegations of the same task with the same candidates are
+# coalesced: the first caller computes, later ones (in this process, or in
+# another one via a Postgres advisory lock) wait up to
+# DELEGATION_SINGLE_FLIGHT_TIMEOUT_SECONDS and share its result.
+USE_DELEGATION_SINGLE_FLIGHT = os.getenv("USE_DELEGATION_SINGLE_FLIGHT", "true").lower() in ("1", "true", "yes")
+DELEGATION_SINGLE_FLIGHT_TIMEOUT_SECONDS = float(os.getenv("DELEGATION_SINGLE_FLIGHT_TIMEOUT_SECONDS", "300"))
+
+_reuse_stats = {"lookups": 0, "hits": 0, "no_match": 0, "too_far": 0, "pool_changed": 0, "hit_similarities": []}
+_reuse_lock = threading.Lock()
+
+def delegation_ids(delegation_result: DelegationResult) -> Tuple[List[str], List[str]]:
+    """
+    Extracts the selected member and agent ids from a DelegationResult.
+    """
+    return delegation_result.member_ids(), delegation_result.agent_ids()
+
+def evaluate_reuse_match(match: Optional[dict], max_distance: float = DELEGATION_REUSE_MAX_DISTANCE,
+                         record: bool = True) -> Optional[dict]:
+    """
+    Returns 'match' (a find_nearest_delegated_task result) with its
+    'similarity' if it is within 'max_distance' and the candidate pool hasn't
+    changed since it was delegated; otherwise None. With 'record', the
+    outcome counts as a lookup in get_reuse_stats.
+    """
+    if match is None:
+        outcome = "no_match"
+    elif match['distance'] > max_distance:
+        outcome = "too_far"
+    elif match['pool_changed_at'] is not None and match['pool_changed_at'] > match['delegated_at']:
+        outcome = "pool_changed"
+    else:
+        outcome = "hits"
+        match['similarity'] = 1 - match['distance']
+    if record:
+        with _reuse_lock:
+            _reuse_stats["lookups"] += 1
+            _reuse_stats[outcome] += 1
+            if outcome == "hits":
+                _reuse_stats["hit_similarities"].append(match['similarity'])
+    return match if outcome == "hits" else None
+
+def find_reusable_delegation(task_id: int, max_distance: float = DELEGATION_REUSE_MAX_DISTANCE) -> Optional[dict]:
+    """
+    Returns the nearest delegated task (see find_nearest_delegated_task) with
+    its 'similarity' if it is within 'max_distance' of task 'task_id' and the
+    candidate pool hasn't changed since it was delegated; otherwise None.
+    """
+    return evaluate_reuse_match(find_nearest_delegated_task(task_id), max_distance)
+
+def _result_from_ids(member_ids: Optional[List[str]], agent_ids: Optional[List[str]],
+                     reasoning: str, reason: str) -> DelegationResult:
+    # Delegation records only keep ids; non-numeric legacy ids are skipped
+    return DelegationResult(
+        reasoning=reasoning,
+        members=[DelegationChoice(id=int(member_id), reason=reason) for member_id in member_ids or [] if str(member_id).isdigit()],
+        agents=[DelegationChoice(id=int(agent_id), reason=reason) for agent_id in agent_ids or [] if str(agent_id).isdigit()],
+    )
+
+def reused_delegation_result(match: dict) -> DelegationResult:
+    """
+    Builds the DelegationResult for a delegation taken over from 'match'.
+    """
+    return _result_from_ids(
+        match['member_ids'], match['agent_ids'],
+        reasoning=f"Reused the delegation of the near-identical task {match['task_id']} "
+                  f"(cosine similarity {match['similarity']:.3f}); the candidate pool is unchanged since.",
+        reason=f"Selected for task {match['task_id']} (similarity {match['similarity']:.3f})",
+    )
+
+def get_reuse_stats() -> dict:
+    """
+    Returns lookup/hit counters of the delegation reuse fast path, with the
+    hit rate, the configured threshold and the similarity range of hits.
+    """
+    with _reuse_lock:
+        similarities = _reuse_stats["hit_similarities"]
+        stats = {key: value for key, value in _reuse_stats.items() if key != "hit_similarities"}
+        stats["hit_rate"] = stats["hits"] / stats["lookups"] if stats["lookups"] else 0.0
+        stats["max_distance"] = DELEGATION_REUSE_MAX_DISTANCE
+        stats["min_hit_similarity"] = min(similarities) if similarities else None
+        stats["mean_hit_similarity"] = sum(similarities) / len(similarities) if similarities else None
+    return stats
+
+_flight_stats = {"leaders": 0, "shared_in_process": 0, "shared_across_processes": 0,
+                 "follower_timeouts": 0, "uncoordinated": 0}
+_flights: Dict[str, Future] = {}
+_flights_lock = threading.Lock()
+
+def candidate_set_version(member_details: List[dict], agent_details: List[dict]) -> str:
+    """
+    Short hash of the candidate ids offered to the LLM; delegations of a task
+    are only coalesced when it matches.
+    """
+    ids = f"{sorted(member['id'] for member in member_details)}|{sorted(agent['id'] for agent in agent_details)}"
+    return hashlib.sha256(ids.encode("utf-8")).hexdigest()[:16]
+
+def _delegate_across_processes(key: str, task_id: int, compute: Callable[[], Optional[DelegationResult]],
+                               waiting) -> Tuple[Optional[DelegationResult], bool]:
+    with advisory_lock(key, DELEGATION_SINGLE_FLIGHT_TIMEOUT_SECONDS, waiting) as (acquired, requested_at):
+        if requested_at is None:
+            # The lock timed out or the database was unreachable: another
+            # process may be delegating the same task right now
+            print(f"Single-flight: delegating {key} without the cross-process lock; it may be computed twice")
+            with _flights_lock:
+                _flight_stats["uncoordinated"] += 1
+        elif not acquired:
+            # Another process held the lock: take its record if it stored one while we waited
+            record = get_delegated_task(task_id)
+            if record is not None and record['updated_at'] is not None and record['updated_at'] >= requested_at:
+                with _flights_lock:
+                    _flight_stats["shared_across_processes"] += 1
+                return _result_from_ids(
+                    record['member_ids'], record['agent_ids'],
+                    reasoning="Delegated by a concurrent request for the same task and candidates.",
+                    reason="Selected by the concurrent delegation",
+                ), True
+        with _flights_lock:
+            _flight_stats["leaders"] += 1
+        return compute(), False
+
+def single_flight_delegation(task_details: dict, member_details: List[dict], agent_details: List[dict],
+                             compute: Callable[[], Optional[DelegationResult]],
+                             waiting=nullcontext) -> Tuple[Optional[DelegationResult], bool]:
+    """
+    Runs 'compute' (which must also store the delegation record) unless a
+    delegation of the same task and candidate set is already in flight, in
+    which case it waits for that one instead. Returns (result, shared), where
+    'shared' means the result came from another caller. Results shared
+    across processes are rebuilt from the stored record, so they carry ids
+    but not the model's reasons. 'waiting' is a context manager factory
+    entered only while waiting for another caller (e.g. a spinner). A caller
+    that waited longer than DELEGATION_SINGLE_FLIGHT_TIMEOUT_SECONDS runs
+    'compute' itself; see get_single_flight_stats.
+    """
+    if not USE_DELEGATION_SINGLE_FLIGHT:
+        return compute(), False
+    key = f"delegation:{task_details['id']}:{candidate_set_version(member_details, agent_details)}"
+    with _flights_lock:
+        future = _flights.get(key)
+        leader = future is None
+        if leader:
+            future = _flights[key] = Future()
+    if not leader:
+        try:
+            with waiting():
+                result, _ = future.result(timeout=DELEGATION_SINGLE_FLIGHT_TIMEOUT_SECONDS)
+        except FutureTimeoutError:
+            print(f"Single-flight: {key} still running after {DELEGATION_SINGLE_FLIGHT_TIMEOUT_SECONDS}s; delegating independently")
+            with _flights_lock:
+                _flight_stats["follower_timeouts"] += 1
+            return compute(), False
+        with _flights_lock:
+            _flight_stats["shared_in_process"] += 1
+        return result, True
+    try:
+        outcome = _delegate_across_processes(key, task_details['id'], compute, waiting)
+        future.set_result(outcome)
+        return outcome
+    except Exception as e:
+        future.set_exception(e)
+        raise
+    except BaseException:
+        # e.g. the leader's Streamlit script was stopped; followers shouldn't inherit that
+        future.set_exception(RuntimeError("the delegation in flight was interrupted"))
+        raise
+    finally:
+        with _flights_lock:
+            del _flights[key]
+
+def get_single_flight_stats() -> dict:
+    """
+    Returns how many delegations were computed and how many were shared with
+    a concurrent caller in this process or across processes, plus the
+    fallbacks that computed without coalescing: followers that gave up
+    waiting, and delegations run without the cross-process lock.
+    """
+    with _flights_lock:
+        return dict(_flight_stats)
+
+def _delegate_and_store(task_details: dict, member_details: List[dict], agent_details: List[dict],
+                        times: int, use_cache: bool) -> Optional[DelegationResult]:
+    delegation_result = retry(delegate_task, times, task_details, member_details, agent_details, use_cache=use_cache)
+    if delegation_result:
+        member_ids, agent_ids = delegation_ids(delegation_result)
+        insert_delegated_task(task_details['id'], member_ids, agent_ids)
+    return delegation_result
+
+def delegate_candidates(task_details: dict, member_details: List[dict], agent_details: List[dict],
+                        times: int = 3, use_cache: bool = True,
+                        reuse: bool = USE_DELEGATION_REUSE) -> Optional[DelegationResult]:
+    """
+    Asks the LLM for the best combination among the given candidates and
+    stores the delegation record. Returns the DelegationResult, or None if
+    no valid recommendation was produced. use_cache=False skips the response
+    cache; with 'reuse' a near-duplicate task's delegation is applied instead
+    of calling the LLM. Concurrent calls for the same task and candidates
+    share one computation (see single_flight_delegation).
+    """
+    if reuse:
+        match = find_reusable_delegation(task_details['id'])
+        if match is not None:
+            insert_delegated_task(task_details['id'], match['member_ids'] or [], match['agent_ids'] or [])
+            return reused_delegation_result(match)
+    delegation_result, _ = single_flight_delegation(
+        task_details, member_details, agent_details,
+        lambda: _delegate_and_store(task_details, member_details, agent_details, times, use_cache))
+    return delegation_result
@@ -1,22 +1,18 @@
-import os
-import json
-from openai import OpenAI
-from openai.types.chat import ChatCompletionMessageParam
 from pydantic import BaseModel, Field
-from typing import List
-from dotenv import load_dotenv
+from typing import TYPE_CHECKING, List, Optional
 from src.models import AgentData
+from src.llm_tools.clients import get_openai_client
+from src.llm_tools.rate_limiter import chat_reservation, reserve, settle
+from src.llm_tools.response_cache import response_key, get_cached_response, cache_response
+from src.llm_tools.structured_output import parse_chat
 
-load_dotenv()
+if TYPE_CHECKING:
+    from openai.types.chat import ChatCompletionMessageParam
 
-client = OpenAI(
-    api_key=os.getenv("OPENAI_API_KEY"),
-)
+# Bump when the prompt or the output model changes; invalidates cached responses
+PROMPT_VERSION = "2"
 
-def agent_formatting(agent_description: str):
-    """
-    Analyzes an agent description and returns a structured AgentData object.
-    """
+def _agent_messages(agent_description: str) -> List["ChatCompletionMessageParam"]:
     prompt = f"""
 You are an expert AI architect. Your task is to analyze the following agent description and extract structured information.
 
@@ -26,38 +22,33 @@ You are an expert AI architect. Your task is to analyze the following agent desc
 **Instructions:**
 - Analyze the agent description thoroughly.
 - Extract the tags, skills, capabilities, and core functionalities.
-- Format the output as a JSON object that matches the following Pydantic schema.
-```json
-{AgentData.schema_json(indent=2)}
-```
 Ensure that all relevant information from the agent description is incorporated into the report comprehensively and clearly.
 """
 
-    messages: List[ChatCompletionMessageParam] = [
+    messages: List["ChatCompletionMessageParam"] = [
         {
             "role": "user",
             "content": prompt,
         }
     ]
+    return messages
 
-    response = client.chat.completions.create(
-        model="gpt-4o",
-        messages=messages,
-        response_format={"type": "json_object"}
-    )
-
-    json_output_str = response.choices[0].message.content
-    if not json_output_str:
-        print("Error: No content received from API.")
-        return None
-    raw_data = json.loads(json_output_str)
-    print(f"Raw data received: {raw_data}")
-    try:
-        parsed_agent_data = AgentData(**raw_data)
-        return parsed_agent_data
-    except Exception as e:
-        print(f"Error parsing agent data: {e}")
-        return None
+def agent_formatting(agent_description: str, use_cache: bool = True):
+    """
+    Analyzes an agent description and returns a structured AgentData object.
+    Results are served from the response cache unless use_cache is False.
+    """
+    key = response_key("agent_formatting", "gpt-4o", PROMPT_VERSION, agent_description)
+    if use_cache:
+        cached = get_cached_response(key, AgentData)
+        if cached is not None:
+            return cached
+    messages = _agent_messages(agent_description)
+    reserved = reserve("gpt-4o", chat_reservation(messages, "gpt-4o"))
+    completion, agent_data = parse_chat(get_openai_client(), "agent_formatting", model="gpt-4o", messages=messages, response_format=AgentData)
+    settle("gpt-4o", reserved, completion.usage)
+    cache_response(key, "agent_formatting", agent_data)
+    return agent_data
 
 if __name__ == '__main__':
     description = "This agent is designed for customer support. It can understand and respond to user queries in natural language, integrate with our CRM to fetch customer data, and escalate complex issues to a human agent. Its main job is to answer frequently asked questions and guide users through our product features."
@@ -0,0 +1,91 @@
+import asyncio
+import os
+import threading
+import weakref
+from contextlib import asynccontextmanager
+from typing import TYPE_CHECKING
+import src.config  # Loads the .env file before the settings below are read
+
+if TYPE_CHECKING:
+    from openai import AsyncOpenAI, OpenAI
+
+# The openai package alone takes about half a second to import, so it and
+# the clients are only loaded on first use. Sync clients are shared by all
+# threads, one per retry policy.
+_sync_clients = {}
+_sync_clients_lock = threading.Lock()
+
+def get_openai_client(max_retries: int = 0) -> "OpenAI":
+    """
+    Returns the process-wide OpenAI client, creating it on first use.
+    Formatters use max_retries=0 because formatting.retry handles retries.
+    """
+    client = _sync_clients.get(max_retries)
+    if client is None:
+        with _sync_clients_lock:
+            client = _sync_clients.get(max_retries)
+            if client is None:
+                from openai import OpenAI
+                client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"), max_retries=max_retries)
+                _sync_clients[max_retries] = client
+    return client
+
+# --- Async Client Configuration ---
+# LLM_MAX_CONCURRENCY caps the number of in-flight async OpenAI calls per
+# event loop (the batch scripts run a single one); the HTTP pool keeps that
+# many connections alive between calls. Request and token pacing across
+# loops and processes is the rate limiter's job (src.llm_tools.rate_limiter).
+LLM_MAX_CONCURRENCY = int(os.getenv("LLM_MAX_CONCURRENCY", "8"))
+LLM_KEEPALIVE_SECONDS = float(os.getenv("LLM_KEEPALIVE_SECONDS", "60"))
+
+# httpx connection pools and asyncio semaphores belong to the event loop that
+# created them, so each running loop gets its own client and limiter. A task
+# waiting until the loop cancels it on shutdown (asyncio.run does so before
+# closing the loop) closes the client and drops the loop's entry.
+_loop_resources = weakref.WeakKeyDictionary()
+
+async def _close_on_shutdown(loop, client):
+    try:
+        await loop.create_future()
+    finally:
+        _loop_resources.pop(loop, None)
+        await client.close()
+
+def _resources():
+    loop = asyncio.get_running_loop()
+    resources = _loop_resources.get(loop)
+    if resources is None:
+        import httpx
+        from openai import AsyncOpenAI
+        http_client = httpx.AsyncClient(
+            limits=httpx.Limits(
+                max_connections=LLM_MAX_CONCURRENCY,
+                max_keepalive_connections=LLM_MAX_CONCURRENCY,
+                keepalive_expiry=LLM_KEEPALIVE_SECONDS,
+            ),
+            timeout=httpx.Timeout(600.0, connect=10.0),
+        )
+        client = AsyncOpenAI(api_key=os.getenv("OPENAI_API_KEY"), http_client=http_client, max_retries=0)
+        # The loop only holds tasks weakly, so the closer is kept with the client
+        closer = loop.create_task(_close_on_shutdown(loop, client))
+        resources = (client, asyncio.Semaphore(LLM_MAX_CONCURRENCY), closer)
+        _loop_resources[loop] = resources
+    return resources
+
+def get_async_openai_client() -> "AsyncOpenAI":
+    """
+    Returns the shared AsyncOpenAI client for the running event loop.
+    """
+    return _resources()[0]
+
+@asynccontextmanager
+async def llm_slot():
+    """
+    Waits for one of the LLM_MAX_CONCURRENCY slots of the running event loop.
+
+    Usage:
+        async with llm_slot():
+            response = await get_async_openai_client().chat.completions.create(...)
+    """
+    async with _resources()[1]:
+        yield
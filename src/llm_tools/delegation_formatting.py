@@ -1,69 +1,155 @@
-import os
-import json
-from openai import OpenAI
-from openai.types.chat import ChatCompletionMessageParam
+import time
 from pydantic import BaseModel, Field
-from typing import List, Dict
-from dotenv import load_dotenv
+from typing import TYPE_CHECKING, List, Dict, Optional
 from src.models import DelegationResult
-
-load_dotenv()
-
-client = OpenAI(
-    api_key=os.getenv("OPENAI_API_KEY"),
+from src.llm_tools.clients import get_openai_client
+from src.llm_tools.rate_limiter import chat_reservation, reserve, settle
+from src.llm_tools.response_cache import response_key, get_cached_response, cache_response
+from src.llm_tools.prompt_serialization import serialize_task, serialize_members, serialize_agents
+from src.llm_tools.tokens import count_message_tokens
+from src.llm_tools.structured_output import (
+    finish_reason_errors, finish_reason_failure, parse_chat, parsed_message, record_parse_outcome,
 )
 
-def delegate_task(task_details: dict, member_details: List[dict], agent_details: List[dict]):
-    """
-    Analyzes task, member, and agent details to recommend the best combination.
-    """
-    print("delegate_error")
+if TYPE_CHECKING:
+    from openai.types.chat import ChatCompletionMessageParam
+
+# Bump when the prompt or the output model changes; invalidates cached responses
+PROMPT_VERSION = "3"
 
+def _delegation_messages(task_details: dict, member_details: List[dict], agent_details: List[dict]) -> List["ChatCompletionMessageParam"]:
     prompt = f"""
 You are an expert project manager and AI strategist. Your task is to analyze the following task, and the recommended members and agents, to determine the absolute best combination to complete the task efficiently and effectively.
 
 **Task Details:**
-{str(task_details)}
+{serialize_task(task_details)}
 
-**Top 3 Recommended Members:**
-{str(member_details)}
+**Top {len(member_details)} Recommended Members:**
+{serialize_members(member_details)}
 
-**Top 3 Recommended Agents:**
-{str(agent_details)}
+**Top {len(agent_details)} Recommended Agents:**
+{serialize_agents(agent_details)}
 
 **Instructions:**
 - Analyze the task requirements, member skills, and agent capabilities.
 - Determine the best combination of members and/or agents to perform the task.
 - You can choose any number of members and agents from the provided lists.
-- Provide a detailed reasoning for your choice.
-- Format the output as a JSON object that matches the following Pydantic schema.
-```json
-{DelegationResult.schema_json(indent=2)}
-```
+- Provide a detailed reasoning for your choice, then list the selected members and agents by their id above with a reason for each.
 """
-    print("llm error")
-    messages: List[ChatCompletionMessageParam] = [
+    messages: List["ChatCompletionMessageParam"] = [
         {
             "role": "user",
             "content": prompt,
         }
     ]
-    print("message erro")
-    response = client.chat.completions.create(
-        model="gpt-4o",
-        messages=messages,
-        response_format={"type": "json_object"}
-    )
-    print("formatting error")
-    json_output_str = response.choices[0].message.content
-    if not json_output_str:
-        print("Error: No content received from API.")
-        return None
-    raw_data = json.loads(json_output_str)
-    print(f"Raw data received: {raw_data}")
-    try:
-        parsed_delegation_data = DelegationResult(**raw_data)
-        return parsed_delegation_data
-    except Exception as e:
-        print(f"Error parsing delegation data: {e}")
+    return messages
+
+def delegation_messages(task_details: dict, member_details: List[dict], agent_details: List[dict]) -> List["ChatCompletionMessageParam"]:
+    """
+    Builds the delegate_task prompt. Pass the result to DelegationStream
+    (messages=...) to assemble it ahead of time.
+    """
+    return _delegation_messages(task_details, member_details, agent_details)
+
+def delegation_prompt_tokens(task_details: dict, member_details: List[dict], agent_details: List[dict]) -> int:
+    """
+    Returns the number of prompt tokens delegate_task sends for these inputs.
+    """
+    return count_message_tokens(_delegation_messages(task_details, member_details, agent_details), "gpt-4o")
+
+def _known_choices(delegation_result: Optional[DelegationResult], member_details: List[dict],
+                   agent_details: List[dict]) -> Optional[DelegationResult]:
+    # Drops selections whose id isn't among the candidates that were offered
+    if delegation_result is None:
         return None
+    member_ids = {member['id'] for member in member_details}
+    agent_ids = {agent['id'] for agent in agent_details}
+    members = [choice for choice in delegation_result.members if choice.id in member_ids]
+    agents = [choice for choice in delegation_result.agents if choice.id in agent_ids]
+    unknown = len(delegation_result.members) + len(delegation_result.agents) - len(members) - len(agents)
+    if unknown:
+        print(f"Dropping {unknown} selected id(s) that were not among the candidates.")
+        record_parse_outcome("delegate_task", "unknown_id")
+    return delegation_result.model_copy(update={"members": members, "agents": agents})
+
+def delegate_task(task_details: dict, member_details: List[dict], agent_details: List[dict], use_cache: bool = True):
+    """
+    Analyzes task, member, and agent details to recommend the best combination.
+    Results are served from the response cache unless use_cache is False.
+    """
+    key = response_key("delegate_task", "gpt-4o", PROMPT_VERSION, task_details, member_details, agent_details)
+    if use_cache:
+        cached = get_cached_response(key, DelegationResult)
+        if cached is not None:
+            return cached
+    messages = _delegation_messages(task_details, member_details, agent_details)
+    print(f"Delegation prompt: {count_message_tokens(messages, 'gpt-4o')} tokens")
+    reserved = reserve("gpt-4o", chat_reservation(messages, "gpt-4o"))
+    completion, delegation_result = parse_chat(get_openai_client(), "delegate_task", model="gpt-4o", messages=messages, response_format=DelegationResult)
+    settle("gpt-4o", reserved, completion.usage)
+    delegation_result = _known_choices(delegation_result, member_details, agent_details)
+    cache_response(key, "delegate_task", delegation_result)
+    return delegation_result
+
+class DelegationStream:
+    """
+    Streaming variant of delegate_task.
+
+    Iterating yields the 'reasoning' text in chunks as the model writes it
+    (e.g. for st.write_stream). Once exhausted, 'result' holds the validated
+    DelegationResult (or None) and 'ttft' the seconds until the first chunk.
+    'messages' may hold the prompt already built by delegation_messages.
+    """
+    def __init__(self, task_details: dict, member_details: List[dict], agent_details: List[dict], use_cache: bool = True,
+                 messages: Optional[List["ChatCompletionMessageParam"]] = None):
+        self.task_details = task_details
+        self.member_details = member_details
+        self.agent_details = agent_details
+        self.use_cache = use_cache
+        self.messages = messages
+        self.result: Optional[DelegationResult] = None
+        self.ttft: Optional[float] = None
+        self.from_cache = False
+
+    def __iter__(self):
+        import jiter  # Installed with openai; deferred like it
+        started = time.monotonic()
+        key = response_key("delegate_task", "gpt-4o", PROMPT_VERSION, self.task_details, self.member_details, self.agent_details)
+        if self.use_cache:
+            cached = get_cached_response(key, DelegationResult)
+            if cached is not None:
+                self.result, self.from_cache = cached, True
+                self.ttft = time.monotonic() - started
+                yield cached.reasoning
+                return
+
+        messages = self.messages or _delegation_messages(self.task_details, self.member_details, self.agent_details)
+        print(f"Delegation prompt: {count_message_tokens(messages, 'gpt-4o')} tokens")
+        reserved = reserve("gpt-4o", chat_reservation(messages, "gpt-4o"))
+        emitted = 0
+        try:
+            with get_openai_client().chat.completions.stream(model="gpt-4o", messages=messages, response_format=DelegationResult,
+                                                stream_options={"include_usage": True}) as stream:
+                for event in stream:
+                    if event.type != "content.delta":
+                        continue
+                    # 'reasoning' comes first in the schema, so it streams before the selections.
+                    # The SDK's partial parse omits unterminated strings, hence parsing the snapshot here.
+                    try:
+                        partial = jiter.from_json(event.snapshot.encode(), partial_mode="trailing-strings")
+                    except ValueError:
+                        continue
+                    reasoning = partial.get("reasoning") or "" if isinstance(partial, dict) else ""
+                    if len(reasoning) > emitted:
+                        if self.ttft is None:
+                            self.ttft = time.monotonic() - started
+                            print(f"Delegation time to first token: {self.ttft:.2f}s")
+                        yield reasoning[emitted:]
+                        emitted = len(reasoning)
+                completion = stream.get_final_completion()
+            delegation_result = parsed_message("delegate_task", completion)
+        except finish_reason_errors() as e:
+            completion, delegation_result = finish_reason_failure("delegate_task", e)
+        settle("gpt-4o", reserved, completion.usage)
+        self.result = _known_choices(delegation_result, self.member_details, self.agent_details)
+        cache_response(key, "delegate_task", self.result)
@@ -0,0 +1,194 @@
+import base64
+import os
+import threading
+import queue
+import time
+from concurrent.futures import Future
+from typing import List, Optional, Tuple
+import numpy as np
+from src.llm_tools.clients import get_openai_client
+from src.llm_tools.embedding_cache import get_embedding_cache, normalize_text
+from src.llm_tools.tokens import get_encoding, count_tokens as _count_tokens
+from src.llm_tools.rate_limiter import reserve, settle
+
+# --- OpenAI Configuration ---
+OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
+if not OPENAI_API_KEY:
+    print("Warning: OPENAI_API_KEY environment variable not set. Embedding generation will fail.")
+# Embedding requests rely on the SDK's own retries (its default of 2)
+EMBEDDING_MAX_RETRIES = 2
+
+EMBEDDING_MODEL = "text-embedding-ada-002"
+
+# --- Batching Limits ---
+# The embeddings endpoint accepts up to 2048 inputs and 300k tokens per request,
+# and at most 8191 tokens per individual input.
+EMBEDDING_BATCH_MAX_INPUTS = int(os.getenv("EMBEDDING_BATCH_MAX_INPUTS", "2048"))
+EMBEDDING_BATCH_MAX_TOKENS = int(os.getenv("EMBEDDING_BATCH_MAX_TOKENS", "300000"))
+EMBEDDING_MAX_INPUT_TOKENS = 8191
+
+# --- Micro-batcher Settings ---
+# Single-text callers arriving within EMBEDDING_BATCH_WAIT_MS of each other
+# share one embeddings request.
+EMBEDDING_BATCH_WAIT_MS = float(os.getenv("EMBEDDING_BATCH_WAIT_MS", "10"))
+
+def count_tokens(text: str, model: str = EMBEDDING_MODEL) -> int:
+    """
+    Counts the tokens in 'text' for the given model, or estimates them
+    (about four characters per token) when tiktoken is unavailable.
+    """
+    return _count_tokens(text, model)
+
+def _truncate_to_limit(text: str, model: str) -> str:
+    encoding = get_encoding(model)
+    if encoding is None:
+        return text[:EMBEDDING_MAX_INPUT_TOKENS * 4]
+    tokens = encoding.encode(text, disallowed_special=())
+    if len(tokens) <= EMBEDDING_MAX_INPUT_TOKENS:
+        return text
+    return encoding.decode(tokens[:EMBEDDING_MAX_INPUT_TOKENS])
+
+def _plan_batches(texts: List[str], model: str) -> List[Tuple[List[int], int]]:
+    """
+    Groups the indices of 'texts' into batches that respect the per-request
+    input count and token budget. Returns (indices, token count) per batch.
+    """
+    batches, current, current_tokens = [], [], 0
+    for i, text in enumerate(texts):
+        tokens = min(count_tokens(text, model), EMBEDDING_MAX_INPUT_TOKENS)
+        if current and (len(current) >= EMBEDDING_BATCH_MAX_INPUTS or current_tokens + tokens > EMBEDDING_BATCH_MAX_TOKENS):
+            batches.append((current, current_tokens))
+            current, current_tokens = [], 0
+        current.append(i)
+        current_tokens += tokens
+    if current:
+        batches.append((current, current_tokens))
+    return batches
+
+def get_openai_embeddings(texts: List[str], model: str = EMBEDDING_MODEL) -> List[Optional[np.ndarray]]:
+    """
+    Generates vector embeddings for many texts, packing them into as few
+    embeddings requests as the input-count and token limits allow.
+
+    Texts already present in the persistent embedding cache are served from it
+    and only the misses are sent to the API.
+
+    Returns one float32 array per input text, in order. Empty texts and texts
+    whose batch failed get None.
+    """
+    embeddings: List[Optional[np.ndarray]] = [None for _ in texts]
+
+    # The API rejects empty strings, so only non-empty texts are looked up or sent
+    pending = [i for i, text in enumerate(texts) if text and text.strip()]
+    cache = get_embedding_cache()
+    if cache is not None and pending:
+        try:
+            cached = cache.get_many(model, [texts[i] for i in pending])
+            for j, embedding in cached.items():
+                embeddings[pending[j]] = embedding
+            pending = [i for j, i in enumerate(pending) if j not in cached]
+        except Exception as e:
+            print(f"Warning: embedding cache lookup failed: {e}")
+    if not pending:
+        return embeddings
+
+    if not OPENAI_API_KEY:
+        print("Error: OpenAI API key is not set. Cannot generate embeddings.")
+        return embeddings
+
+    # Identical texts (after normalization) are only sent once
+    duplicates = {}
+    for i in pending:
+        duplicates.setdefault(normalize_text(texts[i]), []).append(i)
+    pending = [indices[0] for indices in duplicates.values()]
+    prepared = [_truncate_to_limit(texts[i], model) for i in pending]
+
+    import openai  # Deferred: only needed once something has to be embedded
+    for batch, batch_tokens in _plan_batches(prepared, model):
+        try:
+            reserved = reserve(model, batch_tokens)
+            # base64 responses decode straight into float32 without parsing JSON numbers
+            response = get_openai_client(EMBEDDING_MAX_RETRIES).embeddings.create(input=[prepared[j] for j in batch], model=model, encoding_format="base64")
+            settle(model, reserved, response.usage)
+            for item in response.data:
+                embeddings[pending[batch[item.index]]] = np.frombuffer(base64.b64decode(item.embedding), dtype=np.float32)
+        except openai.APIError as e:
+            print(f"OpenAI API error during embedding generation: {e}")
+        except Exception as e:
+            print(f"An unexpected error occurred during embedding generation: {e}")
+    for indices in duplicates.values():
+        for i in indices[1:]:
+            embeddings[i] = embeddings[indices[0]]
+
+    if cache is not None:
+        try:
+            cache.put_many(model, [texts[i] for i in pending], [embeddings[i] for i in pending])
+        except Exception as e:
+            print(f"Warning: embedding cache update failed: {e}")
+    return embeddings
+
+class EmbeddingBatcher:
+    """
+    Merges concurrent single-text embedding requests into batched
+    embeddings calls.
+
+    Callers block in embed() while a background thread collects everything
+    submitted within 'max_wait_ms' (up to 'max_batch' texts) and sends it as
+    one request.
+    """
+    def __init__(self, model: str = EMBEDDING_MODEL, max_batch: int = EMBEDDING_BATCH_MAX_INPUTS, max_wait_ms: float = EMBEDDING_BATCH_WAIT_MS):
+        self.model = model
+        self.max_batch = max_batch
+        self.max_wait = max_wait_ms / 1000
+        self._queue = queue.Queue()
+        self._thread = None
+        self._lock = threading.Lock()
+
+    def _ensure_worker(self):
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name="embedding-batcher", daemon=True)
+                self._thread.start()
+
+    def _run(self):
+        while True:
+            batch = [self._queue.get()]
+            deadline = time.monotonic() + self.max_wait
+            while len(batch) < self.max_batch:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(self._queue.get(timeout=remaining))
+                except queue.Empty:
+                    break
+            try:
+                results = get_openai_embeddings([text for text, _ in batch], self.model)
+                for (_, future), embedding in zip(batch, results):
+                    future.set_result(embedding)
+            except Exception as e:
+                for _, future in batch:
+                    future.set_exception(e)
+
+    def embed(self, text: str) -> Optional[np.ndarray]:
+        """
+        Queues 'text' for the next batch and waits for its embedding.
+        """
+        future = Future()
+        self._ensure_worker()
+        self._queue.put((text, future))
+        return future.result()
+
+_batcher = EmbeddingBatcher()
+
+def get_openai_embedding(text: str, model: str = EMBEDDING_MODEL) -> Optional[np.ndarray]:
+    """
+    Generates a float32 vector embedding for the given text using OpenAI's embedding model.
+
+    Requests for the default model go through the shared micro-batcher, so
+    concurrent callers share a single embeddings request.
+    Returns None if embedding generation fails.
+    """
+    if model != _batcher.model:
+        return get_openai_embeddings([text], model)[0]
+    return _batcher.embed(text)
@@ -0,0 +1,136 @@
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+import unicodedata
+from typing import Dict, List, Optional
+import numpy as np
+
+# --- Cache Configuration ---
+# EMBEDDING_CACHE_PATH points at the SQLite file holding cached embeddings
+# (set it to an empty string to disable the cache). The least recently used
+# rows are evicted once the cache holds more than EMBEDDING_CACHE_MAX_ENTRIES.
+EMBEDDING_CACHE_PATH = os.getenv("EMBEDDING_CACHE_PATH", os.path.join(".cache", "embeddings.sqlite3"))
+EMBEDDING_CACHE_MAX_ENTRIES = int(os.getenv("EMBEDDING_CACHE_MAX_ENTRIES", "200000"))
+
+def normalize_text(text: str) -> str:
+    """
+    Normalizes text before hashing so that trivially different copies of the
+    same paragraph (Unicode form, surrounding or repeated whitespace) share an entry.
+    """
+    return " ".join(unicodedata.normalize("NFC", text).split())
+
+def cache_key(model: str, text: str) -> str:
+    """
+    Content address of an embedding: SHA-256 of the model name and normalized text.
+    """
+    return hashlib.sha256(f"{model}\x00{normalize_text(text)}".encode("utf-8")).hexdigest()
+
+class EmbeddingCache:
+    """
+    Persistent, size-bounded LRU cache of embeddings stored as float32 rows in SQLite.
+    """
+    def __init__(self, path: str = EMBEDDING_CACHE_PATH, max_entries: int = EMBEDDING_CACHE_MAX_ENTRIES):
+        self.path = path
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._lock = threading.Lock()
+        self._conn = None
+
+    def _connect(self) -> sqlite3.Connection:
+        if self._conn is None:
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            conn = sqlite3.connect(self.path, timeout=30, check_same_thread=False, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL;")
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS embeddings (
+                    key TEXT PRIMARY KEY,
+                    model TEXT NOT NULL,
+                    dim INTEGER NOT NULL,
+                    vector BLOB NOT NULL,
+                    last_access REAL NOT NULL
+                );
+            """)
+            conn.execute("CREATE INDEX IF NOT EXISTS embeddings_last_access_idx ON embeddings (last_access);")
+            self._conn = conn
+        return self._conn
+
+    def get_many(self, model: str, texts: List[str]) -> Dict[int, np.ndarray]:
+        """
+        Looks up the embeddings of 'texts'. Returns a mapping from input index
+        to float32 embedding for every text that was found.
+        """
+        keys = [cache_key(model, text) for text in texts]
+        found = {}
+        with self._lock:
+            conn = self._connect()
+            unique_keys = list(dict.fromkeys(keys))
+            # SQLite limits the number of bound parameters per statement
+            for start in range(0, len(unique_keys), 500):
+                chunk = unique_keys[start:start + 500]
+                placeholders = ",".join("?" * len(chunk))
+                for key, vector in conn.execute(f"SELECT key, vector FROM embeddings WHERE key IN ({placeholders});", chunk):
+                    found[key] = np.frombuffer(vector, dtype=np.float32)
+                conn.execute(f"UPDATE embeddings SET last_access = ? WHERE key IN ({placeholders});", [time.time()] + chunk)
+
+            result = {i: found[key] for i, key in enumerate(keys) if key in found}
+            self.hits += len(result)
+            self.misses += len(keys) - len(result)
+        return result
+
+    def put_many(self, model: str, texts: List[str], embeddings: List[Optional[np.ndarray]]):
+        """
+        Stores embeddings for 'texts', skipping failed (None) ones, then evicts
+        the least recently used rows beyond max_entries.
+        """
+        now = time.time()
+        rows = [
+            (cache_key(model, text), model, len(embedding), np.asarray(embedding, dtype=np.float32).tobytes(), now)
+            for text, embedding in zip(texts, embeddings) if embedding is not None
+        ]
+        if not rows:
+            return
+        with self._lock:
+            conn = self._connect()
+            conn.executemany("INSERT OR REPLACE INTO embeddings (key, model, dim, vector, last_access) VALUES (?, ?, ?, ?, ?);", rows)
+            self._evict(conn)
+
+    def _evict(self, conn: sqlite3.Connection):
+        (count,) = conn.execute("SELECT COUNT(*) FROM embeddings;").fetchone()
+        overflow = count - self.max_entries
+        if overflow > 0:
+            conn.execute("""
+                DELETE FROM embeddings WHERE key IN (
+                    SELECT key FROM embeddings ORDER BY last_access ASC LIMIT ?
+                );
+            """, (overflow,))
+            self.evictions += overflow
+
+    def stats(self) -> dict:
+        """
+        Returns hit/miss/eviction counters for this process and the current size.
+        """
+        with self._lock:
+            (size,) = self._connect().execute("SELECT COUNT(*) FROM embeddings;").fetchone()
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "evictions": self.evictions,
+            "entries": size,
+            "max_entries": self.max_entries,
+        }
+
+_cache: Optional[EmbeddingCache] = EmbeddingCache() if EMBEDDING_CACHE_PATH else None
+
+def get_embedding_cache() -> Optional[EmbeddingCache]:
+    """
+    Returns the process-wide embedding cache, or None when it is disabled.
+    """
+    return _cache
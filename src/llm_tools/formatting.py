@@ -1,24 +1,279 @@
-def retry(func,times,*args,**kwargs):
-    i=0
-    while i<times:
+import asyncio
+import json
+import os
+import random
+import threading
+import time
+from email.utils import parsedate_to_datetime
+from functools import lru_cache
+from typing import Optional
+
+# --- Retry Configuration ---
+# Retryable failures back off exponentially from RETRY_BASE_DELAY up to
+# RETRY_MAX_DELAY seconds (full jitter), unless the API sends Retry-After.
+# No new attempt is started once RETRY_DEADLINE_SECONDS have passed since
+# the first one. After CIRCUIT_FAILURE_THRESHOLD consecutive outage-type
+# failures the circuit opens and calls fail fast for CIRCUIT_RESET_SECONDS.
+RETRY_BASE_DELAY = float(os.getenv("RETRY_BASE_DELAY", "1"))
+RETRY_MAX_DELAY = float(os.getenv("RETRY_MAX_DELAY", "30"))
+RETRY_DEADLINE_SECONDS = float(os.getenv("RETRY_DEADLINE_SECONDS", "180"))
+CIRCUIT_FAILURE_THRESHOLD = int(os.getenv("CIRCUIT_FAILURE_THRESHOLD", "5"))
+CIRCUIT_RESET_SECONDS = float(os.getenv("CIRCUIT_RESET_SECONDS", "30"))
+
+# The error classes are looked up on first failure, so importing this module
+# doesn't import openai
+@lru_cache(maxsize=None)
+def _outage_errors() -> tuple:
+    # Failures that mean the API itself is unavailable; these also feed the breaker
+    import openai
+    return (openai.APIConnectionError, openai.InternalServerError)
+
+@lru_cache(maxsize=None)
+def _retryable_errors() -> tuple:
+    # Failures that are worth another attempt: outages, rate limits, timeouts
+    # (APITimeoutError subclasses APIConnectionError) and malformed model output
+    import openai
+    return _outage_errors() + (openai.RateLimitError, json.JSONDecodeError)
+
+def is_retryable(error: Exception) -> bool:
+    """
+    True if 'error' is transient and another attempt may succeed. Exhausted
+    quota, invalid requests, authentication errors and programming errors
+    are fatal.
+    """
+    import openai
+    if isinstance(error, openai.RateLimitError) and getattr(error, "code", None) == "insufficient_quota":
+        return False
+    if isinstance(error, openai.APIStatusError) and not isinstance(error, _retryable_errors()):
+        return error.status_code in (408, 409) or error.status_code >= 500
+    return isinstance(error, _retryable_errors())
+
+def is_outage(error: Exception) -> bool:
+    """
+    True if 'error' suggests the API is down rather than that this one call failed.
+    """
+    import openai
+    if isinstance(error, openai.APIStatusError):
+        return error.status_code >= 500
+    return isinstance(error, _outage_errors())
+
+def retry_after(error: Exception) -> Optional[float]:
+    """
+    Seconds the server asked us to wait (retry-after-ms or Retry-After
+    header, as seconds or HTTP date), or None.
+    """
+    response = getattr(error, "response", None)
+    headers = getattr(response, "headers", None)
+    if not headers:
+        return None
+    try:
+        if headers.get("retry-after-ms"):
+            return max(0.0, float(headers["retry-after-ms"]) / 1000)
+        value = headers.get("retry-after")
+        if not value:
+            return None
         try:
-            output=func(*args,**kwargs)
-            break
-        except Exception as e:
-            print(e)
-            i+=1
-    if i<times:
-        return output
+            return max(0.0, float(value))
+        except ValueError:
+            return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+def backoff_delay(attempt: int, error: Optional[Exception] = None) -> float:
+    """
+    Delay before retry number 'attempt' (0-based): Retry-After when the
+    server sent one, otherwise exponential backoff with full jitter.
+    """
+    server_delay = retry_after(error) if error is not None else None
+    if server_delay is not None:
+        return server_delay
+    return random.uniform(0, min(RETRY_MAX_DELAY, RETRY_BASE_DELAY * 2 ** attempt))
+
+class CircuitBreaker:
+    """
+    Consecutive-failure circuit breaker. While open, allow() refuses calls;
+    after reset_seconds a single trial call is let through (half-open) and
+    its outcome closes or re-opens the circuit.
+    """
+    def __init__(self, name: str, failure_threshold: int = CIRCUIT_FAILURE_THRESHOLD,
+                 reset_seconds: float = CIRCUIT_RESET_SECONDS):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_seconds = reset_seconds
+        self.failures = 0
+        self.opened_at = None
+        self.trial_running = False
+        self._lock = threading.Lock()
+
+    @property
+    def state(self) -> str:
+        if self.opened_at is None:
+            return "closed"
+        if time.monotonic() - self.opened_at >= self.reset_seconds:
+            return "half_open"
+        return "open"
+
+    def allow(self) -> bool:
+        with self._lock:
+            state = self.state
+            if state == "closed":
+                return True
+            if state == "half_open" and not self.trial_running:
+                self.trial_running = True
+                return True
+            return False
+
+    def record_success(self):
+        with self._lock:
+            self.failures = 0
+            self.opened_at = None
+            self.trial_running = False
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            if self.trial_running or self.failures >= self.failure_threshold:
+                if self.opened_at is None or self.trial_running:
+                    print(f"Circuit '{self.name}' opened after {self.failures} consecutive failures")
+                self.opened_at = time.monotonic()
+            self.trial_running = False
+
+    def release(self):
+        """
+        Ends a trial call that neither succeeded nor failed because of the API.
+        """
+        with self._lock:
+            self.trial_running = False
+
+_breakers = {}
+_stats = {}
+_registry_lock = threading.Lock()
+
+def get_circuit_breaker(name: str = "openai") -> CircuitBreaker:
+    """
+    Returns the process-wide circuit breaker called 'name'.
+    """
+    with _registry_lock:
+        if name not in _breakers:
+            _breakers[name] = CircuitBreaker(name)
+        return _breakers[name]
+
+def _record(func, outcome: str, attempts: int, latency: float, error: Optional[Exception] = None):
+    name = getattr(func, "__qualname__", repr(func))
+    with _registry_lock:
+        stats = _stats.setdefault(name, {
+            "calls": 0, "successes": 0, "failures": 0, "rejected": 0, "retries": 0,
+            "total_latency": 0.0, "max_latency": 0.0, "last_error": None,
+        })
+        stats["calls"] += 1
+        stats[outcome] += 1
+        stats["retries"] += max(0, attempts - 1)
+        stats["total_latency"] += latency
+        stats["max_latency"] = max(stats["max_latency"], latency)
+        if error is not None:
+            stats["last_error"] = f"{type(error).__name__}: {error}"
+
+def get_retry_stats() -> dict:
+    """
+    Returns per-function counters for retry() / retry_async(): calls,
+    successes, failures, calls rejected by an open circuit, retries and
+    latency (seconds, including backoff).
+    """
+    with _registry_lock:
+        result = {}
+        for name, stats in _stats.items():
+            result[name] = dict(stats, avg_latency=stats["total_latency"] / stats["calls"])
+        return result
+
+def _next_delay(func, error: Exception, attempt: int, times: int, started: float,
+                breaker: CircuitBreaker) -> Optional[float]:
+    # Books a failed attempt and returns how long to wait before the next
+    # one, or None if the call should give up
+    print(f"{getattr(func, '__name__', func)} failed (attempt {attempt + 1}/{times}): {error}")
+    if is_outage(error):
+        breaker.record_failure()
     else:
+        breaker.release()
+    if not is_retryable(error) or attempt + 1 >= times:
         return None
-    
+    delay = backoff_delay(attempt, error)
+    if time.monotonic() + delay - started > RETRY_DEADLINE_SECONDS:
+        print(f"Giving up on {getattr(func, '__name__', func)}: retry deadline of {RETRY_DEADLINE_SECONDS:.0f}s reached")
+        return None
+    return delay
+
+def retry(func, times, *args, **kwargs):
+    """
+    Calls func(*args, **kwargs) up to 'times' times and returns its output,
+    or None if every attempt failed.
+
+    Only transient failures (rate limits, timeouts, connection errors, 5xx,
+    malformed JSON) are retried, with exponential backoff and jitter or the
+    server's Retry-After. Fatal errors return None immediately, no attempt
+    starts after RETRY_DEADLINE_SECONDS, and calls fail fast while the
+    "openai" circuit is open.
+    """
+    breaker = get_circuit_breaker()
+    started = time.monotonic()
+    error = None
+    attempts = 0
+    for attempt in range(times):
+        if not breaker.allow():
+            print(f"Circuit '{breaker.name}' is open; skipping {getattr(func, '__name__', func)}")
+            _record(func, "rejected", attempts, time.monotonic() - started, error)
+            return None
+        attempts += 1
+        try:
+            output = func(*args, **kwargs)
+        except Exception as e:
+            error = e
+            delay = _next_delay(func, e, attempt, times, started, breaker)
+            if delay is None:
+                break
+            time.sleep(delay)
+            continue
+        breaker.record_success()
+        _record(func, "successes", attempts, time.monotonic() - started)
+        return output
+    _record(func, "failures", attempts, time.monotonic() - started, error)
+    return None
+
+async def retry_async(func, times, *args, **kwargs):
+    """
+    retry() for coroutine functions; waits with asyncio.sleep between attempts.
+    """
+    breaker = get_circuit_breaker()
+    started = time.monotonic()
+    error = None
+    attempts = 0
+    for attempt in range(times):
+        if not breaker.allow():
+            print(f"Circuit '{breaker.name}' is open; skipping {getattr(func, '__name__', func)}")
+            _record(func, "rejected", attempts, time.monotonic() - started, error)
+            return None
+        attempts += 1
+        try:
+            output = await func(*args, **kwargs)
+        except Exception as e:
+            error = e
+            delay = _next_delay(func, e, attempt, times, started, breaker)
+            if delay is None:
+                break
+            await asyncio.sleep(delay)
+            continue
+        breaker.record_success()
+        _record(func, "successes", attempts, time.monotonic() - started)
+        return output
+    _record(func, "failures", attempts, time.monotonic() - started, error)
+    return None
+
 
 if __name__=='__main__':
     def testfunc(num):
-        import random
         if random.random()<0.5:
-            1/0
+            raise json.JSONDecodeError("flaky", "", 0)
         else:
             return "Good"+str(num)
-        
-    print(retry(testfunc,5,10))
\ No newline at end of file
+
+    print(retry(testfunc,5,10))
+    print(get_retry_stats())
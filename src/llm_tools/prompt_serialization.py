@@ -0,0 +1,136 @@
+import json
+import os
+from typing import List, Optional, Sequence, Tuple
+from src.llm_tools.tokens import count_tokens, get_encoding
+
+# --- Prompt Budget Configuration ---
+# Maximum tokens spent on the task and on each member/agent in the delegation
+# prompt. When a record is over budget the lowest-value fields are trimmed first.
+TASK_PROMPT_TOKEN_BUDGET = int(os.getenv("TASK_PROMPT_TOKEN_BUDGET", "300"))
+MEMBER_PROMPT_TOKEN_BUDGET = int(os.getenv("MEMBER_PROMPT_TOKEN_BUDGET", "350"))
+AGENT_PROMPT_TOKEN_BUDGET = int(os.getenv("AGENT_PROMPT_TOKEN_BUDGET", "250"))
+# Per-field caps applied before the budget: list length and tokens per list item
+PROMPT_MAX_LIST_ITEMS = int(os.getenv("PROMPT_MAX_LIST_ITEMS", "12"))
+PROMPT_MAX_ITEM_TOKENS = int(os.getenv("PROMPT_MAX_ITEM_TOKENS", "40"))
+
+PROMPT_MODEL = "gpt-4o"
+
+# Fields sent to the model, most valuable first. Row ids are kept because the
+# model answers with them; deepflow ids and timestamps are left out.
+TASK_FIELDS = ['sector', 'required_skills', 'roles_required', 'manpower_needed', 'estimated_time', 'tags']
+MEMBER_FIELDS = ['id', 'similarity', 'technical_skills', 'specialization_task_categories', 'personal_summary',
+                 'certifications', 'task_delegation_recommendations', 'soft_skills',
+                 'additional_observations', 'vocal_attributes']
+AGENT_FIELDS = ['id', 'similarity', 'skills', 'capabilities', 'core_functionalities', 'tags']
+# Never trimmed: the model needs them to refer to a candidate
+KEEP_FIELDS = {'id', 'similarity'}
+
+def _as_list(value) -> Optional[list]:
+    # JSONB lists come back decoded, but rows built elsewhere may still hold JSON text
+    if isinstance(value, str) and value.startswith('['):
+        try:
+            value = json.loads(value)
+        except ValueError:
+            return None
+    return value if isinstance(value, list) else None
+
+def _dedupe(items: list) -> List[str]:
+    seen, result = set(), []
+    for item in items:
+        text = " ".join(str(item).split())
+        if text and text.lower() not in seen:
+            seen.add(text.lower())
+            result.append(text)
+    return result
+
+def _clip(text: str, max_tokens: int) -> str:
+    encoding = get_encoding(PROMPT_MODEL)
+    if encoding is None:
+        return text[:max(0, max_tokens * 4 - 1)] + "…" if len(text) > max_tokens * 4 else text
+    tokens = encoding.encode(text, disallowed_special=())
+    if len(tokens) <= max_tokens:
+        return text
+    return encoding.decode(tokens[:max(0, max_tokens - 1)]) + "…"
+
+def _fields(record: dict, fields: Sequence[str]) -> List[Tuple[str, object]]:
+    result = []
+    for field in fields:
+        value = record.get(field)
+        items = _as_list(value)
+        if items is not None:
+            items = [_clip(item, PROMPT_MAX_ITEM_TOKENS) for item in _dedupe(items)[:PROMPT_MAX_LIST_ITEMS]]
+            if items:
+                result.append((field, items))
+        elif isinstance(value, float):
+            result.append((field, round(value, 3)))
+        elif value not in (None, ""):
+            result.append((field, " ".join(str(value).split())))
+    return result
+
+def _render(fields: List[Tuple[str, object]]) -> str:
+    return "; ".join(f"{name}: {', '.join(value) if isinstance(value, list) else value}" for name, value in fields)
+
+def _shrink_field(selected: List[Tuple[str, object]], i: int, text: str, as_list: bool, budget: int):
+    # Clips field i ('text', wrapped in a list if 'as_list') until the line fits
+    # 'budget' or the text is down to 8 tokens. Re-counts after every clip:
+    # the "…" and re-tokenisation at the cut can leave the line still over.
+    name = selected[i][0]
+    limit = count_tokens(text, PROMPT_MODEL)
+    while limit > 8:
+        excess = count_tokens(_render(selected), PROMPT_MODEL) - budget
+        if excess <= 0:
+            return
+        limit = max(8, min(limit - 1, limit - excess))
+        clipped = _clip(text, limit)
+        selected[i] = (name, [clipped] if as_list else clipped)
+
+def serialize_record(record: dict, fields: Sequence[str], budget: int) -> str:
+    """
+    Renders the selected, non-empty 'fields' of 'record' as one compact
+    'name: value; ...' line with list items deduplicated, and trims it to
+    'budget' tokens: list items and text are cut from the lowest-value field
+    upwards, and fields are dropped only when nothing else is left to cut.
+    Lists are capped at PROMPT_MAX_LIST_ITEMS items of PROMPT_MAX_ITEM_TOKENS tokens.
+    """
+    selected = _fields(record, fields)
+    line = _render(selected)
+    if count_tokens(line, PROMPT_MODEL) <= budget:
+        return line
+    for i in range(len(selected) - 1, -1, -1):
+        name, value = selected[i]
+        if name in KEEP_FIELDS:
+            continue
+        if isinstance(value, list):
+            while len(value) > 1 and count_tokens(_render(selected), PROMPT_MODEL) > budget:
+                value = value[:-1]
+                selected[i] = (name, value)
+            _shrink_field(selected, i, value[0], True, budget)
+        elif isinstance(value, str):
+            _shrink_field(selected, i, value, False, budget)
+        if count_tokens(_render(selected), PROMPT_MODEL) <= budget:
+            return _render(selected)
+    # Still over budget: drop whole fields, lowest value first
+    while len(selected) > 1 and count_tokens(_render(selected), PROMPT_MODEL) > budget:
+        droppable = [i for i, (name, _) in enumerate(selected) if name not in KEEP_FIELDS]
+        if not droppable:
+            break
+        selected.pop(droppable[-1])
+    return _render(selected)
+
+def serialize_task(task_details: dict, budget: int = TASK_PROMPT_TOKEN_BUDGET) -> str:
+    """
+    Compact line describing a task for the delegation prompt.
+    """
+    return serialize_record(task_details, TASK_FIELDS, budget)
+
+def serialize_members(member_details: List[dict], budget: int = MEMBER_PROMPT_TOKEN_BUDGET) -> str:
+    """
+    One compact bullet per member, each within 'budget' tokens.
+    """
+    return "\n".join(f"- {serialize_record(member, MEMBER_FIELDS, budget)}" for member in member_details) or "(none)"
+
+def serialize_agents(agent_details: List[dict], budget: int = AGENT_PROMPT_TOKEN_BUDGET) -> str:
+    """
+    One compact bullet per agent, each within 'budget' tokens.
+    """
+    return "\n".join(f"- {serialize_record(agent, AGENT_FIELDS, budget)}" for agent in agent_details) or "(none)"
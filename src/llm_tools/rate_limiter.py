@@ -0,0 +1,198 @@
+import asyncio
+import os
+import sqlite3
+import threading
+import time
+from typing import Optional, Tuple
+from src.llm_tools.tokens import count_message_tokens
+
+# --- Rate Limit Configuration ---
+# Requests-per-minute and tokens-per-minute budgets of the OpenAI organization,
+# per model family. Every process on this machine draws from the same token
+# buckets, stored in the SQLite file at RATE_LIMIT_PATH (set it to an empty
+# string to disable limiting). Chat reservations include
+# CHAT_COMPLETION_TOKEN_ESTIMATE output tokens, corrected once usage is known.
+CHAT_RPM_LIMIT = float(os.getenv("CHAT_RPM_LIMIT", "500"))
+CHAT_TPM_LIMIT = float(os.getenv("CHAT_TPM_LIMIT", "30000"))
+EMBEDDING_RPM_LIMIT = float(os.getenv("EMBEDDING_RPM_LIMIT", "3000"))
+EMBEDDING_TPM_LIMIT = float(os.getenv("EMBEDDING_TPM_LIMIT", "1000000"))
+CHAT_COMPLETION_TOKEN_ESTIMATE = int(os.getenv("CHAT_COMPLETION_TOKEN_ESTIMATE", "800"))
+RATE_LIMIT_PATH = os.getenv("RATE_LIMIT_PATH", os.path.join(".cache", "rate_limits.sqlite3"))
+
+def limits_for(model: str) -> Tuple[float, float]:
+    """
+    Returns the (requests per minute, tokens per minute) budget of 'model'.
+    """
+    if "embedding" in model:
+        return EMBEDDING_RPM_LIMIT, EMBEDDING_TPM_LIMIT
+    return CHAT_RPM_LIMIT, CHAT_TPM_LIMIT
+
+class RateLimiter:
+    """
+    Token-bucket limiter over requests and tokens per minute.
+
+    Bucket levels live in SQLite and are updated under BEGIN IMMEDIATE, so
+    every thread and process using the same file shares one budget. Each
+    bucket holds at most a minute's worth of capacity and refills continuously.
+    """
+    def __init__(self, path: str = RATE_LIMIT_PATH):
+        self.path = path
+        self.waits = 0
+        self.wait_seconds = 0.0
+        self._local = threading.local()
+
+    def _connect(self) -> sqlite3.Connection:
+        # One connection per thread; SQLite serializes the writers across processes
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL;")
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS buckets (
+                    name TEXT PRIMARY KEY,
+                    level REAL NOT NULL,
+                    updated REAL NOT NULL
+                );
+            """)
+            self._local.conn = conn
+        return conn
+
+    def _try_take(self, model: str, tokens: int) -> float:
+        """
+        Takes one request and 'tokens' tokens from the model's buckets if both
+        have enough. Returns 0 on success, otherwise the seconds until they will.
+        """
+        rpm, tpm = limits_for(model)
+        # A request larger than a whole minute's budget would never fit
+        costs = {f"{model}:requests": (1.0, rpm), f"{model}:tokens": (min(float(tokens), tpm), tpm)}
+        conn = self._connect()
+        now = time.time()
+        conn.execute("BEGIN IMMEDIATE;")
+        try:
+            levels = {}
+            for name, (cost, capacity) in costs.items():
+                row = conn.execute("SELECT level, updated FROM buckets WHERE name = ?;", (name,)).fetchone()
+                level = capacity if row is None else min(capacity, row[0] + (now - row[1]) * capacity / 60)
+                levels[name] = level
+            wait = max((cost - levels[name]) * 60 / capacity for name, (cost, capacity) in costs.items())
+            if wait <= 0:
+                for name, (cost, _) in costs.items():
+                    conn.execute("INSERT OR REPLACE INTO buckets (name, level, updated) VALUES (?, ?, ?);",
+                                 (name, levels[name] - cost, now))
+            conn.execute("COMMIT;")
+        except BaseException:
+            conn.execute("ROLLBACK;")
+            raise
+        return max(0.0, wait)
+
+    def acquire(self, model: str, tokens: int):
+        """
+        Blocks until one request of 'tokens' estimated tokens fits the budget of 'model'.
+        """
+        while True:
+            wait = self._try_take(model, tokens)
+            if wait <= 0:
+                return
+            self.waits += 1
+            self.wait_seconds += wait
+            time.sleep(wait)
+
+    async def acquire_async(self, model: str, tokens: int):
+        """
+        acquire() for coroutines. The SQLite update (which may wait on another
+        process's lock) runs in a worker thread and waits use asyncio.sleep, so
+        the event loop keeps running.
+        """
+        while True:
+            wait = await asyncio.to_thread(self._try_take, model, tokens)
+            if wait <= 0:
+                return
+            self.waits += 1
+            self.wait_seconds += wait
+            await asyncio.sleep(wait)
+
+    def adjust(self, model: str, tokens: int):
+        """
+        Returns 'tokens' to the model's token bucket (negative values take more),
+        used to correct an estimate once the real usage is known.
+        """
+        if not tokens:
+            return
+        _, tpm = limits_for(model)
+        name = f"{model}:tokens"
+        conn = self._connect()
+        now = time.time()
+        conn.execute("BEGIN IMMEDIATE;")
+        try:
+            row = conn.execute("SELECT level, updated FROM buckets WHERE name = ?;", (name,)).fetchone()
+            level = tpm if row is None else min(tpm, row[0] + (now - row[1]) * tpm / 60)
+            conn.execute("INSERT OR REPLACE INTO buckets (name, level, updated) VALUES (?, ?, ?);",
+                         (name, min(tpm, level + tokens), now))
+            conn.execute("COMMIT;")
+        except BaseException:
+            conn.execute("ROLLBACK;")
+            raise
+
+    def stats(self) -> dict:
+        """
+        Returns how often and how long this process waited for budget.
+        """
+        return {"waits": self.waits, "wait_seconds": self.wait_seconds}
+
+_limiter: Optional[RateLimiter] = RateLimiter() if RATE_LIMIT_PATH else None
+
+def get_rate_limiter() -> Optional[RateLimiter]:
+    """
+    Returns the process-wide rate limiter, or None when limiting is disabled.
+    """
+    return _limiter
+
+def chat_reservation(messages, model: str) -> int:
+    """
+    Estimated tokens a chat request will count against TPM: its prompt plus
+    CHAT_COMPLETION_TOKEN_ESTIMATE for the completion.
+    """
+    return count_message_tokens(messages, model) + CHAT_COMPLETION_TOKEN_ESTIMATE
+
+def reserve(model: str, tokens: int) -> int:
+    """
+    Waits for budget for one request of 'tokens' tokens. Returns the reserved
+    amount, to be passed to settle() with the response usage.
+    """
+    if _limiter is None:
+        return 0
+    try:
+        _limiter.acquire(model, tokens)
+    except sqlite3.Error as e:
+        print(f"Warning: rate limiter unavailable, sending without limiting: {e}")
+        return 0
+    return tokens
+
+async def reserve_async(model: str, tokens: int) -> int:
+    """
+    reserve() for coroutines.
+    """
+    if _limiter is None:
+        return 0
+    try:
+        await _limiter.acquire_async(model, tokens)
+    except sqlite3.Error as e:
+        print(f"Warning: rate limiter unavailable, sending without limiting: {e}")
+        return 0
+    return tokens
+
+def settle(model: str, reserved: int, usage) -> None:
+    """
+    Corrects a reservation with the 'usage' object of the response (if any),
+    so over-estimates are returned to the shared budget.
+    """
+    total = getattr(usage, "total_tokens", None)
+    if _limiter is None or not reserved or total is None:
+        return
+    try:
+        _limiter.adjust(model, reserved - total)
+    except sqlite3.Error as e:
+        print(f"Warning: rate limiter adjustment failed: {e}")
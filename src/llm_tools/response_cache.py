@@ -0,0 +1,165 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from typing import Any, Optional, Type, TypeVar
+from pydantic import BaseModel
+from src.llm_tools.embedding_cache import normalize_text
+
+# --- Response Cache Configuration ---
+# RESPONSE_CACHE_PATH points at the SQLite file holding validated LLM results
+# (set it to an empty string to disable the cache). Entries expire after
+# RESPONSE_CACHE_TTL_SECONDS; beyond RESPONSE_CACHE_MAX_ENTRIES the least
+# recently used ones are evicted.
+RESPONSE_CACHE_PATH = os.getenv("RESPONSE_CACHE_PATH", os.path.join(".cache", "responses.sqlite3"))
+RESPONSE_CACHE_TTL_SECONDS = float(os.getenv("RESPONSE_CACHE_TTL_SECONDS", str(7 * 24 * 3600)))
+RESPONSE_CACHE_MAX_ENTRIES = int(os.getenv("RESPONSE_CACHE_MAX_ENTRIES", "20000"))
+
+ModelT = TypeVar("ModelT", bound=BaseModel)
+
+def _canonical(value: Any) -> Any:
+    # Whitespace-normalized strings and key-sorted dicts, so equivalent inputs hash alike
+    if isinstance(value, str):
+        return normalize_text(value)
+    if isinstance(value, dict):
+        return {str(key): _canonical(item) for key, item in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [_canonical(item) for item in value]
+    return value
+
+def response_key(function: str, model: str, prompt_version: str, *inputs: Any) -> str:
+    """
+    Content address of an LLM result: SHA-256 of the calling function, model,
+    prompt-template version and the canonical JSON of its inputs.
+    """
+    payload = json.dumps([function, model, prompt_version, _canonical(list(inputs))],
+                         sort_keys=True, separators=(",", ":"), default=str)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+class ResponseCache:
+    """
+    Persistent TTL + LRU cache of validated Pydantic results stored as JSON in SQLite.
+    """
+    def __init__(self, path: str = RESPONSE_CACHE_PATH, ttl_seconds: float = RESPONSE_CACHE_TTL_SECONDS,
+                 max_entries: int = RESPONSE_CACHE_MAX_ENTRIES):
+        self.path = path
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._lock = threading.Lock()
+        self._conn = None
+
+    def _connect(self) -> sqlite3.Connection:
+        if self._conn is None:
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            conn = sqlite3.connect(self.path, timeout=30, check_same_thread=False, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL;")
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS responses (
+                    key TEXT PRIMARY KEY,
+                    function TEXT NOT NULL,
+                    result TEXT NOT NULL,
+                    expires_at REAL NOT NULL,
+                    last_access REAL NOT NULL
+                );
+            """)
+            conn.execute("CREATE INDEX IF NOT EXISTS responses_last_access_idx ON responses (last_access);")
+            self._conn = conn
+        return self._conn
+
+    def get(self, key: str, model_cls: Type[ModelT]) -> Optional[ModelT]:
+        """
+        Returns the cached result for 'key' as a 'model_cls' instance, or None
+        if it is missing, expired or no longer validates.
+        """
+        now = time.time()
+        with self._lock:
+            conn = self._connect()
+            row = conn.execute("SELECT result FROM responses WHERE key = ? AND expires_at > ?;", (key, now)).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            try:
+                result = model_cls.model_validate_json(row[0])
+            except Exception as e:
+                print(f"Warning: discarding cached {model_cls.__name__} that no longer validates: {e}")
+                conn.execute("DELETE FROM responses WHERE key = ?;", (key,))
+                self.misses += 1
+                return None
+            conn.execute("UPDATE responses SET last_access = ? WHERE key = ?;", (now, key))
+            self.hits += 1
+        return result
+
+    def put(self, key: str, function: str, result: BaseModel):
+        """
+        Stores 'result' under 'key', then drops expired rows and evicts the
+        least recently used ones beyond max_entries.
+        """
+        now = time.time()
+        with self._lock:
+            conn = self._connect()
+            conn.execute("INSERT OR REPLACE INTO responses (key, function, result, expires_at, last_access) VALUES (?, ?, ?, ?, ?);",
+                         (key, function, result.model_dump_json(), now + self.ttl_seconds, now))
+            conn.execute("DELETE FROM responses WHERE expires_at <= ?;", (now,))
+            (count,) = conn.execute("SELECT COUNT(*) FROM responses;").fetchone()
+            overflow = count - self.max_entries
+            if overflow > 0:
+                conn.execute("""
+                    DELETE FROM responses WHERE key IN (
+                        SELECT key FROM responses ORDER BY last_access ASC LIMIT ?
+                    );
+                """, (overflow,))
+                self.evictions += overflow
+
+    def stats(self) -> dict:
+        """
+        Returns hit/miss/eviction counters for this process and the current size.
+        """
+        with self._lock:
+            (size,) = self._connect().execute("SELECT COUNT(*) FROM responses;").fetchone()
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "evictions": self.evictions,
+            "entries": size,
+            "max_entries": self.max_entries,
+        }
+
+_cache: Optional[ResponseCache] = ResponseCache() if RESPONSE_CACHE_PATH else None
+
+def get_response_cache() -> Optional[ResponseCache]:
+    """
+    Returns the process-wide response cache, or None when it is disabled.
+    """
+    return _cache
+
+def get_cached_response(key: str, model_cls: Type[ModelT]) -> Optional[ModelT]:
+    """
+    Cache lookup that treats a disabled or unreadable cache as a miss.
+    """
+    if _cache is None:
+        return None
+    try:
+        return _cache.get(key, model_cls)
+    except sqlite3.Error as e:
+        print(f"Warning: response cache lookup failed: {e}")
+        return None
+
+def cache_response(key: str, function: str, result: Optional[BaseModel]):
+    """
+    Stores a successful (non-None) result; cache failures are only logged.
+    """
+    if _cache is None or result is None:
+        return
+    try:
+        _cache.put(key, function, result)
+    except sqlite3.Error as e:
+        print(f"Warning: response cache update failed: {e}")
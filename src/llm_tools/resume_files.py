@@ -0,0 +1,254 @@
+import hashlib
+import io
+import os
+import sqlite3
+import threading
+import time
+from dataclasses import dataclass
+from typing import List, Optional
+from src.models import ResumeData
+from src.llm_tools.formatting import retry
+from src.llm_tools.resume_formatting import (upload_file_to_openai, delete_openai_file,
+                                             resume_formatting, resume_text_formatting)
+
+# --- Resume Ingestion Configuration ---
+# RESUME_INGEST_MODE 'local' extracts PDF text with pypdf and sends plain text
+# to the model; 'upload' always uploads the file to OpenAI. Local mode still
+# falls back to uploading when pypdf is missing, the file isn't a PDF, or
+# fewer than RESUME_MIN_TEXT_CHARS were extracted (e.g. a scanned resume).
+# Parsed resumes are kept per file SHA-256 in RESUME_FILE_CACHE_PATH (empty
+# string disables it); uploaded files are deleted once parsed, and any left
+# behind are deleted by collect_remote_files after RESUME_REMOTE_FILE_GRACE_SECONDS.
+RESUME_INGEST_MODE = os.getenv("RESUME_INGEST_MODE", "local").lower()
+RESUME_MIN_TEXT_CHARS = int(os.getenv("RESUME_MIN_TEXT_CHARS", "200"))
+RESUME_FILE_CACHE_PATH = os.getenv("RESUME_FILE_CACHE_PATH", os.path.join(".cache", "resume_files.sqlite3"))
+RESUME_REMOTE_FILE_GRACE_SECONDS = float(os.getenv("RESUME_REMOTE_FILE_GRACE_SECONDS", "3600"))
+
+# Bump when resume parsing changes in a way that should invalidate cached results
+RESUME_PROMPT_VERSION = "1"
+
+_ingest_stats = {"files": 0, "cached": 0, "local": 0, "uploaded": 0, "failed": 0,
+                 "bytes_uploaded": 0, "remote_deleted": 0}
+_stats_lock = threading.Lock()
+
+def _count(key: str, amount: int = 1):
+    with _stats_lock:
+        _ingest_stats[key] += amount
+
+def file_sha256(data: bytes) -> str:
+    """
+    Content address of a resume file.
+    """
+    return hashlib.sha256(data).hexdigest()
+
+def extract_pdf_text(data: bytes) -> Optional[str]:
+    """
+    Extracts the text layer of a PDF with pypdf. Returns None if pypdf is not
+    installed or the file can't be read.
+    """
+    try:
+        from pypdf import PdfReader
+    except ImportError:
+        print("Warning: pypdf is not installed; resumes will be uploaded to OpenAI.")
+        return None
+    try:
+        reader = PdfReader(io.BytesIO(data))
+        pages = [page.extract_text() or "" for page in reader.pages]
+    except Exception as e:
+        print(f"Warning: could not extract PDF text: {e}")
+        return None
+    return "\n".join(" ".join(line.split()) for page in pages for line in page.splitlines() if line.strip())
+
+class ResumeFileCache:
+    """
+    SQLite store of parsed resumes keyed by file SHA-256, plus the ids of
+    files uploaded to OpenAI that haven't been deleted yet.
+    """
+    def __init__(self, path: str = RESUME_FILE_CACHE_PATH):
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = None
+
+    def _connect(self) -> sqlite3.Connection:
+        if self._conn is None:
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            conn = sqlite3.connect(self.path, timeout=30, check_same_thread=False, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL;")
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS resume_files (
+                    sha256 TEXT NOT NULL,
+                    prompt_version TEXT NOT NULL,
+                    file_name TEXT,
+                    resume TEXT NOT NULL,
+                    parsed_at REAL NOT NULL,
+                    PRIMARY KEY (sha256, prompt_version)
+                );
+            """)
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS remote_files (
+                    file_id TEXT PRIMARY KEY,
+                    sha256 TEXT NOT NULL,
+                    uploaded_at REAL NOT NULL
+                );
+            """)
+            self._conn = conn
+        return self._conn
+
+    def get(self, sha256: str) -> Optional[ResumeData]:
+        """
+        Returns the parsed resume of the file with this hash, or None.
+        """
+        with self._lock:
+            row = self._connect().execute("SELECT resume FROM resume_files WHERE sha256 = ? AND prompt_version = ?;",
+                                          (sha256, RESUME_PROMPT_VERSION)).fetchone()
+        if row is None:
+            return None
+        try:
+            return ResumeData.model_validate_json(row[0])
+        except Exception as e:
+            print(f"Warning: discarding cached resume that no longer validates: {e}")
+            return None
+
+    def put(self, sha256: str, file_name: str, resume_data: ResumeData):
+        """
+        Stores the parsed resume of the file with this hash.
+        """
+        with self._lock:
+            self._connect().execute(
+                "INSERT OR REPLACE INTO resume_files (sha256, prompt_version, file_name, resume, parsed_at) VALUES (?, ?, ?, ?, ?);",
+                (sha256, RESUME_PROMPT_VERSION, file_name, resume_data.model_dump_json(), time.time()))
+
+    def track_remote_file(self, file_id: str, sha256: str):
+        with self._lock:
+            self._connect().execute("INSERT OR REPLACE INTO remote_files (file_id, sha256, uploaded_at) VALUES (?, ?, ?);",
+                                    (file_id, sha256, time.time()))
+
+    def untrack_remote_file(self, file_id: str):
+        with self._lock:
+            self._connect().execute("DELETE FROM remote_files WHERE file_id = ?;", (file_id,))
+
+    def remote_files(self, older_than: float) -> List[str]:
+        """
+        Ids of tracked uploads made before the 'older_than' timestamp.
+        """
+        with self._lock:
+            rows = self._connect().execute("SELECT file_id FROM remote_files WHERE uploaded_at < ? ORDER BY uploaded_at;",
+                                           (older_than,)).fetchall()
+        return [row[0] for row in rows]
+
+_cache: Optional[ResumeFileCache] = ResumeFileCache() if RESUME_FILE_CACHE_PATH else None
+
+@dataclass
+class ResumeSource:
+    """
+    A resume file read and prepared for parsing: its hash, the locally
+    extracted text (None if it has to be uploaded) and a cached parse, if any.
+    """
+    file_name: str
+    data: bytes
+    sha256: str
+    text: Optional[str] = None
+    cached: Optional[ResumeData] = None
+
+def prepare_resume(data: bytes, file_name: str, mode: str = RESUME_INGEST_MODE) -> ResumeSource:
+    """
+    Hashes a resume file and looks it up in the cache; on a miss in local
+    mode, extracts its text. This step makes no network calls.
+    """
+    source = ResumeSource(file_name=file_name, data=data, sha256=file_sha256(data))
+    _count("files")
+    if _cache is not None:
+        try:
+            source.cached = _cache.get(source.sha256)
+        except sqlite3.Error as e:
+            print(f"Warning: resume file cache lookup failed: {e}")
+    if source.cached is not None or mode != "local" or not file_name.lower().endswith(".pdf"):
+        return source
+    text = extract_pdf_text(data)
+    if text is not None and len(text) >= RESUME_MIN_TEXT_CHARS:
+        source.text = text
+    elif text is not None:
+        print(f"Only {len(text)} characters of text found in {file_name}; uploading it instead.")
+    return source
+
+def _parse_uploaded(source: ResumeSource, times: int) -> Optional[ResumeData]:
+    file_id = upload_file_to_openai((source.file_name, source.data))
+    if _cache is not None:
+        _cache.track_remote_file(file_id, source.sha256)
+    _count("uploaded")
+    _count("bytes_uploaded", len(source.data))
+    try:
+        return retry(resume_formatting, times, file_id)
+    finally:
+        try:
+            delete_openai_file(file_id)
+            _count("remote_deleted")
+            if _cache is not None:
+                _cache.untrack_remote_file(file_id)
+        except Exception as e:
+            # Left tracked; collect_remote_files deletes it later
+            print(f"Warning: could not delete uploaded file {file_id}: {e}")
+
+def parse_resume(source: ResumeSource, times: int = 5) -> Optional[ResumeData]:
+    """
+    Returns the ResumeData of a prepared resume: the cached parse if there is
+    one, otherwise the model's parse of the extracted text, or of the
+    uploaded file when no usable text was extracted. New parses are cached.
+    """
+    if source.cached is not None:
+        _count("cached")
+        print(f"Reusing the parsed resume of {source.file_name} (unchanged file).")
+        return source.cached
+    if source.text is not None:
+        _count("local")
+        resume_data = retry(resume_text_formatting, times, source.text)
+    else:
+        resume_data = _parse_uploaded(source, times)
+    if resume_data is None:
+        _count("failed")
+        return None
+    if _cache is not None:
+        try:
+            _cache.put(source.sha256, source.file_name, resume_data)
+        except sqlite3.Error as e:
+            print(f"Warning: resume file cache update failed: {e}")
+    return resume_data
+
+def ingest_resume(data: bytes, file_name: str, times: int = 5, mode: str = RESUME_INGEST_MODE) -> Optional[ResumeData]:
+    """
+    Parses a resume file into ResumeData, reusing the cached parse of an
+    unchanged file. See prepare_resume and parse_resume.
+    """
+    return parse_resume(prepare_resume(data, file_name, mode), times)
+
+def collect_remote_files(grace_seconds: float = RESUME_REMOTE_FILE_GRACE_SECONDS) -> int:
+    """
+    Deletes tracked OpenAI uploads older than 'grace_seconds' (left behind by
+    a crash or a failed delete). Returns how many were deleted.
+    """
+    if _cache is None:
+        return 0
+    deleted = 0
+    for file_id in _cache.remote_files(time.time() - grace_seconds):
+        try:
+            delete_openai_file(file_id)
+        except Exception as e:
+            print(f"Warning: could not delete uploaded file {file_id}: {e}")
+            continue
+        _cache.untrack_remote_file(file_id)
+        deleted += 1
+    _count("remote_deleted", deleted)
+    return deleted
+
+def get_ingest_stats() -> dict:
+    """
+    Returns how resumes were ingested in this process: cache hits, local text
+    parses, uploads (with bytes sent), failures and deleted uploads.
+    """
+    with _stats_lock:
+        return dict(_ingest_stats)
+
+if __name__ == "__main__":
+    print(f"Deleted {collect_remote_files(0)} leftover uploaded resume files.")
@@ -1,43 +1,40 @@
-from langchain_openai import ChatOpenAI
-from dotenv import load_dotenv
-import os
-# file to openai
-from openai import OpenAI
-load_dotenv(dotenv_path=".env")  # Load environment variables from .env file
-from langchain_core.tools import tool
-from langchain_core.prompts import ChatPromptTemplate
-from langchain_core.output_parsers import JsonOutputParser
-# runnablelambda
-from langchain_core.runnables import RunnableLambda
-from typing import Dict, Any, List
-import json
-from openai.types.chat import ChatCompletionMessageParam
-
-client = OpenAI(
-    api_key=os.getenv("OPENAI_API_KEY"),
-)
-
-json_parser = JsonOutputParser()
-
+from typing import TYPE_CHECKING, List
 from src.models import ResumeData
-from pydantic import BaseModel, Field
-from typing import List, Optional
+from src.llm_tools.clients import get_openai_client
+from src.llm_tools.rate_limiter import chat_reservation, reserve, settle
+from src.llm_tools.structured_output import parse_chat
 
+if TYPE_CHECKING:
+    from openai.types.chat import ChatCompletionMessageParam
 
 def upload_file_to_openai(file):
     """
     Function to upload a file to OpenAI and return the file ID.
     """
-    file_obj = client.files.create(file=file, purpose="user_data")
+    file_obj = get_openai_client().files.create(file=file, purpose="user_data")
     file_id = file_obj.id
     print(f"File uploaded successfully. File ID: {file_id}")
     return file_id
 
-def resume_formatting(file_id: str):
+def delete_openai_file(file_id: str) -> bool:
     """
-    Test function to upload a file to OpenAI and return the file ID.
+    Deletes an uploaded file from OpenAI. Returns True once the file is gone
+    (including when it had already been deleted).
     """
-    messages: List[ChatCompletionMessageParam] = [
+    import openai  # Deferred with the client; see src.llm_tools.clients
+    try:
+        get_openai_client().files.delete(file_id)
+    except openai.NotFoundError:
+        pass
+    print(f"File {file_id} deleted from OpenAI.")
+    return True
+
+RESUME_INSTRUCTIONS = ("You are a highly accurate resume parser. "
+            "Fetch skills and other fields, by looking at there education, experiences and the overall resume, not just what they have mentioned,Your task is to extract information from the provided resume into the structured fields. If a field is explicitly 'Not available', use null for optional fields. "
+"Ensure that all relevant information from the resume and the provided text are incorporated into the report comprehensively and clearly.")
+
+def _resume_messages(file_id: str) -> List["ChatCompletionMessageParam"]:
+    messages: List["ChatCompletionMessageParam"] = [
         {
             "role": "user",
             "content": [ {
@@ -47,38 +44,42 @@ def resume_formatting(file_id: str):
                     }
                 },                {
                     "type": "text",
-                    "text":"You are a highly accurate resume parser. "
-            "Fetch skills and other fields, by looking at there education, experiences and the overall resume, not just what they have mentioned,Your task is to extract information from the provided resume text and format it into a strict JSON structure that matches the following Pydantic schema. If a field is explicitly 'Not available', use null for optional fields."
-f"```json\n{ResumeData.schema_json(indent=2)}\n```"
-"Ensure that all relevant information from the resume and the provided text are incorporated into the report comprehensively and clearly."
+                    "text": RESUME_INSTRUCTIONS
                 }]
         },
 
     ]
+    return messages
 
-    response=client.chat.completions.create(
-        model="gpt-4o",
-        messages=messages,
-        response_format={"type": "json_object"},
-    )
-    print(f"Response: {response.choices[0].message.content}")
-    json_output_str=response.choices[0].message.content
-    if json_output_str:
-        raw_data = json.loads(json_output_str)
-    else:
-        print("Error: No content received from API.")
-        return None
+def _resume_text_messages(resume_text: str) -> List["ChatCompletionMessageParam"]:
+    messages: List["ChatCompletionMessageParam"] = [
+        {
+            "role": "user",
+            "content": f"{RESUME_INSTRUCTIONS}\n\n**Resume:**\n{resume_text}",
+        },
+    ]
+    return messages
 
-    # Validate and parse with Pydantic
-    try:
-        parsed_resume_data = ResumeData(**raw_data)
-    except Exception as e:
-        print("Error parsing resume data:", e)
-        return None
+def resume_formatting(file_id: str):
+    """
+    Test function to upload a file to OpenAI and return the file ID.
+    """
+    messages = _resume_messages(file_id)
+    reserved = reserve("gpt-4o", chat_reservation(messages, "gpt-4o"))
+    completion, resume_data = parse_chat(get_openai_client(), "resume_formatting", model="gpt-4o", messages=messages, response_format=ResumeData)
+    settle("gpt-4o", reserved, completion.usage)
+    return resume_data
 
-    print("Successfully parsed resume data:")
-    return parsed_resume_data
-# Load environment variables from .env file
+def resume_text_formatting(resume_text: str):
+    """
+    resume_formatting for a resume already extracted to plain text, so no
+    file has to be uploaded.
+    """
+    messages = _resume_text_messages(resume_text)
+    reserved = reserve("gpt-4o", chat_reservation(messages, "gpt-4o"))
+    completion, resume_data = parse_chat(get_openai_client(), "resume_text_formatting", model="gpt-4o", messages=messages, response_format=ResumeData)
+    settle("gpt-4o", reserved, completion.usage)
+    return resume_data
 
 
 if __name__ == "__main__":
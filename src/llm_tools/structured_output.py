@@ -0,0 +1,95 @@
+import threading
+from functools import lru_cache
+from typing import TYPE_CHECKING, Optional, Tuple
+from pydantic import BaseModel
+
+if TYPE_CHECKING:
+    import openai
+
+# Outcome counters per formatter: parsed results and every way a structured
+# completion can come back without one
+_parse_stats = {}
+_parse_lock = threading.Lock()
+
+def record_parse_outcome(function: str, outcome: str):
+    """
+    Counts one structured-output 'outcome' ('parsed', 'refusal', 'length',
+    'content_filter', 'empty', 'unknown_id', ...) for 'function'.
+    """
+    with _parse_lock:
+        stats = _parse_stats.setdefault(function, {})
+        stats[outcome] = stats.get(outcome, 0) + 1
+
+def get_parse_failure_stats() -> dict:
+    """
+    Returns the structured-output outcome counters of every formatter, with
+    the share of completions that did not yield a parsed result.
+    """
+    with _parse_lock:
+        result = {}
+        for function, stats in _parse_stats.items():
+            total = sum(count for outcome, count in stats.items() if outcome != "unknown_id")
+            failures = total - stats.get("parsed", 0)
+            result[function] = dict(stats, failure_rate=failures / total if total else 0.0)
+        return result
+
+def parsed_message(function: str, completion) -> Optional[BaseModel]:
+    """
+    Returns the parsed model of a structured completion, or None (counted)
+    if the model refused or returned nothing.
+    """
+    message = completion.choices[0].message
+    if message.refusal:
+        print(f"{function}: the model refused: {message.refusal}")
+        record_parse_outcome(function, "refusal")
+        return None
+    if message.parsed is None:
+        print(f"{function}: no structured output received from API.")
+        record_parse_outcome(function, "empty")
+        return None
+    record_parse_outcome(function, "parsed")
+    return message.parsed
+
+@lru_cache(maxsize=None)
+def finish_reason_errors() -> tuple:
+    """
+    Exceptions raised by the parse/stream helpers when generation stopped
+    before the JSON was complete. A function so openai is only imported once
+    a completion is actually requested.
+    """
+    import openai
+    return (openai.LengthFinishReasonError, openai.ContentFilterFinishReasonError)
+
+def finish_reason_failure(function: str, error: Exception) -> Tuple[object, None]:
+    """
+    Counts a completion that stopped early (length or content filter) and
+    returns (its completion, None).
+    """
+    import openai
+    outcome = "length" if isinstance(error, openai.LengthFinishReasonError) else "content_filter"
+    print(f"{function}: structured output incomplete ({outcome}): {error}")
+    record_parse_outcome(function, outcome)
+    return error.completion, None
+
+def parse_chat(client: "openai.OpenAI", function: str, **kwargs) -> Tuple[object, Optional[BaseModel]]:
+    """
+    Runs client.chat.completions.parse(**kwargs), which enforces the strict
+    JSON schema of the 'response_format' model. Returns (completion, parsed
+    model or None); the completion is still returned when generation stopped
+    early, so its usage can be accounted for.
+    """
+    try:
+        completion = client.chat.completions.parse(**kwargs)
+    except finish_reason_errors() as e:
+        return finish_reason_failure(function, e)
+    return completion, parsed_message(function, completion)
+
+async def parse_chat_async(client: "openai.AsyncOpenAI", function: str, **kwargs) -> Tuple[object, Optional[BaseModel]]:
+    """
+    parse_chat() for the AsyncOpenAI client.
+    """
+    try:
+        completion = await client.chat.completions.parse(**kwargs)
+    except finish_reason_errors() as e:
+        return finish_reason_failure(function, e)
+    return completion, parsed_message(function, completion)
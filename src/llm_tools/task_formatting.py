@@ -1,22 +1,18 @@
-import os
-import json
-from openai import OpenAI
-from openai.types.chat import ChatCompletionMessageParam
 from pydantic import BaseModel, Field
-from typing import List, Optional
-from dotenv import load_dotenv
+from typing import TYPE_CHECKING, List, Optional
 from src.models import TaskData
+from src.llm_tools.clients import get_openai_client, get_async_openai_client, llm_slot
+from src.llm_tools.rate_limiter import chat_reservation, reserve, reserve_async, settle
+from src.llm_tools.response_cache import response_key, get_cached_response, cache_response
+from src.llm_tools.structured_output import parse_chat, parse_chat_async
 
-load_dotenv()
+if TYPE_CHECKING:
+    from openai.types.chat import ChatCompletionMessageParam
 
-client = OpenAI(
-    api_key=os.getenv("OPENAI_API_KEY"),
-)
+# Bump when the prompt or the output model changes; invalidates cached responses
+PROMPT_VERSION = "2"
 
-def task_formatting(task_description: str):
-    """
-    Analyzes a task description and returns a structured TaskData object.
-    """
+def _task_messages(task_description: str) -> List["ChatCompletionMessageParam"]:
     prompt = f"""
 You are an expert project manager. Your task is to analyze the following task description and extract structured information.
 
@@ -26,38 +22,52 @@ You are an expert project manager. Your task is to analyze the following task de
 **Instructions:**
 - Analyze the task description thoroughly.
 - Extract the task name, a detailed description, an estimated time for completion, and a list of required skills.
-- Format the output as a JSON object that matches the following Pydantic schema.
-```json
-{TaskData.schema_json(indent=2)}
-```
 Ensure that all relevant information from the task description is incorporated into the report comprehensively and clearly.
 """
 
-    messages: List[ChatCompletionMessageParam] = [
+    messages: List["ChatCompletionMessageParam"] = [
         {
             "role": "user",
             "content": prompt,
         }
     ]
+    return messages
 
-    response = client.chat.completions.create(
-        model="gpt-4o",
-        messages=messages,
-        response_format={"type": "json_object"}
-    )
+def task_formatting(task_description: str, use_cache: bool = True):
+    """
+    Analyzes a task description and returns a structured TaskData object.
+    Results are served from the response cache unless use_cache is False.
+    """
+    key = response_key("task_formatting", "gpt-4o", PROMPT_VERSION, task_description)
+    if use_cache:
+        cached = get_cached_response(key, TaskData)
+        if cached is not None:
+            return cached
+    messages = _task_messages(task_description)
+    reserved = reserve("gpt-4o", chat_reservation(messages, "gpt-4o"))
+    completion, task_data = parse_chat(get_openai_client(), "task_formatting", model="gpt-4o", messages=messages, response_format=TaskData)
+    settle("gpt-4o", reserved, completion.usage)
+    cache_response(key, "task_formatting", task_data)
+    return task_data
 
-    json_output_str = response.choices[0].message.content
-    if not json_output_str:
-        print("Error: No content received from API.")
-        return None
-    raw_data = json.loads(json_output_str)
-    print(f"Raw data received: {raw_data}")
-    try:
-        parsed_task_data = TaskData(**raw_data)
-        return parsed_task_data
-    except Exception as e:
-        print(f"Error parsing task data: {e}")
-        return None
+async def task_formatting_async(task_description: str, use_cache: bool = True):
+    """
+    Async counterpart of task_formatting on the shared AsyncOpenAI client.
+    Results are served from the response cache unless use_cache is False.
+    """
+    key = response_key("task_formatting", "gpt-4o", PROMPT_VERSION, task_description)
+    if use_cache:
+        cached = get_cached_response(key, TaskData)
+        if cached is not None:
+            return cached
+    messages = _task_messages(task_description)
+    async with llm_slot():
+        reserved = await reserve_async("gpt-4o", chat_reservation(messages, "gpt-4o"))
+        completion, task_data = await parse_chat_async(
+            get_async_openai_client(), "task_formatting", model="gpt-4o", messages=messages, response_format=TaskData)
+    settle("gpt-4o", reserved, completion.usage)
+    cache_response(key, "task_formatting", task_data)
+    return task_data
 
 if __name__ == '__main__':
     description = "Create a new landing page for our website. It should be responsive and include a contact form. This should take about 3 days and requires knowledge of HTML, CSS, and JavaScript."
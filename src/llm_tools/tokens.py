@@ -0,0 +1,43 @@
+from functools import lru_cache
+from typing import List
+
+@lru_cache(maxsize=None)
+def get_encoding(model: str):
+    try:
+        import tiktoken
+        return tiktoken.encoding_for_model(model)
+    except Exception as e:
+        print(f"Warning: tiktoken encoding unavailable for {model}, estimating token counts: {e}")
+        return None
+
+def count_tokens(text: str, model: str) -> int:
+    """
+    Counts the tokens in 'text' for the given model, or estimates them
+    (about four characters per token) when tiktoken is unavailable.
+    """
+    encoding = get_encoding(model)
+    if encoding is None:
+        return len(text) // 4 + 1
+    return len(encoding.encode(text, disallowed_special=()))
+
+# Flat allowance for a content part whose tokens can't be counted locally (e.g. an uploaded PDF)
+FILE_PART_TOKENS = 3000
+
+def count_message_tokens(messages: List[dict], model: str) -> int:
+    """
+    Estimates the prompt tokens of a chat request: the text of every message
+    plus a few tokens of per-message overhead.
+    """
+    total = 3
+    for message in messages:
+        total += 4
+        content = message.get("content") or ""
+        if isinstance(content, str):
+            total += count_tokens(content, model)
+            continue
+        for part in content:
+            if part.get("type") == "text":
+                total += count_tokens(part.get("text", ""), model)
+            else:
+                total += FILE_PART_TOKENS
+    return total
@@ -35,9 +35,29 @@ class AgentData(BaseModel):
     capabilities: List[str] = Field(default_factory=list, description="A list of higher-level functionalities or complex actions the agent can perform (e.g., 'Understand customer intent', 'Generate marketing copy', 'Automate workflow').")
     core_functionalities: List[str] = Field(default_factory=list, description="A list of the fundamental tasks or primary purposes the agent is designed to execute (e.g., 'Answer FAQs', 'Process payments', 'Extract data from documents').")
 
+class DelegationChoice(BaseModel):
+    """
+    One member or agent selected for a task.
+    """
+    id: int = Field(..., description="The candidate's id (the primary key shown in the prompt, not the deepflow_id).")
+    reason: str = Field(..., description="Why this candidate was selected.")
+
 class DelegationResult(BaseModel):
     """
     Pydantic class to model the structured output of an LLM for task delegation.
     """
-    best_combination: Dict[str, str] = Field(..., description="A dictionary where keys are member or agent IDs with prefix member/agent, so the key will be of this format 'type_id', where type can be either member or agent, id being the primary key and not the deepflow_id, and values are the reasons for their selection.")
     reasoning: str = Field(..., description="A detailed explanation of why this combination is the best for the task.")
+    members: List[DelegationChoice] = Field(..., description="The selected members, possibly none.")
+    agents: List[DelegationChoice] = Field(..., description="The selected agents, possibly none.")
+
+    def member_ids(self) -> List[str]:
+        """
+        Ids of the selected members, as stored in delegated_tasks.member_ids.
+        """
+        return [str(choice.id) for choice in self.members]
+
+    def agent_ids(self) -> List[str]:
+        """
+        Ids of the selected agents, as stored in delegated_tasks.agent_ids.
+        """
+        return [str(choice.id) for choice in self.agents]
@@ -1,7 +1,6 @@
 import streamlit as st
-from src.llm_tools.resume_formatting import upload_file_to_openai, resume_formatting
+from src.llm_tools.resume_files import ingest_resume
 from src.db_tools.resume_db import insert_resume_data, create_resume_table
-from src.llm_tools.formatting import retry
 def render():
     st.header("👤 Add New Member")
     st.write("Please fill in the member's details and upload their resume.")
@@ -26,9 +25,7 @@ def render():
                 else:
                     st.warning("No resume was uploaded.")
                 
-                file_id=upload_file_to_openai(uploaded_resume)
-
-                output=retry(resume_formatting,5,file_id)
+                output=ingest_resume(uploaded_resume.getvalue(),uploaded_resume.name) if uploaded_resume else None
                 if output:
                     st.json(output)
                     try:
@@ -1,45 +1,56 @@
 import streamlit as st
-import pandas as pd
-from src.db_tools.resume_db import get_all_resumes
-from src.db_tools.task_db import get_all_tasks
-from src.db_tools.agent_db import get_all_agents
-from src.db_tools.delegated_task_db import get_all_delegated_tasks
+from src.db_tools.resume_db import list_resumes, get_resumes_version
+from src.db_tools.task_db import list_tasks, get_tasks_version
+from src.db_tools.agent_db import list_agents, get_agents_version
+from src.db_tools.delegated_task_db import list_delegated_tasks, get_delegated_tasks_version
+
+PAGE_SIZE = 50
+
+# section key: (title, page fetcher, version fetcher, keyset column)
+SECTIONS = {
+    "delegated_tasks": ("📋 Delegated Tasks", list_delegated_tasks, get_delegated_tasks_version, 'task_id'),
+    "members": ("👥 Members", list_resumes, get_resumes_version, 'id'),
+    "tasks": ("📝 Tasks", list_tasks, get_tasks_version, 'id'),
+    "agents": ("🤖 Agents", list_agents, get_agents_version, 'id'),
+}
+
+@st.cache_data(max_entries=256, show_spinner=False)
+def _fetch_page(section: str, after_id, limit: int, version) -> list:
+    # 'version' is only part of the cache key: a new or updated row changes
+    # it, so stale pages are never served
+    return SECTIONS[section][1](after_id, limit)
+
+def _label(column: str) -> str:
+    return " ".join("ID" if word == "id" else word.capitalize() for word in column.split("_"))
+
+def _render_section(section: str):
+    import pandas as pd  # Deferred so the other pages never load it
+    title, _, get_version, key_column = SECTIONS[section]
+    count, latest = get_version()
+    # Nothing but the count is fetched until the section is opened
+    if not st.toggle(f"{title} ({count})", key=f"dashboard_{section}_open"):
+        return
+    if not count:
+        st.write(f"No {title.split(' ', 1)[1].lower()} found.")
+        return
+
+    # Keyset pagination: the first key of every page visited so far
+    cursors = st.session_state.setdefault(f"dashboard_{section}_cursors", [None])
+    rows = _fetch_page(section, cursors[-1], PAGE_SIZE, (count, latest))
+    first = (len(cursors) - 1) * PAGE_SIZE
+    st.dataframe(pd.DataFrame(rows).rename(columns=_label), hide_index=True)
+
+    previous_col, next_col, position_col = st.columns([1, 1, 4])
+    if previous_col.button("◀ Previous", key=f"dashboard_{section}_previous", disabled=len(cursors) == 1):
+        cursors.pop()
+        st.rerun()
+    if next_col.button("Next ▶", key=f"dashboard_{section}_next", disabled=first + len(rows) >= count or not rows):
+        cursors.append(rows[-1][key_column])
+        st.rerun()
+    position_col.caption(f"Rows {first + 1}–{first + len(rows)} of {count}")
 
 def render():
     st.header("📊 Dashboard")
 
-    # --- Delegated Tasks ---
-    with st.expander("📋 All Delegated Tasks"):
-        delegated_tasks = get_all_delegated_tasks()
-        if delegated_tasks:
-            df_delegated_tasks = pd.DataFrame(delegated_tasks, columns=['Task ID', 'Member IDs', 'Agent IDs', 'Created At', 'Updated At'])
-            st.dataframe(df_delegated_tasks)
-        else:
-            st.write("No delegated tasks found.")
-
-    # --- Members ---
-    with st.expander("👥 All Members"):
-        members = get_all_resumes()
-        if members:
-            df_members = pd.DataFrame(members, columns=['ID', 'Deepflow ID', 'Personal Summary', 'Technical Skills', 'Certifications', 'Soft Skills', 'Vocal Attributes', 'Task Delegation Recommendations', 'Specialization Task Categories', 'Additional Observations', 'Embedding', 'Created At'])
-            st.dataframe(df_members)
-        else:
-            st.write("No members found.")
-
-    # --- Tasks ---
-    with st.expander("📝 All Tasks"):
-        tasks = get_all_tasks()
-        if tasks:
-            df_tasks = pd.DataFrame(tasks, columns=['ID', 'Deepflow ID', 'Required Skills', 'Sector', 'Tags', 'Manpower Needed', 'Roles Required', 'Estimated Time', 'Embedding', 'Created At'])
-            st.dataframe(df_tasks)
-        else:
-            st.write("No tasks found.")
-
-    # --- Agents ---
-    with st.expander("🤖 All Agents"):
-        agents = get_all_agents()
-        if agents:
-            df_agents = pd.DataFrame(agents, columns=['ID', 'Deepflow ID', 'Tags', 'Skills', 'Capabilities', 'Core Functionalities', 'Embedding', 'Created At'])
-            st.dataframe(df_agents)
-        else:
-            st.write("No agents found.")
+    for section in SECTIONS:
+        _render_section(section)
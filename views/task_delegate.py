@@ -1,90 +1,234 @@
+import time
+import uuid
+from collections import OrderedDict
 import streamlit as st
-import pandas as pd
-from src.db_tools.task_db import get_all_tasks, get_task_by_id
-from src.db_tools.resume_db import find_similar_resumes, get_resume_by_id
-from src.db_tools.agent_db import find_similar_agents, get_agent_by_id
-from src.llm_tools.delegation_formatting import delegate_task
+from src.db_tools.task_db import search_tasks, get_task_sectors
+from src.candidate_prefetch import get_candidate_prefetcher, load_candidates
+from src.llm_tools.delegation_formatting import delegate_task, DelegationStream
 from src.llm_tools.formatting import retry
-import numpy as np
-from src.db_tools.delegated_task_db import insert_delegated_task
+from src.db_tools.delegated_task_db import insert_delegated_task, find_nearest_delegated_task
+from src.delegation import USE_DELEGATION_REUSE, evaluate_reuse_match, single_flight_delegation
+from src.db_tools.delegation_job_db import enqueue_delegation_job, get_latest_delegation_job
+from src.models import DelegationResult
+
+# Search results are cached per session for TASK_SEARCH_TTL_SECONDS, so
+# reruns of an unchanged search cost no query; only the
+# TASK_SEARCH_CACHE_ENTRIES most recently used searches are kept. The sector
+# list is shared by all sessions and reloaded every TASK_SECTORS_TTL_SECONDS.
+TASK_SEARCH_PAGE_SIZE = 25
+TASK_SEARCH_TTL_SECONDS = 60
+TASK_SEARCH_CACHE_ENTRIES = 32
+TASK_SECTORS_TTL_SECONDS = 300
+# A nearest-delegated-task lookup is reused for REUSE_MATCH_TTL_SECONDS
+REUSE_MATCH_TTL_SECONDS = 60
+
+def _cached_search(query: str, sector, undelegated_only: bool, before_id) -> list:
+    cache = st.session_state.setdefault("task_search_cache", OrderedDict())
+    key = (query.strip().lower(), sector, undelegated_only, before_id)
+    hit = cache.get(key)
+    if hit is not None and time.monotonic() - hit[0] < TASK_SEARCH_TTL_SECONDS:
+        cache.move_to_end(key)
+        return hit[1]
+    rows = search_tasks(query, sector, undelegated_only, before_id, TASK_SEARCH_PAGE_SIZE)
+    cache[key] = (time.monotonic(), rows)
+    cache.move_to_end(key)
+    while len(cache) > TASK_SEARCH_CACHE_ENTRIES:
+        cache.popitem(last=False)
+    return rows
+
+@st.cache_data(ttl=TASK_SECTORS_TTL_SECONDS, show_spinner=False)
+def _task_sectors() -> list:
+    return get_task_sectors()
+
+def _nearest_delegated_task(task_id: int, lookup: bool):
+    """
+    Returns (looked_up, nearest delegated task or None) for 'task_id'. The
+    index search only runs when 'lookup' is set and there is no lookup of
+    this task younger than REUSE_MATCH_TTL_SECONDS.
+    """
+    cached = st.session_state.get("reuse_match")
+    if cached is not None and cached[0] == task_id and time.monotonic() - cached[1] < REUSE_MATCH_TTL_SECONDS:
+        return True, cached[2]
+    if not lookup:
+        return False, None
+    nearest = find_nearest_delegated_task(task_id)
+    st.session_state["reuse_match"] = (task_id, time.monotonic(), nearest)
+    return True, nearest
+
+def _render_delegation(delegation_result: DelegationResult):
+    """
+    Table of the members and agents chosen by a delegation, with the reasons.
+    """
+    import pandas as pd  # Deferred so the other pages never load it
+    st.dataframe(pd.DataFrame(
+        [{"type": "member", "id": choice.id, "reason": choice.reason} for choice in delegation_result.members]
+        + [{"type": "agent", "id": choice.id, "reason": choice.reason} for choice in delegation_result.agents]
+    ), hide_index=True)
+
+def _task_picker():
+    """
+    Search box, filters and a paged selectbox of matching tasks. Returns the
+    selected task id, or None.
+    """
+    col_query, col_sector, col_undelegated = st.columns([3, 2, 1])
+    query = col_query.text_input("Search Tasks", placeholder="Deepflow id or sector")
+    sector = col_sector.selectbox("Sector", [None] + _task_sectors(),
+                                  format_func=lambda value: "All sectors" if value is None else value)
+    undelegated_only = col_undelegated.checkbox("Undelegated only")
+
+    # Keyset pages: the cursor of every page visited for the current filters
+    filters = (query.strip().lower(), sector, undelegated_only)
+    if st.session_state.get("task_search_filters") != filters:
+        st.session_state["task_search_filters"] = filters
+        st.session_state["task_search_cursors"] = [None]
+    cursors = st.session_state["task_search_cursors"]
+    tasks = _cached_search(query, sector, undelegated_only, cursors[-1])
+
+    if not tasks and len(cursors) == 1:
+        if any(filters):
+            st.warning("No tasks match the search.")
+        else:
+            st.warning("No tasks found. Please add a task first.")
+        return None
+
+    labels = {task['id']: f"{task['deepflow_task_id']} (ID: {task['id']}{', ' + task['sector'] if task['sector'] else ''})"
+                          f"{' ✓ delegated' if task['delegated'] else ''}" for task in tasks}
+    selected_task_id = st.selectbox("Select a Task", options=list(labels), format_func=labels.get)
+
+    col_previous, col_next, _ = st.columns([1, 1, 4])
+    if col_previous.button("◀ Newer", disabled=len(cursors) == 1):
+        cursors.pop()
+        st.rerun()
+    if col_next.button("Older ▶", disabled=len(tasks) < TASK_SEARCH_PAGE_SIZE):
+        cursors.append(tasks[-1]['id'])
+        st.rerun()
+    return selected_task_id
 
 def render():
     st.header("🤝 Task Delegate")
 
-    tasks = get_all_tasks()
-    
-    if not tasks:
-        st.warning("No tasks found. Please add a task first.")
+    selected_task_id = _task_picker()
+    if selected_task_id is None:
         return
 
-    task_options = {f"{task[1]} (ID: {task[0]})": task for task in tasks}
-    selected_task_str = st.selectbox("Select a Task", options=list(task_options.keys()))
+    # Candidate retrieval and prompt assembly start as soon as a task is
+    # selected, so "Delegate Task" only has to wait for the LLM. Loads are
+    # scoped to this browser session, so switching tasks never cancels
+    # another session's loads
+    prefetch_session = st.session_state.setdefault("prefetch_session", uuid.uuid4().hex)
+    prefetcher = get_candidate_prefetcher()
+    prefetcher.cancel_except(selected_task_id, prefetch_session)
+    prefetcher.prefetch(selected_task_id, prefetch_session)
+
+    use_cache = st.checkbox("Reuse a cached recommendation for identical candidates", value=True)
+
+    # Offer the delegation of a near-identical, already delegated task; applying it needs no LLM call.
+    # The lookup is automatic with USE_DELEGATION_REUSE and on request otherwise; it only counts
+    # in the reuse stats when a delegation is actually requested
+    looked_up, nearest = _nearest_delegated_task(
+        selected_task_id, USE_DELEGATION_REUSE or st.button("Find a Near-identical Delegated Task"))
+    reuse_match = evaluate_reuse_match(nearest, record=False)
+    if looked_up and not reuse_match and not USE_DELEGATION_REUSE:
+        st.caption("No near-identical delegated task with an unchanged candidate pool.")
+    if reuse_match:
+        st.info(f"Task {reuse_match['task_id']} is near-identical (similarity {reuse_match['similarity']:.3f}) "
+                f"and no members or agents were added since it was delegated: "
+                f"members {reuse_match['member_ids']}, agents {reuse_match['agent_ids']}.")
+        if st.button("Apply Previous Delegation"):
+            evaluate_reuse_match(nearest)
+            try:
+                insert_delegated_task(selected_task_id, reuse_match['member_ids'] or [], reuse_match['agent_ids'] or [])
+                st.success("Successfully saved the delegation record.")
+                st.session_state.pop("task_search_cache", None)  # 'delegated' flags changed
+            except Exception as e:
+                st.error(f"Failed to save the delegation record: {e}")
 
     if st.button("Delegate Task"):
-        if selected_task_str:
-            selected_task_id = int(selected_task_str.split('(ID: ')[1][:-1])
-            selected_task = get_task_by_id(selected_task_id)
-
-            if selected_task:
-                task_embedding_str = selected_task[8]
-                if task_embedding_str:
-                    print("--- Task Delegate Debug ---")
-                    print(f"Selected Task: {selected_task}")
-                    task_embedding = [float(x) for x in task_embedding_str.strip('[]').split(',')]
-                    # print(f"Task Embedding: {task_embedding[:5]}...") # Print first 5 elements
-
-                    similar_members_data = find_similar_resumes(task_embedding)
-                    # print(f"Similar Members: {similar_members_data}")
-                    similar_agents_data = find_similar_agents(task_embedding)
-                    # print(f"Similar Agents: {similar_agents_data}")
-
-                    member_details = [get_resume_by_id(member[0]) for member in similar_members_data]
-                    
-                    # print(f"Member Details: {member_details}")
-                    agent_details = [get_agent_by_id(agent[0]) for agent in similar_agents_data]
-                    # print(f"Agent Details: {agent_details}")
-
-
-                    task_cols = ['id', 'deepflow_task_id', 'required_skills', 'sector', 'tags', 'manpower_needed', 'roles_required', 'estimated_time', 'embedding', 'created_at']
-                    member_cols = ['id', 'deepflow_member_id', 'personal_summary', 'technical_skills', 'certifications', 'soft_skills', 'vocal_attributes', 'task_delegation_recommendations', 'specialization_task_categories', 'additional_observations', 'embedding', 'created_at']
-                    agent_cols = ['id', 'deepflow_agent_id', 'tags', 'skills', 'capabilities', 'core_functionalities', 'embedding', 'created_at']
-                    print("got the best fit")
-                    task_details_dict = dict(zip(task_cols, selected_task)) if selected_task else {}
-                    # print(f"Task Details Dict: {task_details_dict}")
-                    member_details_dicts = [dict(zip(member_cols, member)) for member in member_details if member]
-                    # print(f"Member Details Dicts: {member_details_dicts}")
-                    agent_details_dicts = [dict(zip(agent_cols, agent)) for agent in agent_details if agent]
-                    # print(f"Agent Details Dicts: {agent_details_dicts}")
-
-                    task_details_dict.pop('embedding')
-                    for member in member_details_dicts:
-                        member.pop('embedding')
-                    for agent in agent_details_dicts:
-                        agent.pop("embedding")
-
-                    print("finding the best com")
-                    with st.spinner("Finding the best combination..."):
-                        delegation_result = retry(delegate_task, 3, task_details_dict, member_details_dicts, agent_details_dicts)
-                    if delegation_result:
-                        st.subheader("🏆 Best Combination for the Task")
-                        st.write(delegation_result.reasoning)
-                        st.json(delegation_result.best_combination)
-
-                        # Extract member and agent IDs from the LLM response
-                        member_ids = [key[7:] for key in delegation_result.best_combination.keys() if 'member'==key[:6]]
-                        agent_ids = [key[6:] for key in delegation_result.best_combination.keys() if 'agent' in key[:5]]
-                        
-                        task_id = task_details_dict['id']
-                        
+        if selected_task_id is not None:
+            if looked_up:
+                evaluate_reuse_match(nearest)  # A miss here is a delegation the reuse path couldn't spare
+            # Task, top members and top agents (with similarity, without embeddings),
+            # ranked by pgvector in one query or by the in-process index; normally
+            # already prefetched, otherwise loaded now
+            candidates = prefetcher.get(selected_task_id, prefetch_session) or load_candidates(selected_task_id)
+            task_details_dict, member_details_dicts, agent_details_dicts = (
+                candidates.task_details, candidates.member_details, candidates.agent_details)
+
+            if task_details_dict:
+                if member_details_dicts or agent_details_dicts:
+                    st.subheader("🏆 Best Combination for the Task")
+
+                    def delegate_and_save():
+                        # The reasoning renders as the model writes it; the selections are validated at the end
+                        delegation_stream = DelegationStream(task_details_dict, member_details_dicts, agent_details_dicts,
+                                                             use_cache=use_cache, messages=candidates.messages)
+                        # Streamed into a placeholder, so a fallback replaces partial reasoning instead of repeating it
+                        reasoning_placeholder = st.empty()
                         try:
-                            insert_delegated_task(task_id, member_ids, agent_ids)
-                            st.success("Successfully saved the delegation record.")
+                            reasoning_placeholder.write_stream(delegation_stream)
+                            delegation_result = delegation_stream.result
                         except Exception as e:
-                            st.error(f"Failed to save the delegation record: {e}")
+                            print(f"Streaming delegation failed, retrying without streaming: {e}")
+                            reasoning_placeholder.empty()
+                            with st.spinner("Finding the best combination..."):
+                                delegation_result = retry(delegate_task, 3, task_details_dict, member_details_dicts, agent_details_dicts, use_cache=use_cache)
+                            if delegation_result:
+                                reasoning_placeholder.write(delegation_result.reasoning)
+                        if delegation_result:
+                            if delegation_stream.ttft is not None and not delegation_stream.from_cache:
+                                st.caption(f"First tokens after {delegation_stream.ttft:.2f}s")
+                            try:
+                                insert_delegated_task(task_details_dict['id'], delegation_result.member_ids(), delegation_result.agent_ids())
+                                st.success("Successfully saved the delegation record.")
+                            except Exception as e:
+                                st.error(f"Failed to save the delegation record: {e}")
+                        return delegation_result
+
+                    # A delegation of this task with the same candidates already running (another
+                    # session, a double click, another app process) is joined instead of repeated;
+                    # the spinner only shows while waiting for it, not over our own stream
+                    delegation_result, shared = single_flight_delegation(
+                        task_details_dict, member_details_dicts, agent_details_dicts, delegate_and_save,
+                        waiting=lambda: st.spinner("Waiting for the delegation already in progress..."))
+                    if shared and delegation_result:
+                        st.info("This task was already being delegated with the same candidates; showing that result.")
+                        st.write(delegation_result.reasoning)
+                    if delegation_result:
+                        st.session_state.pop("task_search_cache", None)  # 'delegated' flags changed
+                        _render_delegation(delegation_result)
 
                     else:
                         st.error("Could not determine the best combination. Please try again.")
                 else:
-                    st.error("The selected task does not have an embedding. Cannot perform semantic search.")
+                    st.error("The selected task does not have an embedding, or there are no members or agents to match. Cannot perform semantic search.")
             else:
                 st.error("Could not retrieve selected task details.")
+
+    # Background delegation: a worker process (delegation_worker.py) runs the
+    # job, so it survives page refreshes and doesn't block this session
+    st.divider()
+    st.subheader("⏳ Background Delegation")
+    if selected_task_id is not None:
+        col_queue, col_refresh = st.columns(2)
+        if col_queue.button("Queue Delegation"):
+            try:
+                job_id = enqueue_delegation_job(selected_task_id, use_cache=use_cache)
+                st.success(f"Delegation queued as job {job_id}.")
+            except Exception as e:
+                st.error(f"Failed to queue the delegation: {e}")
+        col_refresh.button("Refresh Status")
+
+        job = get_latest_delegation_job(selected_task_id)
+        if job is None:
+            st.caption("No background delegation for this task yet.")
+        elif job['state'] in ('queued', 'running'):
+            st.info(f"Job {job['id']} is {job['state']} (attempt {job['attempts']}/{job['max_attempts']}, "
+                    f"queued at {job['enqueued_at']:%H:%M:%S}). Refresh to update.")
+        elif job['state'] == 'failed':
+            st.error(f"Job {job['id']} failed after {job['attempts']} attempt(s): {job['error']}")
+        else:
+            delegation_result = DelegationResult.model_validate(job['result'])
+            st.success(f"Job {job['id']} finished in {(job['finished_at'] - job['started_at']).total_seconds():.1f}s; "
+                       "the delegation record has been saved.")
+            st.write(delegation_result.reasoning)
+            _render_delegation(delegation_result)